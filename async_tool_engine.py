@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import os
+import random
+import signal
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from metrics import TOOL_RUNS, TOOL_SECONDS
+from run_status_store import RunStatusStore
+
+# Replace this with your actual tool command; "{mid}" is substituted per run
+DEFAULT_TOOL_COMMAND = ("your_tool_command", "--mid", "{mid}")
+
+
+def build_command(template: Sequence[str], mid: str) -> List[str]:
+    """Substitute the MID into an argv template."""
+    return [arg.format(mid=mid) for arg in template]
+
+
+@dataclass
+class ToolRunResult:
+    mid: str
+    returncode: Optional[int]
+    attempts: int
+    timed_out: bool
+    duration: float
+    log_path: str
+
+    @property
+    def succeeded(self) -> bool:
+        return self.returncode == 0 and not self.timed_out
+
+
+class AsyncToolEngine:
+    def __init__(
+        self,
+        command: Sequence[str] = DEFAULT_TOOL_COMMAND,
+        max_concurrency: int = 200,
+        timeout: float = 1800.0,
+        kill_grace: float = 10.0,
+        max_retries: int = 3,
+        backoff_base: float = 5.0,
+        backoff_max: float = 300.0,
+        log_dir: str = "tool_logs",
+        status_store: Optional[RunStatusStore] = None,
+        logger: Optional[logging.Logger] = None
+    ):
+        """
+        Run tool invocations as asyncio subprocesses on a single thread.
+
+        Args:
+            command (Sequence[str]): argv template, "{mid}" is replaced per run; no shell is used
+            max_concurrency (int): Maximum number of tool processes alive at once
+            timeout (float): Seconds a single attempt may run before it is terminated
+            kill_grace (float): Seconds between SIGTERM and SIGKILL for a timed-out attempt
+            max_retries (int): Attempts per MID before it is recorded as a failure
+            backoff_base (float): Delay before the first retry, doubled on each retry
+            backoff_max (float): Upper bound on the retry delay
+            log_dir (str): Directory for per-MID output logs
+            status_store (Optional[RunStatusStore]): Store that receives the final result
+            logger (Optional[logging.Logger]): Logger for run events
+        """
+        self.command = tuple(command)
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.kill_grace = kill_grace
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.log_dir = Path(log_dir)
+        self.status_store = status_store
+        self.logger = logger or logging.getLogger(__name__)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def log_path(self, mid: str) -> Path:
+        return self.log_dir / f"{mid}.log"
+
+    def _backoff_delay(self, attempt: int) -> float:
+        """Exponential backoff with jitter for the given (1-based) failed attempt."""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _terminate(self, proc: asyncio.subprocess.Process):
+        """Stop a process group with SIGTERM, escalating to SIGKILL after the grace period."""
+        for sig, wait in ((signal.SIGTERM, self.kill_grace), (signal.SIGKILL, None)):
+            try:
+                os.killpg(proc.pid, sig)
+            except ProcessLookupError:
+                return
+            try:
+                await asyncio.wait_for(proc.wait(), wait)
+                return
+            except asyncio.TimeoutError:
+                continue
+
+    async def _run_once(self, mid: str, attempt: int) -> Tuple[Optional[int], bool]:
+        """Run one attempt, streaming output to the MID's log file. Returns (returncode, timed_out)."""
+        argv = build_command(self.command, mid)
+        with open(self.log_path(mid), 'ab') as log_file:
+            log_file.write(f"--- attempt {attempt} at {time.strftime('%Y-%m-%d %H:%M:%S')}: {' '.join(argv)}\n".encode())
+            log_file.flush()
+            proc = await asyncio.create_subprocess_exec(
+                *argv,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=log_file,
+                stderr=asyncio.subprocess.STDOUT,
+                start_new_session=True  # own process group, so children are killed with it
+            )
+            try:
+                returncode = await asyncio.wait_for(proc.wait(), self.timeout)
+                return returncode, False
+            except asyncio.TimeoutError:
+                self.logger.error(f"Tool run for MID {mid} timed out after {self.timeout}s")
+                await self._terminate(proc)
+                return proc.returncode, True
+            except asyncio.CancelledError:
+                await self._terminate(proc)
+                raise
+
+    async def run(self, mid: str, content_hash: Optional[str] = None) -> ToolRunResult:
+        """
+        Run the tool for an MID with timeouts and retries, then record the result.
+
+        Args:
+            mid (str): The MID to run
+            content_hash (Optional[str]): Content hash of the issue data, stored with the result
+
+        Returns:
+            ToolRunResult: Outcome of the last attempt
+        """
+        start = time.monotonic()
+        returncode, timed_out, attempt = None, False, 0
+        self.logger.info(f"Starting tool run for MID: {mid}")
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                async with self._get_semaphore():
+                    returncode, timed_out = await self._run_once(mid, attempt)
+            except OSError as e:
+                # The command itself could not be started; retrying won't help
+                self.logger.error(f"Error starting tool for MID {mid}: {e}")
+                returncode, timed_out = None, False
+                break
+            if returncode == 0 and not timed_out:
+                break
+            if attempt < self.max_retries:
+                delay = self._backoff_delay(attempt)
+                self.logger.warning(
+                    f"Tool run for MID {mid} failed (attempt {attempt} of {self.max_retries}), "
+                    f"retrying in {delay:.1f}s"
+                )
+                # Back off without holding a concurrency slot
+                await asyncio.sleep(delay)
+
+        result = ToolRunResult(
+            mid=mid,
+            returncode=returncode,
+            attempts=attempt,
+            timed_out=timed_out,
+            duration=time.monotonic() - start,
+            log_path=str(self.log_path(mid))
+        )
+        TOOL_SECONDS.observe(result.duration, engine="async")
+        TOOL_RUNS.inc(engine="async", outcome="timeout" if timed_out else "success" if result.succeeded else "failure")
+        if result.succeeded:
+            self.logger.info(f"Successfully ran tool for MID: {mid}")
+        else:
+            self.logger.error(f"Tool run failed for MID: {mid}. See {result.log_path}")
+        if self.status_store is not None:
+            await asyncio.to_thread(
+                self.status_store.record, mid, "Success" if result.succeeded else "Failure",
+                content_hash=content_hash
+            )
+        return result
+
+    async def run_many(self, mids: Iterable[str]) -> List[ToolRunResult]:
+        """Run the tool for many MIDs concurrently, bounded by max_concurrency."""
+        return await asyncio.gather(*(self.run(mid) for mid in mids))
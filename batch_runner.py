@@ -0,0 +1,233 @@
+"""
+Run the analysis graph over every request in a JSONL file.
+
+Requests are read lazily and analysed by a bounded pool of workers. LLM calls
+share one requests-per-minute and one tokens-per-minute token bucket. A run
+that fails with a 429 pauses the limiter and is retried with capped
+exponential backoff; it resumes from its last checkpoint, and LLM calls that
+already succeeded inside the failed node are answered from the LLM cache.
+Results are appended to the output file in completion order, one JSON object
+per line, each carrying the request_id and line number of its input line:
+
+    python batch_runner.py requests.jsonl results.jsonl --concurrency 16 --rpm 500 --tpm 200000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import AsyncIterator, Dict, Optional, TextIO, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from llm_clients import set_rate_limiter
+from main import drop_thread, new_thread_id, run_analysis
+from rate_limits import LLMRateLimiter
+
+REQUEST_FIELDS = ("request", "body", "text", "prompt")
+ID_FIELDS = ("request_id", "id")
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """True for provider 429s (openai.RateLimitError and anything else carrying status 429)."""
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429 or type(error).__name__ == "RateLimitError"
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds the provider asked us to wait, if it sent a Retry-After header."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def request_id_of(line: str, line_number: int) -> str:
+    """Best-effort request_id of a line that could not be parsed as a request: its id field, else the line number."""
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return str(line_number)
+    if isinstance(record, dict):
+        return next((str(record[name]) for name in ID_FIELDS if name in record), str(line_number))
+    return str(line_number)
+
+
+def parse_request(line: str, line_number: int, field: Optional[str] = None) -> Tuple[str, str]:
+    """Return (request_id, request text) for one JSONL line; a bare JSON string is the text itself."""
+    record = json.loads(line)
+    if isinstance(record, str):
+        return str(line_number), record
+    fields = (field,) if field else REQUEST_FIELDS
+    text = next((record[name] for name in fields if name in record), None)
+    if text is None:
+        raise ValueError(f"line {line_number} has none of the fields {', '.join(fields)}")
+    request_id = next((str(record[name]) for name in ID_FIELDS if name in record), str(line_number))
+    return request_id, text
+
+
+async def read_requests(path: str) -> AsyncIterator[Tuple[int, str]]:
+    """Yield (line number, raw line) without loading the whole file."""
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if line.strip():
+                yield line_number, line
+            if line_number % 1000 == 0:
+                await asyncio.sleep(0)
+
+
+class BatchRunner:
+    def __init__(
+        self,
+        concurrency: int = 8,
+        requests_per_minute: float = 500,
+        tokens_per_minute: Optional[float] = 200000,
+        estimated_tokens: int = 1500,
+        max_retries: int = 5,
+        backoff_base: float = 2,
+        backoff_max: float = 60,
+        field: Optional[str] = None
+    ):
+        """
+        Runs the compiled graph on many requests at once within provider limits.
+
+        Args:
+            concurrency (int): Maximum number of graph runs in flight
+            requests_per_minute (float): LLM requests allowed per minute
+            tokens_per_minute (Optional[float]): LLM tokens allowed per minute, None for no token limit
+            estimated_tokens (int): Tokens reserved per LLM call until its usage is reported
+            max_retries (int): Retries of a run that hit a 429
+            backoff_base (float): First backoff in seconds, doubled per retry
+            backoff_max (float): Cap on a single backoff
+            field (Optional[str]): JSON field holding the request text, default tries request/body/text/prompt
+        """
+        self.concurrency = concurrency
+        self.limiter = LLMRateLimiter(requests_per_minute, tokens_per_minute, estimated_tokens)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.field = field
+        self.completed = 0
+        self.failed = 0
+        self.tokens_used = 0
+
+    async def run_one(self, line_number: int, line: str) -> Dict:
+        """Analyse one request, retrying on 429; never raises"""
+        started = time.monotonic()
+        try:
+            request_id, text = parse_request(line, line_number, self.field)
+        except ValueError as e:
+            return {
+                "request_id": request_id_of(line, line_number),
+                "line": line_number,
+                "status": "failed",
+                "error": f"invalid request: {e}"
+            }
+
+        # One thread per line, so identical lines do not share checkpoints and a retry
+        # resumes after the last completed node
+        thread_id = new_thread_id()
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = await run_analysis(text, thread_id)
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt == self.max_retries:
+                    return {
+                        "request_id": request_id,
+                        "line": line_number,
+                        "status": "failed",
+                        "error": f"{type(e).__name__}: {e}",
+                        "attempts": attempt + 1,
+                        "elapsed": round(time.monotonic() - started, 3)
+                    }
+                delay = retry_after(e) or min(self.backoff_max, self.backoff_base * 2 ** attempt)
+                delay *= random.uniform(1.0, 1.25)  # jitter so workers do not retry in lockstep
+                # Everyone waits, not just this run: the limit is shared
+                self.limiter.pause(delay)
+                await asyncio.sleep(delay)
+                continue
+            await drop_thread(thread_id)
+            return {
+                "request_id": request_id,
+                "line": line_number,
+                "status": "completed",
+                "result": result["drafts"][-1],
+                "revisions": len(result["drafts"]) - 1,
+                "tokens_used": result.get("tokens_used", 0),
+                "attempts": attempt + 1,
+                "elapsed": round(time.monotonic() - started, 3)
+            }
+
+    async def _worker(self, queue: asyncio.Queue, out: TextIO):
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            record = await self.run_one(*item)
+            if record["status"] == "completed":
+                self.completed += 1
+                self.tokens_used += record["tokens_used"]
+            else:
+                self.failed += 1
+            # Single-threaded event loop: whole lines, written as each run finishes
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+
+    async def run(self, input_path: str, output_path: str, append: bool = False) -> Dict:
+        """Process every request in input_path and write one result line per request to output_path."""
+        set_rate_limiter(self.limiter)
+        started = time.monotonic()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        try:
+            with open(output_path, "a" if append else "w") as out:
+                workers = [asyncio.create_task(self._worker(queue, out)) for _ in range(self.concurrency)]
+                async for item in read_requests(input_path):
+                    await queue.put(item)
+                for _ in workers:
+                    await queue.put(None)
+                await asyncio.gather(*workers)
+        finally:
+            set_rate_limiter(None)
+
+        elapsed = time.monotonic() - started
+        total = self.completed + self.failed
+        return {
+            "requests": total,
+            "completed": self.completed,
+            "failed": self.failed,
+            "tokens_used": self.tokens_used,
+            "elapsed": round(elapsed, 2),
+            "requests_per_hour": round(total / elapsed * 3600, 1) if elapsed else 0.0
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file of requests")
+    parser.add_argument("output", help="JSONL file the results are written to")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rpm", type=float, default=500, help="LLM requests per minute")
+    parser.add_argument("--tpm", type=float, default=200000, help="LLM tokens per minute, 0 for no limit")
+    parser.add_argument("--estimated-tokens", type=int, default=1500, help="Tokens reserved per LLM call")
+    parser.add_argument("--max-retries", type=int, default=5)
+    parser.add_argument("--field", help="JSON field holding the request text")
+    parser.add_argument("--append", action="store_true", help="Append to the output file instead of replacing it")
+    args = parser.parse_args()
+
+    runner = BatchRunner(
+        concurrency=args.concurrency,
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm or None,
+        estimated_tokens=args.estimated_tokens,
+        max_retries=args.max_retries,
+        field=args.field
+    )
+    stats = asyncio.run(runner.run(args.input, args.output, args.append))
+    print(json.dumps(stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,420 @@
+"""
+Offline end-to-end benchmarks for the analysis graph, DatabaseAccess and ToolRunner.
+
+Seeded synthetic data is generated into a scratch workspace, the LLM is replaced
+by a deterministic fake chat model with configurable latency, and tool runs use
+a no-op command, so no network or API key is needed. Each benchmark runs in its
+own process; it reports throughput, p50/p99 latency per graph node, database
+query and poll cycle, and the peak RSS of that process. Results are written as
+JSON and can be compared with a previous run to catch regressions:
+
+    python benchmark.py --issues 1000000 --crs 20000 --requests 200 --latency 0.05
+    python benchmark.py --compare benchmark_results.json --tolerance 0.25
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import re
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCHMARKS = ("db", "graph", "runner")
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class LatencyRecorder:
+    def __init__(self):
+        """Latency samples and wall-clock spans per operation name."""
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.spans: Dict[str, List[float]] = {}  # name -> [first start, last end]
+
+    def add(self, name: str, started: float, ended: float):
+        self.samples[name].append(ended - started)
+        span = self.spans.setdefault(name, [started, ended])
+        span[0] = min(span[0], started)
+        span[1] = max(span[1], ended)
+
+    @contextmanager
+    def time(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, started, time.perf_counter())
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """count, throughput over the operation's wall-clock span, and p50/p99/mean in ms."""
+        result = {}
+        for name, values in self.samples.items():
+            ordered = sorted(values)
+            wall = self.spans[name][1] - self.spans[name][0]
+            result[name] = {
+                "count": len(values),
+                "throughput_per_s": round(len(values) / wall, 2) if wall > 0 else None,
+                "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+                "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+                "mean_ms": round(sum(values) / len(values) * 1000, 3)
+            }
+        return result
+
+
+def make_fake_chat_model(latency: float):
+    """
+    Deterministic chat model: JSON-mode calls get a CRAnalysisResponse naming the
+    MOLY IDs in the prompt, other calls a revision whose text depends only on the prompt.
+    """
+    from langchain_core.language_models import BaseChatModel
+    from langchain_core.messages import AIMessage
+    from langchain_core.outputs import ChatGeneration, ChatResult
+
+    class FakeChatModel(BaseChatModel):
+        latency: float = 0.0
+
+        @property
+        def _llm_type(self) -> str:
+            return "benchmark-fake"
+
+        def _respond(self, messages, **kwargs) -> ChatResult:
+            prompt = " ".join(str(message.content) for message in messages)
+            if (kwargs.get("response_format") or {}).get("type") == "json_object":
+                cr_ids = list(dict.fromkeys(re.findall(r"MOLY\d+", messages[-1].content)))
+                content = json.dumps({"summaries": [{"cr_id": cr_id, "summary": f"Analysis of {cr_id}."} for cr_id in cr_ids]})
+            else:
+                content = f"Revised analysis of {len(re.findall(r'MOLY', prompt))} CRs."
+            input_tokens, output_tokens = len(prompt) // 4, len(content) // 4
+            message = AIMessage(content=content, usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens
+            })
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+            time.sleep(self.latency)
+            return self._respond(messages, **kwargs)
+
+        async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+            await asyncio.sleep(self.latency)
+            return self._respond(messages, **kwargs)
+
+    # cache=False: every call pays the simulated latency
+    return FakeChatModel(latency=latency, cache=False)
+
+
+def make_node_timer(recorder: LatencyRecorder):
+    """Callback handler recording the duration of every top-level graph node run."""
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class NodeTimer(BaseCallbackHandler):
+        run_inline = True
+
+        def __init__(self):
+            self.started: Dict[Any, tuple] = {}
+
+        def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, name=None, **kwargs):
+            node = (metadata or {}).get("langgraph_node")
+            if node is not None and name == node and not node.startswith("__"):
+                self.started[run_id] = (f"node.{node}", time.perf_counter())
+
+        def on_chain_end(self, outputs, *, run_id, **kwargs):
+            if run_id in self.started:
+                key, started = self.started.pop(run_id)
+                recorder.add(key, started, time.perf_counter())
+
+        def on_chain_error(self, error, *, run_id, **kwargs):
+            self.started.pop(run_id, None)
+
+    return NodeTimer()
+
+
+def prepare_workspace(workdir: str, args: argparse.Namespace):
+    """Generate the seeded issues database, CR notes and status files the benchmarks read."""
+    from generate_cr_notes_json import generate_cr_notes_json
+    from database_access import DatabaseAccess
+    from generate_looping_input_json import generate_status_json
+    from generate_sqlite import generate_issues_db
+
+    os.makedirs(os.path.join(workdir, "db_path"), exist_ok=True)
+    os.makedirs(os.path.join(workdir, "input_json"), exist_ok=True)
+    timings = {}
+
+    started = time.perf_counter()
+    generate_issues_db(os.path.join(workdir, "db_path", "issues_database.sqlite"), args.issues, args.seed)
+    timings["issues"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    generate_cr_notes_json(os.path.join(workdir, "input_json", "Updated_CR_data.json"), args.crs, args.seed)
+    timings["cr_notes"] = time.perf_counter() - started
+
+    # The runner gets its own, smaller issues table: every unrun MID costs one tool run
+    runner_db = os.path.join(workdir, "db_path", "runner_issues.sqlite")
+    generate_issues_db(runner_db, args.runner_issues, args.seed + 1)
+    DatabaseAccess(runner_db).install_change_log()
+    started = time.perf_counter()
+    generate_status_json(os.path.join(workdir, "m_ids_lina_run.json"), args.runner_issues // 2, args.seed, runner_db)
+    timings["status"] = time.perf_counter() - started
+    return {name: round(seconds, 2) for name, seconds in timings.items()}
+
+
+def bench_db(args: argparse.Namespace, recorder: LatencyRecorder):
+    from database_access import DatabaseAccess
+
+    rng = random.Random(args.seed)
+    db = DatabaseAccess("db_path/issues_database.sqlite", read_only=True)
+    try:
+        for _ in range(3):
+            with recorder.time("db.get_all_mids"):
+                mids = db.get_all_mids()
+        for _ in range(1000):
+            with recorder.time("db.get_data_version"):
+                db.get_data_version()
+        for _ in range(3):
+            with recorder.time("db.get_mids_since.full_scan"):
+                rows = db.get_mids_since(0)
+        tail = max(0, rows[-1][0] - 1000) if rows else 0
+        for _ in range(100):
+            with recorder.time("db.get_mids_since.last_1000"):
+                db.get_mids_since(tail)
+        for mid in rng.sample(mids, min(1000, len(mids))):
+            with recorder.time("db.get_issue_details"):
+                db.get_issue_details(mid)
+        for _ in range(50):
+            batch = rng.sample(mids, min(500, len(mids)))
+            with recorder.time("db.get_issue_details_many.500"):
+                db.get_issue_details_many(batch)
+    finally:
+        db.close()
+
+
+def bench_graph(args: argparse.Namespace, recorder: LatencyRecorder):
+    os.environ["LLM_CACHE_PATH"] = os.path.abspath("db_path/llm_cache.sqlite")
+    import llm_clients
+
+    llm_clients.set_chat_model(make_fake_chat_model(args.latency))
+    import main
+
+    with open("input_json/Updated_CR_data.json") as f:
+        cr_ids = [cr["CR_ID"] for cr in json.load(f)]
+    rng = random.Random(args.seed)
+    requests = [
+        "Could you please analyse CRs " + " and ".join(rng.sample(cr_ids, min(args.crs_per_request, len(cr_ids))))
+        for _ in range(args.requests)
+    ]
+    graph = main.get_graph()
+    node_timer = make_node_timer(recorder)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(request: str):
+        async with semaphore:
+            config = {"configurable": {"thread_id": uuid.uuid4().hex}, "callbacks": [node_timer]}
+            with recorder.time("graph.request"):
+                await graph.ainvoke({"request": request}, config)
+
+    async def run_all():
+        await asyncio.gather(*(one(request) for request in requests))
+
+    # Timings go to the recorder, which the caller returns and writes to the JSON report;
+    # silence anything the nodes write to stdout so it cannot interleave with the printed table
+    stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+    try:
+        asyncio.run(run_all())
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+        graph.checkpointer.close()
+
+
+def bench_runner(args: argparse.Namespace, recorder: LatencyRecorder):
+    from generate_sqlite import generate_issues_db
+    from tool_runner import ToolRunner
+
+    noop = ("true", "{mid}") if shutil.which("true") else (sys.executable, "-c", "pass", "{mid}")
+    runner_db = "db_path/runner_issues.sqlite"
+    with recorder.time("runner.startup_with_status_import"):
+        runner = ToolRunner(
+            json_path="m_ids_lina_run.json",
+            status_db_path="db_path/run_status.sqlite",
+            poll_interval=0,
+            max_parallel_runs=args.tool_workers,
+            log_file="tool_runner.log",
+            state_path="tool_runner_state.json",
+            tool_command=noop,
+            issues_db_path=runner_db
+        )
+    run_tool = runner.run_tool
+
+    def timed_run_tool(mid: str, content_hash: Optional[str] = None):
+        with recorder.time("runner.tool_run"):
+            run_tool(mid, content_hash)
+
+    runner.run_tool = timed_run_tool
+    runner.scheduler.start()
+    try:
+        with recorder.time("runner.poll_cycle.initial_scan"):
+            runner.poll_once()
+        with recorder.time("runner.drain"):
+            runner.scheduler.wait_idle()
+        runner.commit_scan()
+        for _ in range(200):
+            with recorder.time("runner.poll_cycle.idle"):
+                runner.poll_once()
+        for i in range(5):
+            generate_issues_db(runner_db, 100, args.seed + 100 + i)
+            with recorder.time("runner.poll_cycle.incremental_100"):
+                runner.poll_once()
+            runner.scheduler.wait_idle()
+            runner.commit_scan()
+    finally:
+        runner.close()
+
+
+def _run_child(name: str, args: argparse.Namespace, workdir: str, results):
+    sys.path.insert(0, REPO_DIR)
+    os.chdir(workdir)
+    recorder = LatencyRecorder()
+    started = time.perf_counter()
+    try:
+        {"db": bench_db, "graph": bench_graph, "runner": bench_runner}[name](args, recorder)
+        results.put((name, {
+            "elapsed_s": round(time.perf_counter() - started, 3),
+            "peak_rss_mb": peak_rss_mb(),
+            "operations": recorder.summary()
+        }))
+    except BaseException as e:
+        results.put((name, {"error": f"{type(e).__name__}: {e}"}))
+        raise
+
+
+def run_benchmarks(args: argparse.Namespace) -> Dict[str, Any]:
+    workdir = args.workdir or tempfile.mkdtemp(prefix="reflexion-bench-")
+    sys.path.insert(0, REPO_DIR)
+    generation = prepare_workspace(workdir, args)
+
+    # A fresh process per benchmark keeps its peak RSS its own
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "workdir": workdir,
+            "params": {key: value for key, value in vars(args).items() if key not in ("compare", "out", "workdir")},
+            "generation_s": generation
+        },
+        "benchmarks": {}
+    }
+    for name in args.only or BENCHMARKS:
+        process = context.Process(target=_run_child, args=(name, args, workdir, results))
+        process.start()
+        process.join()
+        while not results.empty():
+            key, value = results.get()
+            report["benchmarks"][key] = value
+        if name not in report["benchmarks"]:
+            report["benchmarks"][name] = {"error": f"benchmark process exited with {process.exitcode}"}
+
+    if not args.workdir and not args.keep:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Operations whose throughput fell, or whose p99 rose, by more than tolerance against the baseline."""
+    regressions = []
+    for bench, result in baseline.get("benchmarks", {}).items():
+        current = report["benchmarks"].get(bench, {}).get("operations", {})
+        for op, old in result.get("operations", {}).items():
+            new = current.get(op)
+            if new is None:
+                continue
+            if old.get("throughput_per_s") and new.get("throughput_per_s") is not None \
+                    and new["throughput_per_s"] < old["throughput_per_s"] * (1 - tolerance):
+                regressions.append(f"{op}: throughput {old['throughput_per_s']} -> {new['throughput_per_s']}/s")
+            if old.get("p99_ms") and new["p99_ms"] > old["p99_ms"] * (1 + tolerance):
+                regressions.append(f"{op}: p99 {old['p99_ms']} -> {new['p99_ms']} ms")
+    return regressions
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"{'operation':45} {'count':>7} {'ops/s':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    for bench, result in report["benchmarks"].items():
+        if "error" in result:
+            print(f"{bench}: ERROR {result['error']}")
+            continue
+        print(f"-- {bench} ({result['elapsed_s']}s, peak RSS {result['peak_rss_mb']} MB)")
+        for op, stats in result["operations"].items():
+            print(f"{op:45} {stats['count']:>7} {stats['throughput_per_s'] or 0:>10} {stats['p50_ms']:>10} {stats['p99_ms']:>10}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--issues", type=int, default=100000, help="Rows in the issues table")
+    parser.add_argument("--crs", type=int, default=5000, help="CRs in the notes file")
+    parser.add_argument("--runner-issues", type=int, default=2000, help="Issues the ToolRunner sees; half have a run status")
+    parser.add_argument("--requests", type=int, default=50, help="Graph runs")
+    parser.add_argument("--crs-per-request", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=8, help="Graph runs in flight")
+    parser.add_argument("--latency", type=float, default=0.02, help="Fake LLM latency per call in seconds")
+    parser.add_argument("--tool-workers", type=int, default=10)
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS)
+    parser.add_argument("--workdir", help="Generate data here and keep it, instead of a temporary directory")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary workspace")
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--compare", help="Previous results file; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown when comparing")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        # Read first: the baseline may be the file this run overwrites
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    report = run_benchmarks(args)
+    print_report(report)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.out}")
+
+    if baseline is not None:
+        regressions = compare(report, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    if any("error" in result for result in report["benchmarks"].values()):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
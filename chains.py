@@ -1,34 +1,32 @@
-from typing import Optional, List, Dict
+from typing import Annotated, Optional, List, Dict, TypedDict, Union
 from dataclasses import dataclass
+import operator
 from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
 from langchain_core.tools import StructuredTool
-from langchain_openai import ChatOpenAI
 from pydantic import BaseModel, Field
 import json
 import asyncio
+import logging
 import re
-from concurrent.futures import ThreadPoolExecutor
+import threading
+from cr_chunking import chunk_crs, get_token_counter
+from cr_clustering import SignatureIndex, cluster_crs, cr_text, note_differences
+from note_compaction import chunk_compacted, compact_notes, legend_prompt, referenced_lines
+from cr_notes_index import CROffsetIndex
+from cr_notes_store import CRNotesStore, open_cr_notes_store
+from llm_clients import LLM_MODEL, get_chat_model
+from metrics import timed
 
-@dataclass
+logger = logging.getLogger(__name__)
+
+@dataclass(slots=True)
 class CRNotes:
     cr_id: str
     notes: List[str]
     status: str = "pending"  # pending, completed, failed
 
-class CRNotesCollection:
-    def __init__(self):
-        self.cr_notes: List[CRNotes] = []
-
-    def add_cr(self, cr_id: str, notes: List[str], status: str = "completed"):
-        self.cr_notes.append(CRNotes(cr_id=cr_id, notes=notes, status=status))
-
     def to_dict(self) -> Dict:
-        return {
-            "cr_data": [
-                {"cr_id": cr.cr_id, "notes": cr.notes, "status": cr.status}
-                for cr in self.cr_notes
-            ]
-        }
+        return {"cr_id": self.cr_id, "notes": self.notes, "status": self.status}
 
 class CRSummary(BaseModel):
     cr_id: str = Field(description="The MOLY ID of the CR being summarized")
@@ -37,66 +35,139 @@ class CRSummary(BaseModel):
 class CRAnalysisResponse(BaseModel):
     summaries: List[CRSummary] = Field(description="List of CR summaries")    
 
+class AnalysisState(TypedDict, total=False):
+    request: str
+    cr_ids: List[str]
+    cr_notes: List[CRNotes]
+    cluster_of: Dict[str, str]  # CR ID -> ID of the near-duplicate CR analysed in its place
+    note_legend: List[str]  # lines interned by note_compactor
+    compacted_crs: List[Dict]  # CR records with notes as legend references plus unique lines
+    compaction: Dict  # token savings of the compaction for this request
+    drafts: Annotated[List[str], operator.add]  # the draft followed by each revision
+    revision_count: int
+    tokens_used: Annotated[int, operator.add]
+    active_seconds: Annotated[float, operator.add]  # time spent in nodes; excludes gaps before a resume
+
+# Opened on first use, so importing this module touches no files
+_cr_notes_store: Optional[Union[CRNotesStore, CROffsetIndex]] = None
+_signature_index: Optional[SignatureIndex] = None
+_store_lock = threading.Lock()
+
+def get_cr_notes_store() -> Union[CRNotesStore, CROffsetIndex]:
+    """The CR notes store, indexed from the CR JSON on first use"""
+    global _cr_notes_store
+    if _cr_notes_store is None:
+        with _store_lock:
+            if _cr_notes_store is None:
+                _cr_notes_store = open_cr_notes_store('input_json/Updated_CR_data.json')
+    return _cr_notes_store
+
+def get_signature_index() -> SignatureIndex:
+    """MinHash signatures of CR notes, recomputed only for new or changed CRs; opened on first use"""
+    global _signature_index
+    if _signature_index is None:
+        with _store_lock:
+            if _signature_index is None:
+                _signature_index = SignatureIndex('db_path/cr_signatures.sqlite')
+    return _signature_index
+
+def _notes_to_cr(cr_id: str, notes: Optional[List[str]]) -> CRNotes:
+    if notes is None:
+        return CRNotes(cr_id=cr_id, notes=[], status="failed")
+    return CRNotes(cr_id=cr_id, notes=notes, status="completed")
+
+@timed("cr_notes.fetch")
 async def fetch_notes_async(cr_id: str) -> Optional[CRNotes]:
     """Async version of fetch_notes"""
     try:
-        with open('input_json/Updated_CR_data.json', 'r') as f:
-            cr_data = json.load(f)
-            
-        for cr in cr_data:
-            if cr['CR_ID'] == cr_id:
-                return CRNotes(cr_id=cr_id, notes=cr['notes'], status="completed")
-        return CRNotes(cr_id=cr_id, notes=[], status="failed")
+        notes = await asyncio.to_thread(lambda: get_cr_notes_store().get(cr_id))
+        return _notes_to_cr(cr_id, notes)
     except Exception as e:
-        print(f"Error reading CR data for {cr_id}: {e}")
+        logger.error(f"Error reading CR data for {cr_id}: {e}")
         return CRNotes(cr_id=cr_id, notes=[], status="failed")
 
-def request_parser(state: List[BaseMessage]) -> List[BaseMessage]:
+@timed("cr_notes.fetch_many")
+async def fetch_notes_many_async(cr_ids: List[str]) -> List[CRNotes]:
+    """Fetch notes for all CR IDs with one index lookup off the event loop"""
+    try:
+        notes_by_id = await asyncio.to_thread(lambda: get_cr_notes_store().get_many(cr_ids))
+        return [_notes_to_cr(cr_id, notes_by_id[cr_id]) for cr_id in cr_ids]
+    except Exception as e:
+        logger.error(f"Error reading CR data for {', '.join(cr_ids)}: {e}")
+        return [CRNotes(cr_id=cr_id, notes=[], status="failed") for cr_id in cr_ids]
+
+def request_parser(state: AnalysisState) -> AnalysisState:
     """Parse the initial request and identify CR IDs"""
-    # Get the input text
-    input_text = state[0].content
-    
     # Find all MOLY IDs
-    moly_ids = re.findall(r'MOLY\d+', input_text)
+    moly_ids = list(dict.fromkeys(re.findall(r'MOLY\d+', state["request"])))
     
-    # Create a structured message with the findings
-    result_message = f"""
-Original Request: {input_text}
-Found CR IDs: {', '.join(moly_ids) if moly_ids else 'No CR IDs found'}
-"""
-    
-    return state + [HumanMessage(content=result_message)]
+    return {"cr_ids": moly_ids, "revision_count": 0}
 
-async def note_processor(state: List[BaseMessage]) -> List[BaseMessage]:
-    """Process multiple CR IDs in parallel and fetch their notes"""
-    # Get the last message which should contain the CR IDs
-    last_message = state[-1].content
-    
-    # Extract MOLY IDs using regex, but only from the "Found CR IDs:" line
-    cr_line = re.search(r'Found CR IDs: (.*)', last_message)
-    if cr_line:
-        moly_ids = re.findall(r'MOLY\d+', cr_line.group(1))
-    else:
-        moly_ids = []
-    
-    # Create tasks for parallel execution
-    tasks = [fetch_notes_async(moly_id) for moly_id in moly_ids]
+async def note_processor(state: AnalysisState) -> AnalysisState:
+    """Process multiple CR IDs in a single batch and fetch their notes"""
+    # Fetch all notes in one batch lookup
+    cr_notes = await fetch_notes_many_async(state["cr_ids"])
     
-    # Wait for all tasks to complete
-    cr_results = await asyncio.gather(*tasks)
+    return {"cr_notes": cr_notes}
+
+def cr_clusterer(state: AnalysisState) -> AnalysisState:
+    """Group near-duplicate CRs so only one CR per cluster is sent to the LLM"""
+    items = [(cr.cr_id, cr_text(cr.to_dict())) for cr in state["cr_notes"] if cr.notes]
+    cluster_of = cluster_crs(items, get_signature_index())
+    if len(items) > len(set(cluster_of.values())):
+        logger.info(f"Clustering: {len(items)} CRs -> {len(set(cluster_of.values()))} representatives")
     
-    # Collect results
-    collection = CRNotesCollection()
-    for result in cr_results:
-        if result:
-            collection.add_cr(result.cr_id, result.notes, result.status)
+    return {"cluster_of": cluster_of}
+
+def _representatives(state: AnalysisState) -> List[CRNotes]:
+    """The CRs to analyse: every CR that is not a near-duplicate of an earlier one"""
+    cluster_of = state.get("cluster_of", {})
+    return [cr for cr in state["cr_notes"] if cluster_of.get(cr.cr_id, cr.cr_id) == cr.cr_id]
+
+def _fan_out_summaries(summaries: List[CRSummary], state: AnalysisState) -> List[CRSummary]:
+    """Give each cluster member its representative's summary plus how its notes differ"""
+    cluster_of = state.get("cluster_of", {})
+    by_id = {summary.cr_id: summary for summary in summaries}
+    notes = {cr.cr_id: cr.notes for cr in state["cr_notes"]}
+    result = []
+    for cr in state["cr_notes"]:
+        rep = cluster_of.get(cr.cr_id, cr.cr_id)
+        summary = by_id.get(rep)
+        if summary is None or summary.summary == STRUCTURED_RESPONSE_ERROR:
+            # The representative was not analysed, so neither were the members it stands for
+            result.append(CRSummary(cr_id=cr.cr_id, summary=STRUCTURED_RESPONSE_ERROR))
+        elif rep == cr.cr_id:
+            result.append(summary)
+        else:
+            differences = note_differences(cr.notes, notes[rep])
+            result.append(CRSummary(
+                cr_id=cr.cr_id,
+                summary=f"{summary.summary}\n(Near-duplicate of {rep}; {differences})"
+            ))
+    # Keep anything the model returned for IDs outside the request
+    requested = set(notes)
+    return result + [summary for summary in summaries if summary.cr_id not in requested]
+
+def note_compactor(state: AnalysisState) -> AnalysisState:
+    """Intern note lines repeated across the requested CRs into a numbered legend"""
+    compacted = compact_notes(
+        [cr.to_dict() for cr in _representatives(state)],
+        get_token_counter(LLM_MODEL),
+        max_tokens=FIRST_RESPONDER_CHUNK_TOKENS
+    )
+    report = compacted.report()
+    logger.info(
+        f"Note compaction: {report['original_tokens']} -> {report['compacted_tokens']} tokens "
+        f"({report['saved_tokens']} saved, {report['saved_ratio']:.0%}) for {report['crs']} CRs in {report['chunks']} chunks"
+    )
+    if report["saved_tokens"] <= 0:
+        # Little repetition: the references and legend cost more than they save
+        logger.info("Note compaction saved nothing, sending the notes uncompacted")
+        return {"compaction": report}
     
-    # Convert to structured message
-    return state + [HumanMessage(content=str(collection.to_dict()))]
+    return {"note_legend": compacted.legend, "compacted_crs": compacted.crs, "compaction": report}
 
-def first_responder(state: List[BaseMessage]) -> List[BaseMessage]:
-    """Generate initial response based on CR notes using structured output"""
-    system_prompt = """You are an expert wireless systems researcher. 
+FIRST_RESPONDER_SYSTEM_PROMPT = """You are an expert wireless systems researcher. 
     Analyze the CR data and provide summaries in a structured format.
     Your response MUST be valid JSON that matches the following Pydantic structure:
 
@@ -110,42 +181,115 @@ def first_responder(state: List[BaseMessage]) -> List[BaseMessage]:
         ]
     }
     """
-    
+FIRST_RESPONDER_CHUNK_TOKENS = 4000  # CR data per request, leaves room for the reply
+MAX_CONCURRENT_CHUNKS = 4
+MAX_CHUNK_RETRIES = 2
+STRUCTURED_RESPONSE_ERROR = "Error: Failed to generate structured response"
+
+def response_tokens(message: BaseMessage) -> int:
+    """Total tokens reported for an LLM response, 0 if the provider did not report usage"""
+    usage = getattr(message, "usage_metadata", None) or {}
+    return usage.get("total_tokens", 0)
+
+def _chunk_prompt(chunk: List[Dict], legend: Optional[List[str]] = None) -> str:
+    """Prompt for one batch; compacted notes get the legend lines this batch references"""
+    prompt = f"Please analyze the following CR data and provide structured summaries: {json.dumps({'cr_data': chunk})}"
+    legend_text = legend_prompt(legend, referenced_lines(chunk)) if legend else ""
+    if not legend_text:
+        return prompt
+    return f"{legend_text}\n\n{prompt}"
+
+async def _analyse_chunk(model, chunk: List[Dict], semaphore: asyncio.Semaphore, usage: Optional[Dict[str, int]] = None, legend: Optional[List[str]] = None) -> Optional[CRAnalysisResponse]:
+    """Summarize one batch of CRs, retrying just this batch if its reply fails validation"""
+    cr_ids = ', '.join(cr["cr_id"] for cr in chunk)
     messages = [
-        SystemMessage(content=system_prompt),
-        HumanMessage(content=f"Please analyze the following CR data and provide structured summaries: {state[-1].content}")
+        SystemMessage(content=FIRST_RESPONDER_SYSTEM_PROMPT),
+        HumanMessage(content=_chunk_prompt(chunk, legend))
     ]
+    async with semaphore:
+        for attempt in range(MAX_CHUNK_RETRIES + 1):
+            response = await model.ainvoke(messages)
+            if usage is not None:
+                usage["total_tokens"] = usage.get("total_tokens", 0) + response_tokens(response)
+            try:
+                return CRAnalysisResponse.model_validate_json(response.content)
+            except Exception as e:
+                logger.warning(f"Error parsing response for {cr_ids} (attempt {attempt + 1}): {e}")
+                # The correction also changes the prompt, so the retry is not served from the LLM cache
+                messages = messages[:2] + [
+                    response,
+                    HumanMessage(content=f"Your reply did not match the required JSON structure ({e}). Reply again with only valid JSON.")
+                ]
+    return None
+
+def _merge_summaries(chunks: List[List[Dict]], analyses: List[Optional[CRAnalysisResponse]]) -> List[CRSummary]:
+    """Combine per-batch results into one list ordered like the input CRs"""
+    order = {cr_id: i for i, cr_id in enumerate(cr["cr_id"] for chunk in chunks for cr in chunk)}
+    summaries = []
+    for chunk, analysis in zip(chunks, analyses):
+        if analysis is None:
+            summaries.extend(CRSummary(cr_id=cr["cr_id"], summary=STRUCTURED_RESPONSE_ERROR) for cr in chunk)
+        else:
+            summaries.extend(analysis.summaries)
+    return sorted(summaries, key=lambda summary: order.get(summary.cr_id, len(order)))
+
+async def draft_summaries(cr_data: List[Dict], usage: Optional[Dict[str, int]] = None, legend: Optional[List[str]] = None) -> Optional[List[CRSummary]]:
+    """Summarize CR records in concurrent token-budgeted batches; None if every batch failed.
+    Token usage is added to usage["total_tokens"] when a dict is given. Pass the legend
+    when the records were compacted by compact_notes."""
+    # Split the CRs into token-budgeted batches that are analysed concurrently;
+    # compacted batches also budget for the legend lines sent with them
+    count_tokens = get_token_counter(LLM_MODEL)
+    if legend:
+        chunks = chunk_compacted(cr_data, legend, FIRST_RESPONDER_CHUNK_TOKENS, count_tokens) or [[]]
+    else:
+        chunks = chunk_crs(cr_data, FIRST_RESPONDER_CHUNK_TOKENS, count_tokens) or [[]]
     
     # Use JSON mode to ensure structured output
-    response = ChatOpenAI(
-        model="gpt-3.5-turbo-1106",
-        response_format={"type": "json_object"}
-    ).invoke(messages)
+    model = get_chat_model().bind(response_format={"type": "json_object"})
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_CHUNKS)
+    analyses = await asyncio.gather(*(_analyse_chunk(model, chunk, semaphore, usage, legend) for chunk in chunks))
     
-    try:
-        # Parse the response into our Pydantic model
-        analysis = CRAnalysisResponse.model_validate_json(response.content)
-        
-        # Format the response in the desired text format
-        formatted_response = "\n\n".join([
-            f"CR_ID: {summary.cr_id}\nSummary: {summary.summary}"
-            for summary in analysis.summaries
-        ])
-        
-        return state + [HumanMessage(content=formatted_response)]
-    except Exception as e:
-        print(f"Error parsing response: {e}")
-        return state + [HumanMessage(content="Error: Failed to generate structured response")]
+    if all(analysis is None for analysis in analyses):
+        return None
+    return _merge_summaries(chunks, analyses)
 
-def revisor(state: List[BaseMessage]) -> List[BaseMessage]:
-    """Revise and improve the previous response"""
+def format_summaries(summaries: List[CRSummary]) -> str:
+    """Render summaries in the text format used by the revisor and final output"""
+    return "\n\n".join([
+        f"CR_ID: {summary.cr_id}\nSummary: {summary.summary}"
+        for summary in summaries
+    ])
+
+async def first_responder(state: AnalysisState) -> AnalysisState:
+    """Generate initial response based on CR notes using structured output"""
+    usage = {"total_tokens": 0}
+    # CR records are rendered to text only here, at the prompt boundary
+    if state.get("compacted_crs"):
+        summaries = await draft_summaries(state["compacted_crs"], usage, state["note_legend"])
+    else:
+        summaries = await draft_summaries([cr.to_dict() for cr in _representatives(state)], usage)
+    draft = STRUCTURED_RESPONSE_ERROR if summaries is None else format_summaries(_fan_out_summaries(summaries, state))
+    
+    return {"drafts": [draft], "tokens_used": usage["total_tokens"]}
+
+async def revise_analysis(analysis: str) -> BaseMessage:
+    """Ask the model for an improved version of an analysis"""
     messages = [
         SystemMessage(content="You are an expert wireless systems researcher. Review and improve the previous analysis."),
-        HumanMessage(content=f"Previous analysis: {state[-1].content}\nPlease provide an improved version.")
+        HumanMessage(content=f"Previous analysis: {analysis}\nPlease provide an improved version.")
     ]
     
-    response = ChatOpenAI(model="gpt-3.5-turbo-1106").invoke(messages)
-    return state + [response]
+    return await get_chat_model().ainvoke(messages)
+
+async def revisor(state: AnalysisState) -> AnalysisState:
+    """Revise and improve the previous response"""
+    response = await revise_analysis(state["drafts"][-1])
+    return {
+        "drafts": [response.content],
+        "revision_count": state["revision_count"] + 1,
+        "tokens_used": response_tokens(response)
+    }
 
 # Create the tool
 fetch_notes_tool = StructuredTool.from_function(
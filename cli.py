@@ -0,0 +1,167 @@
+"""
+Command line entry point for the CR analysis graph.
+
+Only the standard library is imported up front. dotenv, langgraph, langchain
+and the chains are imported, and the graph compiled, by the command that
+needs them. `--help` and the client side of a warm worker pay no import cost.
+
+    python cli.py run "Could you please analyse CRs MOLY97243503 and MOLY94819931"
+    python cli.py serve --socket db_path/worker.sock &
+    python cli.py run --socket db_path/worker.sock "Could you please analyse CRs MOLY97243503"
+
+`serve` keeps a worker resident with the graph built and the chat model
+constructed. It answers newline-delimited JSON requests on a unix socket:
+{"request": ..., "thread_id": ...} is answered with {"ok": true, "summary": ...}
+or {"ok": false, "error": ...}. `run --socket` falls back to analysing in
+process when no worker is listening.
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import sys
+import uuid
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+if TYPE_CHECKING:
+    import asyncio
+
+DEFAULT_SOCKET = os.getenv("CLI_SOCKET", "db_path/worker.sock")
+
+
+def _load_env():
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+
+async def _analyse(request: str, thread_id: Optional[str] = None) -> Dict:
+    from main import run_analysis
+
+    result = await run_analysis(request, thread_id)
+    return {"ok": True, "summary": result["drafts"][-1], "tokens_used": result.get("tokens_used", 0)}
+
+
+def _ask_worker(socket_path: str, payload: Dict) -> Optional[Dict]:
+    """Send one request to a warm worker; None when no worker is listening."""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.connect(socket_path)
+            conn.sendall(json.dumps(payload).encode() + b"\n")
+            with conn.makefile("rb") as reader:
+                line = reader.readline()
+    except (FileNotFoundError, ConnectionRefusedError):
+        return None
+    return json.loads(line) if line else {"ok": False, "error": "worker closed the connection"}
+
+
+def run_command(args: argparse.Namespace) -> int:
+    # A named thread keeps its checkpoints, so a failed run can be resumed with --thread-id
+    thread_id = args.thread_id or uuid.uuid4().hex
+    payload = {"request": args.request, "thread_id": thread_id}
+    response = _ask_worker(args.socket, payload) if args.socket else None
+    if response is None:
+        import asyncio
+
+        _load_env()
+        try:
+            response = asyncio.run(_analyse(args.request, thread_id))
+        except Exception as e:
+            response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+    if not response["ok"]:
+        response["thread_id"] = thread_id
+
+    if args.json:
+        print(json.dumps(response))
+    elif response["ok"]:
+        print(response["summary"])
+    else:
+        print(f"Analysis failed: {response['error']}", file=sys.stderr)
+        print(f"Resume with --thread-id {thread_id}", file=sys.stderr)
+    return 0 if response["ok"] else 1
+
+
+async def _handle_client(reader: "asyncio.StreamReader", writer: "asyncio.StreamWriter"):
+    try:
+        while line := await reader.readline():
+            try:
+                payload = json.loads(line)
+                if payload.get("ping"):
+                    response = {"ok": True, "pong": True}
+                else:
+                    response = await _analyse(payload["request"], payload.get("thread_id"))
+            except Exception as e:
+                response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def _serve(socket_path: str):
+    import asyncio
+    from chains import get_cr_notes_store, get_signature_index
+    from llm_clients import get_chat_model
+    from main import get_graph
+    import metrics
+
+    # Pay for imports, graph compilation, client construction and the CR indexes once, before the first request
+    get_graph()
+    get_chat_model()
+    get_cr_notes_store()
+    get_signature_index()
+    metrics.start_from_env()
+
+    if os.path.exists(socket_path):
+        if _ask_worker(socket_path, {"ping": True}) is not None:
+            raise SystemExit(f"A worker is already listening on {socket_path}")
+        os.unlink(socket_path)
+    os.makedirs(os.path.dirname(socket_path) or ".", exist_ok=True)
+
+    server = await asyncio.start_unix_server(_handle_client, path=socket_path)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    print(f"Worker listening on {socket_path}")
+    try:
+        async with server:
+            await stop.wait()
+    finally:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        get_graph().checkpointer.close()
+
+
+def serve_command(args: argparse.Namespace) -> int:
+    import asyncio
+
+    _load_env()
+    asyncio.run(_serve(args.socket))
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Analyse one request")
+    run_parser.add_argument("request", help="Request text, e.g. 'Could you please analyse CRs MOLY97243503'")
+    run_parser.add_argument("--thread-id", help="Checkpoint thread to resume if unfinished; defaults to a new thread")
+    run_parser.add_argument("--socket", help="Use the warm worker on this socket if one is listening")
+    run_parser.add_argument("--json", action="store_true", help="Print the result as JSON")
+    run_parser.set_defaults(func=run_command)
+
+    serve_parser = commands.add_parser("serve", help="Run a warm worker on a unix socket")
+    serve_parser.add_argument("--socket", default=DEFAULT_SOCKET)
+    serve_parser.set_defaults(func=serve_command)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+import json
+from functools import lru_cache
+from typing import Callable, Dict, List
+
+TokenCounter = Callable[[str], int]
+
+
+def approx_token_count(text: str) -> int:
+    """Offline estimate of ~4 characters per token; used when no tokenizer is available."""
+    return (len(text) + 3) // 4
+
+
+@lru_cache(maxsize=None)
+def get_token_counter(model: str = "gpt-3.5-turbo-1106") -> TokenCounter:
+    """
+    Return a token counter for the model.
+
+    Uses tiktoken's local BPE tables when they can be loaded and falls back to
+    approx_token_count otherwise, so chunking keeps working offline.
+    """
+    try:
+        import tiktoken
+
+        encoding = tiktoken.encoding_for_model(model)
+        encoding.encode("warm up")
+    except Exception:
+        return approx_token_count
+    return lambda text: len(encoding.encode(text))
+
+
+def render_cr(cr: Dict) -> str:
+    """Compact JSON rendering of one CR record, as sent to the model."""
+    return json.dumps(cr, separators=(",", ":"))
+
+
+def chunk_crs(crs: List[Dict], max_tokens: int, count_tokens: TokenCounter = approx_token_count) -> List[List[Dict]]:
+    """
+    Greedily group CRs, in order, into batches whose rendered size fits a token budget.
+
+    A single CR larger than the budget is placed in a batch of its own.
+
+    Args:
+        crs (List[Dict]): CR records ({"cr_id", "notes", "status"})
+        max_tokens (int): Token budget for the CR data of one batch
+        count_tokens (TokenCounter): Function returning the token count of a string
+
+    Returns:
+        List[List[Dict]]: Batches of CR records preserving the input order
+    """
+    chunks: List[List[Dict]] = []
+    current: List[Dict] = []
+    used = 0
+    for cr in crs:
+        tokens = count_tokens(render_cr(cr))
+        if current and used + tokens > max_tokens:
+            chunks.append(current)
+            current, used = [], 0
+        current.append(cr)
+        used += tokens
+    if current:
+        chunks.append(current)
+    return chunks
@@ -0,0 +1,301 @@
+"""
+Near-duplicate CR clustering with NumPy MinHash.
+
+Each CR's notes and description are reduced to word 3-gram shingles and a
+MinHash signature; LSH banding proposes candidates and a CR joins an earlier
+representative once their estimated Jaccard similarity reaches the threshold.
+Signatures are kept in an SQLite index keyed by CR ID and content hash, so only
+new or changed CRs are hashed again:
+
+    python cr_clustering.py --json input_json/Updated_CR_data.json
+    python cr_clustering.py --issues-db db_path/issues_database.sqlite
+"""
+import argparse
+import hashlib
+import json
+import re
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from database_access import MAX_QUERY_PARAMS, ConnectionPool
+
+NUM_PERM = 64
+BANDS = 16  # 16 bands of 4 rows: pairs above ~0.5 Jaccard usually share a bucket
+SHINGLE_SIZE = 3
+SIMILARITY_THRESHOLD = 0.8
+MAX_BLOCK_SHINGLES = 50_000  # shingles hashed per NumPy block, bounds peak memory
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_WORD_RE = re.compile(r"\w+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cr_signatures (
+    cr_id TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    signature BLOB NOT NULL
+)
+"""
+META_SCHEMA = "CREATE TABLE IF NOT EXISTS cr_signatures_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+
+
+def cr_text(cr: Dict) -> str:
+    """Text a CR is compared on: its notes followed by its description."""
+    return "\n".join(list(cr.get("notes") or []) + [cr.get("description") or ""])
+
+
+def issue_text(title: str, description: str) -> str:
+    """Text an issues-table row is compared on."""
+    return f"{title or ''}\n{description or ''}"
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> np.ndarray:
+    """32-bit hashes of the distinct word n-grams of a text."""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < size:
+        grams = {" ".join(words)} if words else set()
+    else:
+        grams = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    return np.fromiter((zlib.crc32(gram.encode()) for gram in grams), dtype=np.uint64, count=len(grams))
+
+
+def _permutations(num_perm: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+    return a & _MAX_HASH, b & _MAX_HASH
+
+
+def minhash_signatures(texts: Sequence[str], num_perm: int = NUM_PERM, seed: int = 1) -> np.ndarray:
+    """
+    MinHash signatures of many texts at once.
+
+    The shingles of consecutive texts are concatenated into blocks of about
+    MAX_BLOCK_SHINGLES and every permutation is applied to a whole block with
+    one broadcast, then reduced per text with np.minimum.reduceat.
+
+    Returns:
+        np.ndarray: (len(texts), num_perm) uint32 array; texts without words get all-max rows
+    """
+    a, b = _permutations(num_perm, seed)
+    signatures = np.full((len(texts), num_perm), _MAX_HASH, dtype=np.uint64)
+    per_text = [shingles(text) for text in texts]
+
+    start = 0
+    while start < len(per_text):
+        end, size = start, 0
+        while end < len(per_text) and (end == start or size + len(per_text[end]) <= MAX_BLOCK_SHINGLES):
+            size += len(per_text[end])
+            end += 1
+        rows = [i for i in range(start, end) if len(per_text[i])]
+        if rows:
+            block = np.concatenate([per_text[i] for i in rows])
+            offsets = np.cumsum([0] + [len(per_text[i]) for i in rows[:-1]])
+            # (a * x + b) mod p, truncated to 32 bits. a, b and x are masked to 32 bits, so
+            # a * x + b <= (2**32 - 1)**2 + 2**32 - 1 = 2**64 - 2**32 and never wraps uint64
+            block &= _MAX_HASH
+            hashed = ((block[None, :] * a[:, None] + b[:, None]) % _MERSENNE_PRIME) & _MAX_HASH
+            signatures[rows] = np.minimum.reduceat(hashed, offsets, axis=1).T
+        start = end
+    return signatures.astype(np.uint32)
+
+
+def cluster_signatures(signatures: np.ndarray, threshold: float = SIMILARITY_THRESHOLD, bands: int = BANDS) -> np.ndarray:
+    """
+    Group near-duplicate signatures around representatives.
+
+    Rows are visited in order; a row joins the most similar earlier representative
+    it shares an LSH bucket with if their estimated Jaccard similarity reaches the
+    threshold, and otherwise becomes a representative itself. Every member is thus
+    close to its own representative, not just to some other member.
+
+    Returns:
+        np.ndarray: For every row, the index of its cluster representative;
+        representatives and rows without shingles map to themselves
+    """
+    n, num_perm = signatures.shape
+    representative = np.arange(n)
+    valid = np.flatnonzero((signatures != np.uint32(_MAX_HASH)).any(axis=1))
+    if len(valid) < 2:
+        return representative
+
+    # Bucket ID of every valid row in every band, computed one band at a time
+    rows = num_perm // bands
+    buckets = np.empty((len(valid), bands), dtype=np.int64)
+    for band in range(bands):
+        chunk = np.ascontiguousarray(signatures[valid, band * rows:(band + 1) * rows])
+        keys = chunk.view(np.dtype((np.void, chunk.dtype.itemsize * rows))).ravel()
+        _, buckets[:, band] = np.unique(keys, return_inverse=True)
+
+    leaders: List[Dict[int, List[int]]] = [{} for _ in range(bands)]  # band -> bucket -> representatives
+    for position, row in enumerate(valid):
+        row_buckets = buckets[position].tolist()
+        candidates = {rep for band, bucket in enumerate(row_buckets) for rep in leaders[band].get(bucket, ())}
+        if candidates:
+            candidates = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            agreement = (signatures[candidates] == signatures[row]).mean(axis=1)
+            best = int(np.argmax(agreement))
+            if agreement[best] >= threshold:
+                representative[row] = candidates[best]
+                continue
+        for band, bucket in enumerate(row_buckets):
+            leaders[band].setdefault(bucket, []).append(row)
+    return representative
+
+
+class SignatureIndex:
+    def __init__(self, db_path: str = "db_path/cr_signatures.sqlite", num_perm: int = NUM_PERM, seed: int = 1, pool_size: int = 2):
+        """
+        On-disk MinHash signature index keyed by CR ID.
+
+        A stored signature is reused while the CR's content hash is unchanged. The
+        index is cleared when opened with a different num_perm or seed.
+
+        Args:
+            db_path (str): Path to the index database
+            num_perm (int): Signature length
+            seed (int): Seed of the hash permutations
+            pool_size (int): Maximum number of pooled connections
+        """
+        self.db_path = db_path
+        self.num_perm = num_perm
+        self.seed = seed
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.pool = ConnectionPool(db_path, pool_size=pool_size)
+        params = json.dumps({"num_perm": num_perm, "seed": seed, "shingle_size": SHINGLE_SIZE})
+        with self.pool.connection() as conn:
+            conn.execute(SCHEMA)
+            conn.execute(META_SCHEMA)
+            row = conn.execute("SELECT value FROM cr_signatures_meta WHERE key = 'params'").fetchone()
+            if row is None or row[0] != params:
+                conn.execute("DELETE FROM cr_signatures")
+                conn.execute("INSERT OR REPLACE INTO cr_signatures_meta (key, value) VALUES ('params', ?)", (params,))
+            conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def signatures(self, items: Sequence[Tuple[str, str]]) -> np.ndarray:
+        """
+        Signatures for (cr_id, text) pairs, computing and storing only the missing or stale ones.
+
+        Returns:
+            np.ndarray: (len(items), num_perm) uint32 array in input order
+        """
+        hashes = [content_hash(text) for _, text in items]
+        stored: Dict[str, Tuple[str, bytes]] = {}
+        cr_ids = list(dict.fromkeys(cr_id for cr_id, _ in items))
+        with self.pool.connection() as conn:
+            for i in range(0, len(cr_ids), MAX_QUERY_PARAMS):
+                chunk = cr_ids[i:i + MAX_QUERY_PARAMS]
+                placeholders = ",".join("?" * len(chunk))
+                for cr_id, digest, blob in conn.execute(
+                    f"SELECT cr_id, content_hash, signature FROM cr_signatures WHERE cr_id IN ({placeholders})",
+                    chunk
+                ):
+                    stored[cr_id] = (digest, blob)
+
+        result = np.empty((len(items), self.num_perm), dtype=np.uint32)
+        missing = []
+        for i, ((cr_id, _), digest) in enumerate(zip(items, hashes)):
+            cached = stored.get(cr_id)
+            if cached is not None and cached[0] == digest:
+                result[i] = np.frombuffer(cached[1], dtype=np.uint32)
+            else:
+                missing.append(i)
+        self.hits += len(items) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            computed = minhash_signatures([items[i][1] for i in missing], self.num_perm, self.seed)
+            result[missing] = computed
+            with self.pool.connection() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO cr_signatures (cr_id, content_hash, signature) VALUES (?, ?, ?)",
+                    [(items[i][0], hashes[i], computed[row].tobytes()) for row, i in enumerate(missing)]
+                )
+                conn.commit()
+        return result
+
+    def close(self):
+        self.pool.close()
+
+
+def cluster_crs(items: Sequence[Tuple[str, str]], index: Optional[SignatureIndex] = None, threshold: float = SIMILARITY_THRESHOLD) -> Dict[str, str]:
+    """
+    Map every CR ID to the ID of its cluster representative.
+
+    Args:
+        items (Sequence[Tuple[str, str]]): (cr_id, text) pairs; the first member of a cluster represents it
+        index (Optional[SignatureIndex]): Signature index to reuse, None to hash everything
+        threshold (float): Minimum estimated Jaccard similarity of near-duplicates
+
+    Returns:
+        Dict[str, str]: cr_id -> representative cr_id (itself for singletons)
+    """
+    if not items:
+        return {}
+    if index is not None:
+        signatures = index.signatures(items)
+    else:
+        signatures = minhash_signatures([text for _, text in items])
+    representatives = cluster_signatures(signatures, threshold)
+    return {cr_id: items[rep][0] for (cr_id, _), rep in zip(items, representatives)}
+
+
+def note_differences(notes: List[str], representative_notes: List[str], limit: int = 5) -> str:
+    """Describe how a cluster member's notes differ from its representative's."""
+    rep_lines = set(representative_notes)
+    own_lines = set(notes)
+    added = [note for note in notes if note not in rep_lines]
+    omitted = [note for note in representative_notes if note not in own_lines]
+    parts = []
+    if added:
+        parts.append("adds " + "; ".join(f'"{note}"' for note in added[:limit]) + (" ..." if len(added) > limit else ""))
+    if omitted:
+        parts.append("omits " + "; ".join(f'"{note}"' for note in omitted[:limit]) + (" ..." if len(omitted) > limit else ""))
+    return ", ".join(parts) if parts else "no differences in notes"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--json", help="CR notes JSON file")
+    source.add_argument("--issues-db", help="Issues database with Title/Description columns")
+    parser.add_argument("--index", default="db_path/cr_signatures.sqlite")
+    parser.add_argument("--threshold", type=float, default=SIMILARITY_THRESHOLD)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.json:
+        with open(args.json) as f:
+            items = [(cr["CR_ID"], cr_text(cr)) for cr in json.load(f)]
+    else:
+        from database_access import DatabaseAccess
+
+        db = DatabaseAccess(args.issues_db, read_only=True)
+        details = db.get_issue_details_many(db.get_all_mids())
+        db.close()
+        items = [(mid, issue_text(title, description)) for mid, (title, description) in details.items()]
+    loaded = time.perf_counter()
+
+    index = SignatureIndex(args.index)
+    clusters = cluster_crs(items, index, args.threshold)
+    index.close()
+    done = time.perf_counter()
+
+    representatives = set(clusters.values())
+    print(f"{len(items)} CRs -> {len(representatives)} clusters "
+          f"(load {loaded - start:.2f}s, cluster {done - loaded:.2f}s, "
+          f"{index.hits} signatures reused, {index.misses} computed)")
+
+
+if __name__ == "__main__":
+    main()
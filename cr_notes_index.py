@@ -0,0 +1,233 @@
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+INDEX_VERSION = 1
+# Size of the byte windows hashed to detect in-place rewrites of indexed data
+CHECK_WINDOW = 4096
+
+# One token per JSON string (escapes included) or structural bracket, so
+# brackets inside strings never affect the depth count.
+_TOKEN_RE = re.compile(rb'"(?:[^"\\]|\\.)*"|[{}\[\]]', re.DOTALL)
+_CR_ID_KEY = b'"CR_ID"'
+
+
+class CROffsetIndex:
+    def __init__(
+        self,
+        json_path: str = "input_json/Updated_CR_data.json",
+        index_path: Optional[str] = None
+    ):
+        """
+        Initialize a memory-mapped CR notes index backed by a sidecar offset file.
+
+        Args:
+            json_path (str): Path to the CR data JSON array
+            index_path (Optional[str]): Sidecar index path, defaults to "<json_path>.idx"
+        """
+        self.json_path = json_path
+        self.index_path = index_path or f"{json_path}.idx"
+        self._offsets: Dict[str, Tuple[int, int]] = {}
+        self._signature: Optional[Tuple[int, int]] = None
+        self._file = None
+        self._mm: Optional[mmap.mmap] = None
+        self._lock = threading.Lock()
+
+    def _file_signature(self) -> Tuple[int, int]:
+        """Return (mtime_ns, size) of the CR data file."""
+        stat = os.stat(self.json_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def _window_hash(mm: mmap.mmap, start: int, end: int) -> str:
+        return hashlib.sha1(mm[max(start, 0):end]).hexdigest()
+
+    def _read_sidecar(self) -> Tuple[Optional[dict], Dict[str, Tuple[int, int]]]:
+        """Load the sidecar header and offsets, or (None, {}) if missing or stale format."""
+        try:
+            with open(self.index_path, 'r') as f:
+                header = json.loads(f.readline())
+                if header.get("version") != INDEX_VERSION:
+                    return None, {}
+                offsets = {}
+                for line in f:
+                    cr_id, start, end = line.rstrip('\n').split('\t')
+                    offsets.setdefault(cr_id, (int(start), int(end)))
+                return header, offsets
+        except (OSError, ValueError):
+            return None, {}
+
+    def _write_sidecar(self, header: dict, offsets: Dict[str, Tuple[int, int]]):
+        """Atomically replace the sidecar so concurrent readers never see a partial index."""
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(json.dumps(header) + '\n')
+            for cr_id, (start, end) in offsets.items():
+                f.write(f"{cr_id}\t{start}\t{end}\n")
+        os.replace(tmp_path, self.index_path)
+
+    def _sidecar_is_prefix(self, header: Optional[dict], mm: mmap.mmap) -> bool:
+        """Check that the bytes indexed previously are unchanged, i.e. the file was only appended to."""
+        if header is None:
+            return False
+        scanned_to = header["scanned_to"]
+        if scanned_to > len(mm):
+            return False
+        return (
+            header["head"] == self._window_hash(mm, 0, min(CHECK_WINDOW, scanned_to))
+            and header["tail"] == self._window_hash(mm, scanned_to - CHECK_WINDOW, scanned_to)
+        )
+
+    @staticmethod
+    def _scan(mm: mmap.mmap, pos: int, depth: int, offsets: Dict[str, Tuple[int, int]]) -> int:
+        """
+        Stream over the JSON array from pos and record the byte range of each top-level object.
+
+        Args:
+            mm (mmap.mmap): Mapped CR data file
+            pos (int): Byte offset to resume scanning from
+            depth (int): Bracket depth at pos (0 before the array, 1 inside it)
+            offsets (Dict[str, Tuple[int, int]]): Updated in place with CR_ID -> (start, end)
+
+        Returns:
+            int: Offset just past the last complete top-level object
+        """
+        scanned_to = pos
+        obj_start = None
+        cr_id = None
+        expect_id = False
+        for match in _TOKEN_RE.finditer(mm, pos):
+            token = match.group()
+            first = token[:1]
+            if first == b'"':
+                if depth == 2:
+                    if expect_id:
+                        cr_id = json.loads(token)
+                        expect_id = False
+                    elif token == _CR_ID_KEY and mm[match.end():match.end() + 16].lstrip()[:1] == b':':
+                        expect_id = True
+            elif first in (b'{', b'['):
+                if depth == 1 and first == b'{':
+                    obj_start = match.start()
+                    cr_id = None
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 1 and first == b'}' and obj_start is not None:
+                    if cr_id is not None:
+                        offsets.setdefault(cr_id, (obj_start, match.end()))
+                    scanned_to = match.end()
+                    obj_start = None
+                elif depth == 0:
+                    break
+        return scanned_to
+
+    def _refresh(self, signature: Tuple[int, int]):
+        """Remap the data file and bring the sidecar up to date, scanning only appended bytes when possible."""
+        if self._mm is not None:
+            self._mm.close()
+            self._file.close()
+            self._mm = None
+
+        if signature[1] == 0:
+            self._offsets = {}
+            self._signature = signature
+            return
+        data_file = open(self.json_path, 'rb')
+        mm = None
+        try:
+            mm = mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+            # Serialize index builds across processes sharing the same sidecar
+            with open(f"{self.index_path}.lock", 'w') as lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    header, offsets = self._read_sidecar()
+                    if not self._sidecar_is_prefix(header, mm):
+                        header, offsets = None, {}
+                    if header is None or header["size"] != len(mm):
+                        if header is None:
+                            scanned_to = self._scan(mm, 0, 0, offsets)
+                        else:
+                            scanned_to = self._scan(mm, header["scanned_to"], 1, offsets)
+                        self._write_sidecar(self._header(mm, scanned_to), offsets)
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        except BaseException:
+            # A failed scan must not leave the data file mapped and open until GC
+            if mm is not None:
+                mm.close()
+            data_file.close()
+            raise
+
+        self._file = data_file
+        self._mm = mm
+        self._offsets = offsets
+        self._signature = signature
+
+    def _header(self, mm: mmap.mmap, scanned_to: int) -> dict:
+        return {
+            "version": INDEX_VERSION,
+            "size": len(mm),
+            "scanned_to": scanned_to,
+            "head": self._window_hash(mm, 0, min(CHECK_WINDOW, scanned_to)),
+            "tail": self._window_hash(mm, scanned_to - CHECK_WINDOW, scanned_to),
+        }
+
+    def _ensure_fresh(self):
+        """Rebuild or extend the index only if the data file's mtime or size has changed."""
+        signature = self._file_signature()
+        if signature == self._signature:
+            return
+        with self._lock:
+            if signature != self._signature:
+                self._refresh(signature)
+
+    def get(self, cr_id: str) -> Optional[List[str]]:
+        """
+        Retrieve the notes for a single CR ID.
+
+        Args:
+            cr_id (str): The CR ID to look up
+
+        Returns:
+            Optional[List[str]]: The notes if the CR exists, None otherwise
+        """
+        return self.get_many([cr_id])[cr_id]
+
+    def get_many(self, cr_ids: Iterable[str]) -> Dict[str, Optional[List[str]]]:
+        """
+        Retrieve the notes for several CR IDs, decoding only the requested objects.
+
+        Args:
+            cr_ids (Iterable[str]): The CR IDs to look up
+
+        Returns:
+            Dict[str, Optional[List[str]]]: Notes per requested CR ID, None for unknown IDs
+        """
+        self._ensure_fresh()
+        with self._lock:
+            mm = self._mm
+            results: Dict[str, Optional[List[str]]] = {}
+            for cr_id in cr_ids:
+                span = self._offsets.get(cr_id)
+                if span is None or mm is None:
+                    results[cr_id] = None
+                    continue
+                start, end = span
+                results[cr_id] = json.loads(mm[start:end]).get('notes', [])
+            return results
+
+    def close(self):
+        """Unmap the data file."""
+        with self._lock:
+            if self._mm is not None:
+                self._mm.close()
+                self._file.close()
+                self._mm = None
+            self._signature = None
@@ -0,0 +1,98 @@
+import json
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from cr_notes_index import CROffsetIndex
+
+# Files above this size are served from the mmap offset index instead of being loaded whole
+MMAP_THRESHOLD_BYTES = 256 * 1024 * 1024
+
+
+class CRNotesStore:
+    def __init__(self, json_path: str = "input_json/Updated_CR_data.json"):
+        """Initialize the store; the CR data file is loaded lazily on first lookup."""
+        self.json_path = json_path
+        self._index: Dict[str, List[str]] = {}
+        self._signature: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+
+    def _file_signature(self) -> Tuple[int, int]:
+        """Return (mtime_ns, size) of the CR data file."""
+        stat = os.stat(self.json_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self, signature: Tuple[int, int]):
+        """Parse the CR data file once and build the CR_ID -> notes index."""
+        with open(self.json_path, 'r') as f:
+            cr_data = json.load(f)
+
+        index: Dict[str, List[str]] = {}
+        for cr in cr_data:
+            # Keep the first occurrence, matching the old linear scan
+            index.setdefault(cr['CR_ID'], cr.get('notes', []))
+        self._index = index
+        self._signature = signature
+
+    def _ensure_loaded(self):
+        """Reload the index only if the file's mtime or size has changed."""
+        signature = self._file_signature()
+        if signature == self._signature:
+            return
+        with self._lock:
+            if signature != self._signature:
+                self._load(signature)
+
+    def get(self, cr_id: str) -> Optional[List[str]]:
+        """
+        Retrieve the notes for a single CR ID.
+
+        Args:
+            cr_id (str): The CR ID to look up
+
+        Returns:
+            Optional[List[str]]: The notes if the CR exists, None otherwise
+        """
+        self._ensure_loaded()
+        return self._index.get(cr_id)
+
+    def get_many(self, cr_ids: Iterable[str]) -> Dict[str, Optional[List[str]]]:
+        """
+        Retrieve the notes for several CR IDs with a single freshness check.
+
+        Args:
+            cr_ids (Iterable[str]): The CR IDs to look up
+
+        Returns:
+            Dict[str, Optional[List[str]]]: Notes per requested CR ID, None for unknown IDs
+        """
+        self._ensure_loaded()
+        index = self._index
+        return {cr_id: index.get(cr_id) for cr_id in cr_ids}
+
+
+def open_cr_notes_store(
+    json_path: str = "input_json/Updated_CR_data.json",
+    mmap_threshold_bytes: int = MMAP_THRESHOLD_BYTES
+) -> Union[CRNotesStore, CROffsetIndex]:
+    """
+    Pick the CR notes backend for a data file.
+
+    Small files are parsed once into memory; large ones are memory-mapped and
+    looked up through a sidecar offset index so worker processes share pages.
+
+    Args:
+        json_path (str): Path to the CR data JSON array
+        mmap_threshold_bytes (int): File size at which the mmap index is used
+
+    Returns:
+        Union[CRNotesStore, CROffsetIndex]: A store exposing get() and get_many()
+    """
+    threshold = int(os.getenv("CR_NOTES_MMAP_THRESHOLD", mmap_threshold_bytes))
+    try:
+        size = os.path.getsize(json_path)
+    except OSError:
+        size = 0
+    if size >= threshold:
+        return CROffsetIndex(json_path)
+    return CRNotesStore(json_path)
@@ -1,18 +1,342 @@
+import asyncio
+import hashlib
+import queue
 import sqlite3
-from typing import List, Tuple, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple, Optional
+
+from metrics import timed
+
+# Stay below SQLite's default limit on bound parameters per statement
+MAX_QUERY_PARAMS = 900
+
+# Append-only log of inserted or edited issues, maintained by triggers so
+# pollers read only the rows after their last seq instead of the whole table
+CHANGE_LOG_SCHEMA = """
+CREATE TABLE issue_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    M_ID TEXT NOT NULL
+)
+"""
+CHANGE_LOG_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS issues_change_log_insert AFTER INSERT ON issues
+    BEGIN
+        INSERT INTO issue_changes (M_ID) VALUES (NEW.M_ID);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS issues_change_log_update AFTER UPDATE OF M_ID, Title, Description, Repeat_Steps ON issues
+    WHEN OLD.M_ID IS NOT NEW.M_ID OR OLD.Title IS NOT NEW.Title
+        OR OLD.Description IS NOT NEW.Description OR OLD.Repeat_Steps IS NOT NEW.Repeat_Steps
+    BEGIN
+        INSERT INTO issue_changes (M_ID) VALUES (NEW.M_ID);
+    END
+    """
+)
+
+
+def issue_hash(title: Optional[str], description: Optional[str], repeat_steps: Optional[str]) -> str:
+    """Content hash of the issue fields a tool run depends on."""
+    content = "\x1f".join(field or "" for field in (title, description, repeat_steps))
+    return hashlib.sha1(content.encode()).hexdigest()
+
+class ConnectionPool:
+    def __init__(
+        self,
+        db_path: str,
+        pool_size: int = 5,
+        read_only: bool = False,
+        cache_size_kib: int = 16384,
+        mmap_size: int = 256 * 1024 * 1024,
+        cached_statements: int = 256,
+        busy_timeout: float = 30.0
+    ):
+        """
+        Thread-safe bounded pool of reusable SQLite connections.
+        
+        Args:
+            db_path (str): Path to the SQLite database file
+            pool_size (int): Maximum number of open connections
+            read_only (bool): Open connections read-only; readers never take write locks
+            cache_size_kib (int): Page cache size per connection in KiB
+            mmap_size (int): Bytes of the database file to memory-map per connection
+            cached_statements (int): Prepared statements kept per connection for reuse
+            busy_timeout (float): Seconds to wait on a locked database before failing
+        """
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.read_only = read_only
+        self.cache_size_kib = cache_size_kib
+        self.mmap_size = mmap_size
+        self.cached_statements = cached_statements
+        self.busy_timeout = busy_timeout
+        self._idle: "queue.Queue[sqlite3.Connection]" = queue.Queue(maxsize=pool_size)
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _create(self) -> sqlite3.Connection:
+        """Open a new connection with the pool's pragmas applied."""
+        if self.read_only:
+            uri = f"{Path(self.db_path).resolve().as_uri()}?mode=ro"
+            conn = sqlite3.connect(
+                uri,
+                uri=True,
+                timeout=self.busy_timeout,
+                check_same_thread=False,
+                cached_statements=self.cached_statements
+            )
+            conn.execute("PRAGMA query_only = ON")
+        else:
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=self.busy_timeout,
+                check_same_thread=False,
+                cached_statements=self.cached_statements
+            )
+            # WAL lets readers proceed while the writer populates the issues table
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_size_kib)}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Borrow a connection, opening one if the pool is below capacity, else wait for one."""
+        if self._closed:
+            raise Exception("Connection pool is closed")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_create = self._created < self.pool_size
+            if can_create:
+                self._created += 1
+        if can_create:
+            try:
+                return self._create()
+            except sqlite3.Error:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get()
+
+    def release(self, conn: sqlite3.Connection):
+        """Return a connection to the pool, discarding any uncommitted work."""
+        if conn.in_transaction:
+            conn.rollback()
+        if self._closed:
+            conn.close()
+            return
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection for the duration of the block."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """Close all idle connections; borrowed ones are closed when released."""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
 
 class DatabaseAccess:
-    def __init__(self, db_path: str = "db_path/issues_database.sqlite"):
-        """Initialize database connection."""
+    def __init__(
+        self,
+        db_path: str = "db_path/issues_database.sqlite",
+        read_only: bool = False,
+        pool_size: int = 5,
+        cache_size_kib: int = 16384,
+        mmap_size: int = 256 * 1024 * 1024
+    ):
+        """
+        Initialize a pooled database accessor.
+        
+        Args:
+            db_path (str): Path to the SQLite database file
+            read_only (bool): Use read-only connections (agent side) so reads never block the writer
+            pool_size (int): Maximum number of pooled connections
+            cache_size_kib (int): SQLite page cache size per connection in KiB
+            mmap_size (int): Bytes of the database file to memory-map per connection
+        """
         self.db_path = db_path
+        self._version_conn: Optional[sqlite3.Connection] = None
+        self._version_lock = threading.Lock()
+        self.pool = ConnectionPool(
+            db_path,
+            pool_size=pool_size,
+            read_only=read_only,
+            cache_size_kib=cache_size_kib,
+            mmap_size=mmap_size
+        )
 
-    def _get_connection(self) -> sqlite3.Connection:
-        """Create and return a database connection."""
+    @contextmanager
+    def _get_connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a pooled database connection for the duration of the block."""
         try:
-            return sqlite3.connect(self.db_path)
+            conn = self.pool.acquire()
         except sqlite3.Error as e:
             raise Exception(f"Error connecting to database: {e}")
+        try:
+            yield conn
+        finally:
+            self.pool.release(conn)
+
+    def close(self):
+        """Close all pooled connections."""
+        with self._version_lock:
+            if self._version_conn is not None:
+                self._version_conn.close()
+                self._version_conn = None
+        self.pool.close()
+
+    @timed("db.get_data_version")
+    def get_data_version(self) -> int:
+        """
+        Return SQLite's data_version for the database.
+        
+        The value comes from one long-lived connection and changes whenever another
+        connection commits, so an unchanged value means there is nothing new to read.
+        
+        Returns:
+            int: Current data version
+        """
+        try:
+            with self._version_lock:
+                if self._version_conn is None:
+                    self._version_conn = self.pool._create()
+                return self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+        except sqlite3.Error as e:
+            raise Exception(f"Error reading data version: {e}")
+
+    @timed("db.get_mids_since")
+    def get_mids_since(self, last_rowid: int) -> List[Tuple[int, str]]:
+        """
+        Retrieve M_IDs inserted after a rowid high-water mark.
+        
+        Args:
+            last_rowid (int): Highest rowid already processed
+            
+        Returns:
+            List[Tuple[int, str]]: (rowid, M_ID) pairs in insertion order
+        """
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.execute(
+                    "SELECT rowid, M_ID FROM issues WHERE rowid > ? ORDER BY rowid",
+                    (last_rowid,)
+                )
+                rows = [(row[0], str(row[1])) for row in cursor.fetchall()]
+            
+            return rows
+        except sqlite3.Error as e:
+            raise Exception(f"Error retrieving M_IDs after rowid {last_rowid}: {e}")
+
+    def has_change_log(self) -> bool:
+        """Return True if the issue_changes log exists."""
+        try:
+            with self._get_connection() as conn:
+                return conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'issue_changes'"
+                ).fetchone() is not None
+        except sqlite3.Error as e:
+            raise Exception(f"Error checking for the issue change log: {e}")
+
+    def install_change_log(self) -> bool:
+        """
+        Create the issue_changes log and the triggers that fill it, if missing.
+
+        This is a one-off migration of the producer's database, run with
+        `python tool_runner.py --install-change-log`; runners only read the log.
+        
+        A newly created log is seeded with every existing issue, so the first poll
+        sees the whole table once and later polls only see inserts and edits.
+        
+        Returns:
+            bool: True if the log was created by this call
+        """
+        try:
+            with self._get_connection() as conn:
+                # Immediate transaction: runners starting together create and seed the log once
+                conn.execute("BEGIN IMMEDIATE")
+                exists = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'issue_changes'"
+                ).fetchone() is not None
+                if not exists:
+                    conn.execute(CHANGE_LOG_SCHEMA)
+                    conn.execute("INSERT INTO issue_changes (M_ID) SELECT M_ID FROM issues ORDER BY rowid")
+                for trigger in CHANGE_LOG_TRIGGERS:
+                    conn.execute(trigger)
+                conn.commit()
+            return not exists
+        except sqlite3.Error as e:
+            raise Exception(f"Error installing issue change log: {e}")
+
+    @timed("db.get_changes_since")
+    def get_changes_since(self, last_seq: int, limit: Optional[int] = None) -> List[Tuple[int, str]]:
+        """
+        Retrieve M_IDs inserted or edited after a change log high-water mark.
+        
+        Args:
+            last_seq (int): Highest change seq already processed
+            limit (Optional[int]): Maximum number of changes to return
+            
+        Returns:
+            List[Tuple[int, str]]: (seq, M_ID) pairs in change order; an M_ID may appear more than once
+        """
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.execute(
+                    "SELECT seq, M_ID FROM issue_changes WHERE seq > ? ORDER BY seq LIMIT ?",
+                    (last_seq, -1 if limit is None else limit)
+                )
+                return [(row[0], str(row[1])) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            raise Exception(f"Error retrieving issue changes after seq {last_seq}: {e}")
 
+    @timed("db.get_issue_hashes")
+    def get_issue_hashes(self, mids: Iterable[str]) -> Dict[str, str]:
+        """
+        Compute the content hash of Title, Description and Repeat_Steps for many M_IDs.
+        
+        Args:
+            mids (Iterable[str]): The M_IDs to look up
+            
+        Returns:
+            Dict[str, str]: Content hash per M_ID; missing M_IDs are omitted
+        """
+        unique_mids = list(dict.fromkeys(mids))
+        hashes: Dict[str, str] = {}
+        try:
+            with self._get_connection() as conn:
+                for start in range(0, len(unique_mids), MAX_QUERY_PARAMS):
+                    chunk = unique_mids[start:start + MAX_QUERY_PARAMS]
+                    placeholders = ", ".join("?" * len(chunk))
+                    cursor = conn.execute(
+                        f"SELECT M_ID, Title, Description, Repeat_Steps FROM issues WHERE M_ID IN ({placeholders})",
+                        chunk
+                    )
+                    for mid, title, description, repeat_steps in cursor.fetchall():
+                        hashes[str(mid)] = issue_hash(title, description, repeat_steps)
+            return hashes
+        except sqlite3.Error as e:
+            raise Exception(f"Error retrieving issue hashes for {len(unique_mids)} M_IDs: {e}")
+
+    @timed("db.get_all_mids")
     def get_all_mids(self) -> List[str]:
         """
         Retrieve all M_IDs from the database.
@@ -21,19 +345,15 @@ class DatabaseAccess:
             List[str]: List of all M_IDs
         """
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT M_ID FROM issues")
-            mids = [str(row[0]) for row in cursor.fetchall()]
-            
-            cursor.close()
-            conn.close()
+            with self._get_connection() as conn:
+                cursor = conn.execute("SELECT M_ID FROM issues")
+                mids = [str(row[0]) for row in cursor.fetchall()]
             
             return mids
         except sqlite3.Error as e:
             raise Exception(f"Error retrieving M_IDs: {e}")
 
+    @timed("db.get_issue_details")
     def get_issue_details(self, mid: str) -> Optional[Tuple[str, str]]:
         """
         Retrieve Title and Description for a specific M_ID.
@@ -45,21 +365,87 @@ class DatabaseAccess:
             Optional[Tuple[str, str]]: Tuple of (Title, Description) if found, None if not found
         """
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
+            with self._get_connection() as conn:
+                cursor = conn.execute(
+                    "SELECT Title, Description FROM issues WHERE M_ID = ?",
+                    (mid,)
+                )
+                result = cursor.fetchone()
             
-            cursor.execute(
-                "SELECT Title, Description FROM issues WHERE M_ID = ?",
-                (mid,)
-            )
-            result = cursor.fetchone()
+            return result if result else None
+        except sqlite3.Error as e:
+            raise Exception(f"Error retrieving issue details for M_ID {mid}: {e}")
+
+    @timed("db.get_issue_details_many")
+    def get_issue_details_many(self, mids: Iterable[str]) -> Dict[str, Tuple[str, str]]:
+        """
+        Retrieve Title and Description for many M_IDs over a single connection.
+        
+        Args:
+            mids (Iterable[str]): The M_IDs to look up
             
-            cursor.close()
-            conn.close()
+        Returns:
+            Dict[str, Tuple[str, str]]: (Title, Description) per M_ID; missing M_IDs are omitted
+        """
+        unique_mids = list(dict.fromkeys(mids))
+        details: Dict[str, Tuple[str, str]] = {}
+        if not unique_mids:
+            return details
+        
+        try:
+            with self._get_connection() as conn:
+                for start in range(0, len(unique_mids), MAX_QUERY_PARAMS):
+                    chunk = unique_mids[start:start + MAX_QUERY_PARAMS]
+                    placeholders = ", ".join("?" * len(chunk))
+                    cursor = conn.execute(
+                        f"SELECT M_ID, Title, Description FROM issues WHERE M_ID IN ({placeholders})",
+                        chunk
+                    )
+                    for mid, title, description in cursor.fetchall():
+                        details[str(mid)] = (title, description)
             
-            return result if result else None
+            return details
         except sqlite3.Error as e:
-            raise Exception(f"Error retrieving issue details for M_ID {mid}: {e}") 
+            raise Exception(f"Error retrieving issue details for {len(unique_mids)} M_IDs: {e}")
+
+
+class AsyncDatabaseAccess:
+    def __init__(self, db: Optional[DatabaseAccess] = None, max_workers: int = 4):
+        """
+        Awaitable façade over DatabaseAccess for use from async graph nodes.
+        
+        Queries run on a small dedicated thread pool so they never block the event loop.
+        
+        Args:
+            db (Optional[DatabaseAccess]): Underlying accessor, a default one is created if omitted
+            max_workers (int): Size of the dedicated query thread pool
+        """
+        self.db = db or DatabaseAccess(read_only=True)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="db-access"
+        )
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def get_all_mids(self) -> List[str]:
+        """Async version of DatabaseAccess.get_all_mids"""
+        return await self._run(self.db.get_all_mids)
+
+    async def get_issue_details(self, mid: str) -> Optional[Tuple[str, str]]:
+        """Async version of DatabaseAccess.get_issue_details"""
+        return await self._run(self.db.get_issue_details, mid)
+
+    async def get_issue_details_many(self, mids: Iterable[str]) -> Dict[str, Tuple[str, str]]:
+        """Async version of DatabaseAccess.get_issue_details_many"""
+        return await self._run(self.db.get_issue_details_many, list(mids))
+
+    def close(self):
+        """Shut down the query thread pool."""
+        self._executor.shutdown(wait=True)
+        self.db.close()
 
 # if __name__ == "__main__":
 #     db = DatabaseAccess()
@@ -0,0 +1,135 @@
+"""
+Local stand-in for the OpenAI chat completions endpoint.
+
+Answers /v1/chat/completions after a configurable delay. JSON-mode requests
+get a CRAnalysisResponse-shaped body naming every MOLY ID in the prompt; a
+configurable share of requests is rejected with 429 to exercise rate limiting.
+Running the module compares per-call clients invoked sequentially (the old
+node behaviour) with the shared pooled model awaited concurrently:
+
+    python fake_openai_server.py --requests 200 --latency 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+
+def _completion(body: dict) -> dict:
+    prompt = " ".join(str(message.get("content", "")) for message in body.get("messages", []))
+    if (body.get("response_format") or {}).get("type") == "json_object":
+        cr_ids = list(dict.fromkeys(re.findall(r"MOLY\d+", prompt)))
+        content = json.dumps({
+            "summaries": [{"cr_id": cr_id, "summary": f"Fake analysis of {cr_id}."} for cr_id in cr_ids]
+        })
+    else:
+        content = f"Revised analysis ({len(prompt)} characters reviewed)."
+    prompt_tokens = len(prompt) // 4
+    completion_tokens = len(content) // 4
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so client connection pooling is measurable
+    latency = 0.2
+    rate_limit_ratio = 0.0
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        if random.random() < self.rate_limit_ratio:
+            payload = json.dumps({"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}}).encode()
+            self.send_response(429)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.send_header("Retry-After", "1")
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+        time.sleep(self.latency)
+        payload = json.dumps(_completion(body)).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_server(latency: float = 0.2, port: int = 0, rate_limit_ratio: float = 0.0) -> Tuple[ThreadingHTTPServer, str]:
+    """Start the fake endpoint on a background thread; returns (server, base_url)."""
+    handler = type("Handler", (FakeOpenAIHandler,), {"latency": latency, "rate_limit_ratio": rate_limit_ratio})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    server, base_url = start_fake_server(args.latency)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    os.environ["LLM_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(), "llm_cache.sqlite")
+
+    from langchain_core.messages import HumanMessage
+    from langchain_openai import ChatOpenAI
+
+    from llm_clients import LLM_MODEL, get_chat_model
+
+    def messages(i: int, run: str):
+        # Unique prompts so the LLM cache never answers
+        return [HumanMessage(content=f"{run} request {i}: please improve the analysis of MOLY{i:08d}")]
+
+    start = time.perf_counter()
+    for i in range(args.requests):
+        ChatOpenAI(model=LLM_MODEL, base_url=base_url).invoke(messages(i, "baseline"))
+    baseline = time.perf_counter() - start
+
+    async def shared_async():
+        model = get_chat_model()
+        await asyncio.gather(*(model.ainvoke(messages(i, "shared")) for i in range(args.requests)))
+
+    start = time.perf_counter()
+    asyncio.run(shared_async())
+    shared = time.perf_counter() - start
+
+    print(f"per-call client, sync invoke : {args.requests / baseline:8.1f} req/s ({baseline:.2f}s)")
+    print(f"shared client, async ainvoke : {args.requests / shared:8.1f} req/s ({shared:.2f}s)")
+    print(f"speedup                      : {baseline / shared:8.1f}x")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
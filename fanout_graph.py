@@ -0,0 +1,129 @@
+import asyncio
+import operator
+import re
+import time
+from typing import Annotated, AsyncIterator, Dict, List, TypedDict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from langgraph.graph import END, START, StateGraph
+from langgraph.types import Send
+
+from chains import STRUCTURED_RESPONSE_ERROR, draft_summaries, fetch_notes_many_async, format_summaries, response_tokens, revise_analysis
+import metrics
+from metrics import instrument_node
+from reflection_policy import StoppingPolicy
+
+MAX_PARALLEL_BRANCHES = 16
+
+# Per-CR reflection loop, configured like the main graph's (REFLECTION_* variables)
+stopping_policy = StoppingPolicy.from_env()
+
+
+class FanOutState(TypedDict, total=False):
+    request: str
+    cr_ids: List[str]
+    cr_data: List[Dict]
+    summaries: Annotated[List[Dict], operator.add]  # {"cr_id", "summary"}, one per finished branch
+    report: str
+
+
+class CRBranchState(TypedDict):
+    cr: Dict
+
+
+def parse_request(state: FanOutState) -> FanOutState:
+    """Find the CR IDs in the request"""
+    return {"cr_ids": list(dict.fromkeys(re.findall(r'MOLY\d+', state["request"])))}
+
+
+async def fetch_notes(state: FanOutState) -> FanOutState:
+    """Fetch notes for every CR in one batch lookup"""
+    cr_notes = await fetch_notes_many_async(state["cr_ids"])
+    return {"cr_data": [cr.to_dict() for cr in cr_notes]}
+
+
+def fan_out(state: FanOutState):
+    """Send each CR to its own draft/revise branch"""
+    if not state["cr_data"]:
+        return "compile_report"
+    return [Send("analyse_cr", {"cr": cr}) for cr in state["cr_data"]]
+
+
+async def analyse_cr(state: CRBranchState) -> FanOutState:
+    """Draft and revise the summary of a single CR"""
+    cr = state["cr"]
+    started_at = time.monotonic()
+    usage = {"total_tokens": 0}
+    summaries = await draft_summaries([cr], usage)
+    if summaries is None:
+        return {"summaries": [{"cr_id": cr["cr_id"], "summary": STRUCTURED_RESPONSE_ERROR}]}
+
+    versions = [format_summaries(summaries)]
+    tokens_used = usage["total_tokens"]
+    while not stopping_policy.stop_reason(versions, tokens_used, time.monotonic() - started_at):
+        response = await revise_analysis(versions[-1])
+        versions.append(response.content)
+        tokens_used += response_tokens(response)
+    return {"summaries": [{"cr_id": cr["cr_id"], "summary": versions[-1]}]}
+
+
+def build_report(state: FanOutState) -> FanOutState:
+    """Join the per-CR summaries, in request order, into the final report"""
+    order = {cr_id: i for i, cr_id in enumerate(state["cr_ids"])}
+    summaries = sorted(state.get("summaries", []), key=lambda s: order.get(s["cr_id"], len(order)))
+    if not summaries:
+        return {"report": "No CR IDs found"}
+    return {"report": "\n\n".join(f"CR_ID: {s['cr_id']}\n{s['summary']}" for s in summaries)}
+
+
+builder = StateGraph(FanOutState)
+builder.add_node("parse", instrument_node("fanout", "parse", parse_request))
+builder.add_node("notes", instrument_node("fanout", "notes", fetch_notes))
+builder.add_node("analyse_cr", instrument_node("fanout", "analyse_cr", analyse_cr))
+builder.add_node("compile_report", instrument_node("fanout", "compile_report", build_report))
+
+builder.add_edge(START, "parse")
+builder.add_edge("parse", "notes")
+builder.add_conditional_edges("notes", fan_out, ["analyse_cr", "compile_report"])
+builder.add_edge("analyse_cr", "compile_report")
+builder.add_edge("compile_report", END)
+
+fanout_graph = builder.compile()
+
+
+async def stream_cr_summaries(request: str, max_parallel: int = MAX_PARALLEL_BRANCHES) -> AsyncIterator[Dict]:
+    """
+    Run the fan-out graph and yield each CR summary as soon as its branch finishes.
+
+    Yields {"cr_id", "summary"} per CR in completion order, then {"report": ...} last.
+    """
+    async for update in fanout_graph.astream(
+        {"request": request},
+        config={"max_concurrency": max_parallel},
+        stream_mode="updates"
+    ):
+        for node, values in update.items():
+            if node == "analyse_cr":
+                for summary in values["summaries"]:
+                    yield summary
+            elif node == "compile_report":
+                yield {"report": values["report"]}
+
+
+async def main():
+    cr_request = "Could you please analyse CRs MOLY97243503 and MOLY94819931"
+    metrics.start_from_env()
+    with metrics.profile_if_slow("fanout"):
+        async for event in stream_cr_summaries(cr_request):
+            if "report" in event:
+                print("\nFinal Summary:")
+                print(event["report"])
+            else:
+                print(f"\n[{event['cr_id']} done]\n{event['summary']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,70 @@
+import argparse
+import json
+import random
+import string
+from typing import Optional
+
+# Troubleshooting sequences the dummy CRs are cut from, like the ones in Updated_CR_data.json
+scenarios = [
+    [
+        "User switches on the router.",
+        "Router light does not flash.",
+        "User checks the power supply to the router.",
+        "Power cable found loose; user reconnects it.",
+        "Router light starts flashing, but no internet access.",
+        "User contacts ISP for troubleshooting.",
+        "ISP confirms a temporary outage in the area.",
+        "User resets the router and waits for service restoration."
+    ],
+    [
+        "Device connects to the wireless network.",
+        "Signal strength drops when moving to another room.",
+        "User moves closer to the access point.",
+        "Connection recovers but latency stays high.",
+        "User runs a speed test during peak hours.",
+        "Speed test shows heavy packet loss.",
+        "User updates the router firmware.",
+        "Latency returns to normal after the update."
+    ],
+    [
+        "Phone places a Wi-Fi call.",
+        "Call drops after handover between access points.",
+        "User repeats the call near a single access point.",
+        "Call quality is stable without handover.",
+        "Logs show authentication timeout during handover.",
+        "User enables fast roaming on the access points."
+    ]
+]
+
+def generate_cr(cr_id: str) -> dict:
+    """One dummy CR: a prefix of a scenario, sometimes with an extra step of its own."""
+    steps = random.choice(scenarios)
+    notes = steps[:random.randint(2, len(steps))]
+    if random.random() < 0.2:
+        notes = notes + [f"Observed again on site {random.randint(1, 500)}."]
+    return {
+        "CR_ID": cr_id,
+        "description": ''.join(random.choices(string.ascii_letters + string.digits + " ", k=50)),
+        "notes": notes
+    }
+
+def generate_cr_notes_json(json_path: str, count: int = 100, seed: Optional[int] = None) -> int:
+    """Write count seeded CRs in the Updated_CR_data.json layout, streamed so large files need little memory."""
+    if seed is not None:
+        random.seed(seed)
+    with open(json_path, 'w') as json_file:
+        json_file.write("[\n")
+        for i, number in enumerate(random.sample(range(10 ** 8), count)):
+            json_file.write(("" if i == 0 else ",\n") + json.dumps(generate_cr(f"MOLY{number:08d}"), indent=4))
+        json_file.write("\n]\n")
+    return count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a dummy CR notes file")
+    parser.add_argument("--json-path", default="./input_json/Updated_CR_data.json")
+    parser.add_argument("--count", type=int, default=100, help="Number of CRs")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible data")
+    args = parser.parse_args()
+
+    written = generate_cr_notes_json(args.json_path, args.count, args.seed)
+    print(f"Wrote {written} CRs to {args.json_path}")
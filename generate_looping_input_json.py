@@ -1,6 +1,9 @@
+import argparse
 import random
 import json
+import sqlite3
 from datetime import datetime, timedelta
+from typing import List, Optional
 
 # List of M_IDs
 m_ids = [
@@ -32,16 +35,46 @@ def random_lina_run_time():
     random_date = start_date + timedelta(seconds=random.randint(0, 2 * 365 * 24 * 3600))  # Random within 2 years
     return random_date.strftime("%d%m%Y %H%M%S")
 
-json_data = []
-for m_id in m_ids:
-    entry = {
+def status_entry(m_id: str) -> dict:
+    return {
         "M_ID": m_id,
         "lina_run_output": random.choice(["Success", "Failure"]),
         "lina_run_time": random_lina_run_time()
     }
-    json_data.append(entry)
 
-# Save to JSON file
-json_path = './m_ids_lina_run.json'
-with open(json_path, 'w') as json_file:
-    json.dump(json_data, json_file, indent=4)
+def mids_for(count: int, db_path: Optional[str] = None) -> List[str]:
+    """The first count M_IDs of the issues database, or the built-in list padded with random IDs."""
+    if db_path:
+        conn = sqlite3.connect(db_path)
+        try:
+            return [row[0] for row in conn.execute("SELECT M_ID FROM issues ORDER BY rowid LIMIT ?", (count,))]
+        finally:
+            conn.close()
+    if count <= len(m_ids):
+        return m_ids[:count]
+    known = set(m_ids)
+    extra = (f"MOLY{number:08d}" for number in random.sample(range(10 ** 8), count))
+    return m_ids + [mid for mid in extra if mid not in known][:count - len(m_ids)]
+
+def generate_status_json(json_path: str, count: int = 100, seed: Optional[int] = None, db_path: Optional[str] = None) -> int:
+    """Write count seeded run status entries, streamed so large files need little memory."""
+    if seed is not None:
+        random.seed(seed)
+    mids = mids_for(count, db_path)
+    with open(json_path, 'w') as json_file:
+        json_file.write("[\n")
+        for i, m_id in enumerate(mids):
+            json_file.write(("    " if i == 0 else ",\n    ") + json.dumps(status_entry(m_id)))
+        json_file.write("\n]\n")
+    return len(mids)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a dummy tool run status file")
+    parser.add_argument("--json-path", default="./m_ids_lina_run.json")
+    parser.add_argument("--count", type=int, default=100, help="Number of status entries")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible data")
+    parser.add_argument("--db-path", default=None, help="Take the M_IDs from this issues database")
+    args = parser.parse_args()
+
+    written = generate_status_json(args.json_path, args.count, args.seed, args.db_path)
+    print(f"Wrote {written} status entries to {args.json_path}")
@@ -1,6 +1,9 @@
+import argparse
 import sqlite3
 import random
 import string
+from itertools import islice
+from typing import Iterator, Optional, Tuple
 
 # Function to generate a random M_ID
 def generate_m_id():
@@ -58,14 +61,25 @@ def generate_repeat_steps():
         repeat_step += f" Log URL: http://logserver.com/log{random.randint(1000,9999)} Log File: log_{random.randint(1000,9999)}.txt"
     return repeat_step
 
-if __name__ == "__main__":
-    # Create the SQLite database in a file
-    db_path = './db_path/issues_database.sqlite'
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+def generate_rows(count: int) -> Iterator[Tuple[str, str, str, str]]:
+    """Yield count issues rows with distinct M_IDs, drawn from the module's random state."""
+    for number in random.sample(range(10 ** 8), count):
+        yield f"MOLY{number:08d}", generate_problem_description(), generate_title(), generate_repeat_steps()
 
-    # Create the table
-    cursor.execute("""
+def generate_issues_db(db_path: str, count: int = 100, seed: Optional[int] = None, batch_size: int = 50000) -> int:
+    """
+    Create the issues table and bulk insert count seeded dummy rows in one transaction.
+
+    Rows are streamed to executemany in batches, so millions of rows need little memory.
+    Returns the number of rows inserted (existing M_IDs are skipped).
+    """
+    if seed is not None:
+        random.seed(seed)
+    conn = sqlite3.connect(db_path)
+    # Bulk load: no fsync per page; a crash mid-load just means regenerating the file
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("""
     CREATE TABLE IF NOT EXISTS issues (
         M_ID TEXT PRIMARY KEY,
         Description TEXT,
@@ -73,22 +87,24 @@ if __name__ == "__main__":
         Repeat_Steps TEXT
     )
     """)
-
-    # Insert 100 dummy entries
-    for _ in range(100):
-        m_id = generate_m_id()
-        description = generate_problem_description()
-        title = generate_title()
-        repeat_steps = generate_repeat_steps()
-        
-        cursor.execute("""
-        INSERT INTO issues (M_ID, Description, Title, Repeat_Steps) 
-        VALUES (?, ?, ?, ?)
-        """, (m_id, description, title, repeat_steps))
-
-    # Commit changes and close the connection
-    conn.commit()
+    before = conn.total_changes
+    rows = generate_rows(count)
+    with conn:
+        while batch := list(islice(rows, batch_size)):
+            conn.executemany("""
+            INSERT OR IGNORE INTO issues (M_ID, Description, Title, Repeat_Steps) 
+            VALUES (?, ?, ?, ?)
+            """, batch)
+    inserted = conn.total_changes - before
     conn.close()
+    return inserted
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a dummy issues database")
+    parser.add_argument("--db-path", default="./db_path/issues_database.sqlite")
+    parser.add_argument("--count", type=int, default=100, help="Number of issues to insert")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible data")
+    args = parser.parse_args()
 
-
+    inserted = generate_issues_db(args.db_path, args.count, args.seed)
+    print(f"Inserted {inserted} issues into {args.db_path}")
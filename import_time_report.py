@@ -0,0 +1,131 @@
+"""
+Startup cost of the CLI entry points, measured with `python -X importtime`.
+
+Each scenario runs in a fresh interpreter a few times. The report gives:
+- the median wall time of the process
+- the total import time taken from the -X importtime log
+- the number of modules imported
+- the heaviest top-level imports
+
+    python import_time_report.py --runs 5 --top 8
+    python import_time_report.py --baseline <git-rev>   # adds the same scenarios for an older tree
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+# name -> code run by `python -X importtime -c`
+SCENARIOS = {
+    "cli --help": "import sys; sys.argv = ['cli.py', '--help']\ntry:\n    import cli; cli.main()\nexcept SystemExit:\n    pass",
+    "import main": "import main",
+    "import main + get_graph()": "import main; main.get_graph() if hasattr(main, 'get_graph') else None",
+}
+
+_LINE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def parse_importtime(log: str) -> Dict:
+    """Total import time, module count and top-level imports (cumulative microseconds) from an -X importtime log."""
+    top_level = []
+    modules = 0
+    for line in log.splitlines():
+        match = _LINE_RE.match(line)
+        if not match:
+            continue
+        modules += 1
+        _, cumulative, indent, name = match.groups()
+        # Top-level imports have a one-space indent, their dependencies are nested deeper
+        if len(indent) == 1:
+            top_level.append((name, int(cumulative)))
+    return {
+        "import_ms": sum(us for _, us in top_level) / 1000,
+        "modules": modules,
+        "top_level": sorted(top_level, key=lambda item: -item[1])
+    }
+
+
+def measure(code: str, cwd: str, runs: int) -> Dict:
+    walls = []
+    parsed = None
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    env.setdefault("OPENAI_API_KEY", "x")  # ChatOpenAI refuses to build without one
+    for _ in range(runs):
+        started = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=cwd, env=env, capture_output=True, text=True
+        )
+        walls.append((time.perf_counter() - started) * 1000)
+        if proc.returncode != 0:
+            raise RuntimeError(f"{code!r} failed in {cwd}:\n{proc.stderr[-2000:]}")
+        run = parse_importtime(proc.stderr)
+        # Keep the log of the fastest run, the one least disturbed by noise
+        if parsed is None or run["import_ms"] < parsed["import_ms"]:
+            parsed = run
+    return {"wall_ms": statistics.median(walls), **parsed}
+
+
+def checkout(rev: str) -> str:
+    """Export a git revision into a temporary directory sharing this tree's data files."""
+    target = tempfile.mkdtemp(prefix="import_time_")
+    archive = subprocess.run(["git", "archive", rev], capture_output=True, check=True).stdout
+    subprocess.run(["tar", "-x", "-C", target], input=archive, check=True)
+    return target
+
+
+def report(results: Dict[str, Dict[str, Dict]], top: int):
+    for tree, scenarios in results.items():
+        print(f"== {tree}")
+        print(f"{'scenario':<28}{'wall ms':>10}{'import ms':>12}{'modules':>10}")
+        for name, result in scenarios.items():
+            if result is None:
+                print(f"{name:<28}{'n/a':>10}")
+                continue
+            print(f"{name:<28}{result['wall_ms']:>10.1f}{result['import_ms']:>12.1f}{result['modules']:>10}")
+        for name, result in scenarios.items():
+            if result is None:
+                continue
+            heaviest = ", ".join(f"{module} {us / 1000:.0f}ms" for module, us in result["top_level"][:top])
+            print(f"  {name}: {heaviest}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Interpreter starts per scenario")
+    parser.add_argument("--top", type=int, default=6, help="Heaviest top-level imports to list")
+    parser.add_argument("--baseline", help="Git revision to measure for comparison, e.g. HEAD~1")
+    parser.add_argument("--out", help="Write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    trees = {"current": here}
+    if args.baseline:
+        trees[args.baseline] = checkout(args.baseline)
+
+    results = {}
+    for tree, path in trees.items():
+        results[tree] = {}
+        for name, code in SCENARIOS.items():
+            # Scenarios needing files the older tree lacks (e.g. cli.py) are reported as n/a
+            if name.startswith("cli") and not os.path.exists(os.path.join(path, "cli.py")):
+                results[tree][name] = None
+                continue
+            # Relative data paths (input_json/, db_path/) resolve against this tree
+            results[tree][name] = measure(f"import sys; sys.path.insert(0, {path!r})\n{code}", here, args.runs)
+
+    report(results, args.top)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
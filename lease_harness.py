@@ -0,0 +1,162 @@
+"""
+Multi-process harness for sharded ToolRunner instances.
+
+Starts several ToolRunner processes against one shared issues database and
+lease table, with a no-op tool that logs every execution. Checks that every
+MID ran exactly once and reports throughput per runner count.
+
+    python lease_harness.py --mids 400 --runners 1 2 4
+    python lease_harness.py --mids 200 --runners 3 --crash
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+from database_access import DatabaseAccess
+
+# Appends "<MID> <runner>" to the executions log, then simulates work
+NOOP_TOOL = (
+    "import sys, time\n"
+    "with open(sys.argv[2], 'a') as f:\n"
+    "    f.write(sys.argv[1] + ' ' + sys.argv[3] + '\\n')\n"
+    "time.sleep(float(sys.argv[4]))\n"
+)
+
+
+def create_issues_db(db_path: Path, count: int):
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS issues (
+        M_ID TEXT PRIMARY KEY,
+        Description TEXT,
+        Title TEXT,
+        Repeat_Steps TEXT
+    )
+    """)
+    conn.executemany(
+        "INSERT INTO issues (M_ID, Description, Title, Repeat_Steps) VALUES (?, ?, ?, ?)",
+        ((f"MOLY{i:08d}", "desc", "title", "steps") for i in range(count))
+    )
+    conn.commit()
+    conn.close()
+
+
+def run_runner(workdir: str, runner_id: str, peers: list, tool_seconds: float):
+    from tool_runner import ToolRunner
+
+    workdir = Path(workdir)
+    executions = workdir / "executions.log"
+    runner = ToolRunner(
+        json_path=str(workdir / "no_legacy_status.json"),
+        status_db_path=str(workdir / "run_status.sqlite"),
+        issues_db_path=str(workdir / "issues.sqlite"),
+        state_path=str(workdir / f"state_{runner_id}.json"),
+        log_file=str(workdir / f"runner_{runner_id}.log"),
+        poll_interval=0.5,
+        max_parallel_runs=4,
+        tool_command=(sys.executable, "-c", NOOP_TOOL, "{mid}", str(executions), runner_id, str(tool_seconds)),
+        runner_id=runner_id,
+        peers=peers,
+        lease_seconds=3.0,
+        steal_after=3.0
+    )
+    runner.run_polling_loop()
+
+
+def count_recorded(status_db: Path) -> int:
+    try:
+        conn = sqlite3.connect(status_db, timeout=30)
+        try:
+            return conn.execute("SELECT COUNT(*) FROM lina_runs").fetchone()[0]
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return 0
+
+
+def run_trial(mids: int, runners: int, tool_seconds: float, crash: bool, timeout: float) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        create_issues_db(workdir / "issues.sqlite", mids)
+        DatabaseAccess(str(workdir / "issues.sqlite")).install_change_log()
+        peers = [f"runner-{i}" for i in range(runners)]
+        processes = [
+            multiprocessing.Process(target=run_runner, args=(tmp, peer, peers, tool_seconds), daemon=True)
+            for peer in peers
+        ]
+        start = time.monotonic()
+        for process in processes:
+            process.start()
+
+        crashed = None
+        if crash and runners > 1:
+            time.sleep(1.5)
+            crashed = peers[0]
+            os.kill(processes[0].pid, signal.SIGKILL)
+
+        while time.monotonic() - start < timeout:
+            if count_recorded(workdir / "run_status.sqlite") >= mids:
+                break
+            time.sleep(0.2)
+        elapsed = time.monotonic() - start
+
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+
+        lines = (workdir / "executions.log").read_text().splitlines()
+        runs = Counter(line.split()[0] for line in lines)
+        per_runner = Counter(line.split()[1] for line in lines)
+        return {
+            "runners": runners,
+            "mids": mids,
+            "completed": count_recorded(workdir / "run_status.sqlite"),
+            "executed": len(runs),
+            "duplicates": sorted(mid for mid, n in runs.items() if n > 1),
+            "per_runner": dict(per_runner),
+            "crashed": crashed,
+            "seconds": elapsed,
+            "mids_per_second": mids / elapsed,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mids", type=int, default=200)
+    parser.add_argument("--runners", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--tool-seconds", type=float, default=0.2, help="simulated work per run")
+    parser.add_argument("--crash", action="store_true", help="SIGKILL the first runner mid-trial")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    args = parser.parse_args()
+
+    ok = True
+    for runners in args.runners:
+        result = run_trial(args.mids, runners, args.tool_seconds, args.crash, args.timeout)
+        print(
+            f"runners={result['runners']} completed={result['completed']}/{result['mids']} "
+            f"duplicates={len(result['duplicates'])} time={result['seconds']:.1f}s "
+            f"throughput={result['mids_per_second']:.1f} MIDs/s per_runner={result['per_runner']}"
+            + (f" crashed={result['crashed']}" if result["crashed"] else "")
+        )
+        if result["completed"] != result["mids"]:
+            ok = False
+            print("  FAIL: not every MID completed")
+        if result["duplicates"] and not result["crashed"]:
+            ok = False
+            print(f"  FAIL: MIDs executed more than once: {result['duplicates'][:10]}")
+        elif result["duplicates"]:
+            # A killed runner's in-flight tool process can finish after its lease was reclaimed
+            print(f"  note: {len(result['duplicates'])} MIDs in flight on the crashed runner ran again")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import warnings
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+
+from database_access import ConnectionPool
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    cache_key TEXT PRIMARY KEY,
+    llm_string TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+)
+"""
+LRU_INDEX = "CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache (last_access)"
+# generation_info key set on every generation served from the cache
+CACHE_HIT_KEY = "llm_cache_hit"
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# langchain_core.load.loads is marked beta; it is the supported way to revive generations
+warnings.filterwarnings("ignore", message="The function `loads` is in beta")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Reduce a serialized message list to (role, content) pairs with collapsed whitespace.
+
+    Message IDs and other per-call metadata are dropped so identical conversations
+    hash the same way.
+    """
+    try:
+        messages = json.loads(prompt)
+    except ValueError:
+        return _WHITESPACE_RE.sub(" ", prompt).strip()
+    if not isinstance(messages, list):
+        return _WHITESPACE_RE.sub(" ", prompt).strip()
+
+    normalized = []
+    for message in messages:
+        kwargs = message.get("kwargs", {}) if isinstance(message, dict) else {}
+        role = message.get("id", [""])[-1] if isinstance(message, dict) else ""
+        content = kwargs.get("content", message)
+        if isinstance(content, str):
+            content = _WHITESPACE_RE.sub(" ", content).strip()
+        normalized.append([role, content])
+    return json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+
+
+def cache_key(prompt: str, llm_string: str) -> str:
+    """Content address for a (model + params, messages) pair."""
+    digest = hashlib.sha256()
+    digest.update(llm_string.encode())
+    digest.update(b"\0")
+    digest.update(normalize_prompt(prompt).encode())
+    return digest.hexdigest()
+
+
+class SQLiteLLMCache(BaseCache):
+    def __init__(
+        self,
+        db_path: str = "db_path/llm_cache.sqlite",
+        ttl_seconds: Optional[float] = 7 * 24 * 3600,
+        max_entries: Optional[int] = 10000,
+        max_bytes: Optional[int] = 256 * 1024 * 1024,
+        pool_size: int = 4
+    ):
+        """
+        Persistent, content-addressed LLM response cache.
+
+        Keys hash the model name and parameters (LangChain's llm_string) together with
+        the normalized messages. Entries expire after ttl_seconds and the least recently
+        used ones are evicted once max_entries or max_bytes is exceeded.
+
+        Args:
+            db_path (str): Path to the cache database
+            ttl_seconds (Optional[float]): Entry lifetime, None to keep entries until evicted
+            max_entries (Optional[int]): Maximum number of cached responses
+            max_bytes (Optional[int]): Maximum total size of cached responses
+            pool_size (int): Maximum number of pooled connections
+        """
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._stats_lock = threading.Lock()
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.pool = ConnectionPool(db_path, pool_size=pool_size)
+        with self.pool.connection() as conn:
+            conn.execute(SCHEMA)
+            conn.execute(LRU_INDEX)
+            conn.commit()
+
+    def _count(self, hit: bool):
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        """Return cached generations for the prompt and model, or None on a miss."""
+        key = cache_key(prompt, llm_string)
+        now = time.time()
+        try:
+            with self.pool.connection() as conn:
+                row = conn.execute(
+                    "SELECT value, created_at FROM llm_cache WHERE cache_key = ?",
+                    (key,)
+                ).fetchone()
+                if row is None:
+                    self._count(hit=False)
+                    return None
+                value, created_at = row
+                if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                    conn.execute("DELETE FROM llm_cache WHERE cache_key = ?", (key,))
+                    conn.commit()
+                    self._count(hit=False)
+                    return None
+                conn.execute("UPDATE llm_cache SET last_access = ? WHERE cache_key = ?", (now, key))
+                conn.commit()
+        except sqlite3.Error as e:
+            raise Exception(f"Error reading LLM cache: {e}")
+        self._count(hit=True)
+        generations = [loads(generation) for generation in json.loads(value)]
+        # Lets callbacks tell a cache hit from a provider response that reported no usage
+        for generation in generations:
+            generation.generation_info = {**(generation.generation_info or {}), CACHE_HIT_KEY: True}
+        return generations
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        """Store generations for the prompt and model, evicting old entries if over the caps."""
+        key = cache_key(prompt, llm_string)
+        value = json.dumps([dumps(generation) for generation in return_val])
+        now = time.time()
+        try:
+            with self.pool.connection() as conn:
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO llm_cache
+                        (cache_key, llm_string, value, size, created_at, last_access)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    """,
+                    (key, llm_string, value, len(value), now, now)
+                )
+                self._evict(conn, now)
+                conn.commit()
+        except sqlite3.Error as e:
+            raise Exception(f"Error writing LLM cache: {e}")
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """Drop expired entries, then least recently used ones until within the caps."""
+        evicted = 0
+        if self.ttl_seconds is not None:
+            evicted += conn.execute(
+                "DELETE FROM llm_cache WHERE created_at < ?",
+                (now - self.ttl_seconds,)
+            ).rowcount
+        count, total_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        excess = 0
+        if self.max_entries is not None and count > self.max_entries:
+            excess = count - self.max_entries
+        if self.max_bytes is not None and total_bytes > self.max_bytes:
+            # Walk the LRU order until enough bytes are freed
+            freed = 0
+            for i, (size,) in enumerate(conn.execute("SELECT size FROM llm_cache ORDER BY last_access")):
+                freed += size
+                if total_bytes - freed <= self.max_bytes:
+                    excess = max(excess, i + 1)
+                    break
+        if excess:
+            evicted += conn.execute(
+                """
+                DELETE FROM llm_cache WHERE cache_key IN (
+                    SELECT cache_key FROM llm_cache ORDER BY last_access LIMIT ?
+                )
+                """,
+                (excess,)
+            ).rowcount
+        if evicted:
+            with self._stats_lock:
+                self.evictions += evicted
+
+    def clear(self, **kwargs: Any) -> None:
+        """Remove every cached response."""
+        with self.pool.connection() as conn:
+            conn.execute("DELETE FROM llm_cache")
+            conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss/eviction counters since this cache object was created."""
+        with self._stats_lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    from langchain_core.language_models import FakeListChatModel
+    from langchain_core.messages import HumanMessage
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = SQLiteLLMCache(f"{tmp}/llm_cache.sqlite")
+        model = FakeListChatModel(responses=["first", "second"], cache=cache)
+        print(model.invoke([HumanMessage(content="Summarize  MOLY97243503")]).content)
+        print(model.invoke([HumanMessage(content="Summarize MOLY97243503 ")]).content)
+        print(cache.stats())
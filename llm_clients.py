@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+from typing import Optional
+
+import httpx
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import BaseChatModel
+from langchain_core.outputs import LLMResult
+from langchain_core.rate_limiters import BaseRateLimiter
+from langchain_openai import ChatOpenAI
+
+from llm_cache import CACHE_HIT_KEY, SQLiteLLMCache
+from metrics import LLM_CALLS, LLM_PROMPT_TOKENS, LLM_SECONDS, LLM_TOKENS, register_cache
+
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-3.5-turbo-1106")
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+
+_chat_model: Optional[BaseChatModel] = None
+_llm_cache: Optional[SQLiteLLMCache] = None
+_lock = threading.Lock()
+_cache_lock = threading.Lock()
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    run_inline = True  # only records numbers, no need for an executor hop
+
+    def __init__(self, model_name: str):
+        """Records duration, outcome and token usage of every chat model call in metrics."""
+        self.model_name = model_name
+        self._started = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response: LLMResult, *, run_id, **kwargs):
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            LLM_SECONDS.observe(time.perf_counter() - started, model=self.model_name)
+        cached = bool(response.generations) and all(
+            (generation.generation_info or {}).get(CACHE_HIT_KEY)
+            for generations in response.generations for generation in generations
+        )
+        LLM_CALLS.inc(model=self.model_name, outcome="cached" if cached else "completed")
+        # Streaming and some providers report no usage; those calls are counted but add no tokens
+        usage = {} if cached else (response.llm_output or {}).get("token_usage") or {}
+        if usage:
+            LLM_TOKENS.inc(usage.get("prompt_tokens", 0), model=self.model_name, kind="prompt")
+            LLM_TOKENS.inc(usage.get("completion_tokens", 0), model=self.model_name, kind="completion")
+            LLM_PROMPT_TOKENS.observe(usage.get("prompt_tokens", 0), model=self.model_name)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._started.pop(run_id, None)
+        LLM_CALLS.inc(model=self.model_name, outcome="error")
+
+
+def get_llm_cache() -> SQLiteLLMCache:
+    """
+    Return the LLM response cache shared by every node, opening it on first use.
+
+    Identical requests are answered from disk; LLM_CACHE_PATH sets the database file.
+    """
+    global _llm_cache
+    if _llm_cache is None:
+        with _cache_lock:
+            if _llm_cache is None:
+                _llm_cache = SQLiteLLMCache(os.getenv("LLM_CACHE_PATH", "db_path/llm_cache.sqlite"))
+                register_cache("llm", _llm_cache.stats)
+    return _llm_cache
+
+
+def _build_chat_model() -> ChatOpenAI:
+    """One ChatOpenAI whose sync and async HTTP clients keep pooled keep-alive connections."""
+    limits = httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_CONNECTIONS
+    )
+    return ChatOpenAI(
+        model=LLM_MODEL,
+        base_url=os.getenv("OPENAI_BASE_URL") or None,
+        timeout=LLM_TIMEOUT,
+        http_client=httpx.Client(limits=limits, timeout=LLM_TIMEOUT),
+        http_async_client=httpx.AsyncClient(limits=limits, timeout=LLM_TIMEOUT),
+        cache=get_llm_cache(),
+        callbacks=[LLMMetricsCallback(LLM_MODEL)]
+    )
+
+
+def get_chat_model() -> BaseChatModel:
+    """
+    Return the process-wide chat model, creating it on first use.
+
+    Configure it with LLM_MODEL, LLM_MAX_CONNECTIONS, LLM_TIMEOUT and OPENAI_BASE_URL
+    (e.g. a local fake endpoint), or replace it with set_chat_model().
+    """
+    global _chat_model
+    if _chat_model is None:
+        with _lock:
+            if _chat_model is None:
+                _chat_model = _build_chat_model()
+    return _chat_model
+
+
+def set_chat_model(model: Optional[BaseChatModel]):
+    """Replace the shared chat model, e.g. with a fake in tests; None rebuilds the default."""
+    global _chat_model
+    with _lock:
+        _chat_model = model
+
+
+def set_rate_limiter(limiter: Optional[BaseRateLimiter]):
+    """
+    Throttle the shared chat model's API calls; None removes the limit.
+
+    A limiter that is also a callback handler (e.g. rate_limits.LLMRateLimiter)
+    is registered as a callback too, so it sees the reported token usage.
+    """
+    model = get_chat_model()
+    callbacks = [callback for callback in (model.callbacks or []) if callback is not model.rate_limiter]
+    if limiter is not None and hasattr(limiter, "on_llm_end"):
+        callbacks.append(limiter)
+    model.rate_limiter = limiter
+    model.callbacks = callbacks or None
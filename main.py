@@ -1,47 +1,141 @@
-from typing import List
-from dotenv import load_dotenv
-import asyncio
-load_dotenv()
-
-from langchain_core.messages import BaseMessage
-from langgraph.graph import END, MessageGraph
-from chains import first_responder, revisor, request_parser, note_processor
-
-MAX_ITERATIONS = 2
-
-# Build the graph
-builder = MessageGraph()
-
-# Add nodes
-builder.add_node("request", request_parser)
-builder.add_node("notes", note_processor)
-builder.add_node("draft", first_responder)
-builder.add_node("revise", revisor)
-
-# Add edges
-builder.add_edge("request", "notes")
-builder.add_edge("notes", "draft")
-builder.add_edge("draft", "revise")
-
-def should_continue(state: List[BaseMessage]) -> str:
-    num_iterations = len(state) - 2
-    if num_iterations >= MAX_ITERATIONS:
+import os
+import time
+import uuid
+from functools import lru_cache, wraps
+from typing import TYPE_CHECKING, Callable, Optional
+
+from reflection_policy import StoppingPolicy
+
+if TYPE_CHECKING:
+    from chains import AnalysisState
+
+# langgraph, langchain_openai and the chains are imported by build_graph() the first
+# time a graph is needed, so importing this module (e.g. from cli.py) stays cheap
+
+# One revision by default; converged, over-budget (tokens) and slow runs stop earlier.
+# Configure with the REFLECTION_* environment variables
+stopping_policy = StoppingPolicy.from_env()
+
+# Threads not checkpointed for this long are dropped when the graph is built
+CHECKPOINT_RETENTION_HOURS = float(os.getenv("CHECKPOINT_RETENTION_HOURS", "168"))
+
+def should_continue(state: "AnalysisState") -> str:
+    from langgraph.graph import END
+
+    # Time actually spent analysing: a run resumed after an interruption is not charged for the downtime
+    elapsed = state.get("active_seconds", 0.0)
+    if stopping_policy.stop_reason(state["drafts"], state["tokens_used"], elapsed):
         return END
     return "revise"
 
-# Add conditional edge from revise
-builder.add_conditional_edges("revise", should_continue)
-builder.set_entry_point("request")
+def track_active_time(node: Callable) -> Callable:
+    """Wrap a graph node so the seconds it takes are added to the state's active_seconds"""
+    import inspect
+
+    if inspect.iscoroutinefunction(node):
+        @wraps(node)
+        async def async_node(state, *args, **kwargs):
+            started = time.monotonic()
+            update = await node(state, *args, **kwargs)
+            return {**(update or {}), "active_seconds": time.monotonic() - started}
+        return async_node
+
+    @wraps(node)
+    def sync_node(state, *args, **kwargs):
+        started = time.monotonic()
+        update = node(state, *args, **kwargs)
+        return {**(update or {}), "active_seconds": time.monotonic() - started}
+    return sync_node
+
+def build_graph(checkpoint_path: str = 'db_path/checkpoints.sqlite'):
+    """Import the chains and compile the analysis graph; every completed node is checkpointed so interrupted runs resume"""
+    from langgraph.graph import StateGraph
+    from chains import AnalysisState, first_responder, revisor, request_parser, note_processor, cr_clusterer, note_compactor
+    from metrics import instrument_node
+    from sqlite_checkpointer import SQLiteCheckpointSaver
+
+    builder = StateGraph(AnalysisState)
+
+    def add_node(name: str, node: Callable):
+        builder.add_node(name, instrument_node("analysis", name, track_active_time(node)))
 
-# Compile the graph
-graph = builder.compile()
+    # Add nodes
+    add_node("parse", request_parser)
+    add_node("notes", note_processor)
+    add_node("cluster", cr_clusterer)
+    add_node("compact", note_compactor)
+    add_node("draft", first_responder)
+    add_node("revise", revisor)
+
+    # Add edges
+    builder.add_edge("parse", "notes")
+    builder.add_edge("notes", "cluster")
+    builder.add_edge("cluster", "compact")
+    builder.add_edge("compact", "draft")
+
+    # Add conditional edges; a draft that already used up the budget is not revised
+    builder.add_conditional_edges("draft", should_continue)
+    builder.add_conditional_edges("revise", should_continue)
+    builder.set_entry_point("parse")
+
+    checkpointer = SQLiteCheckpointSaver(checkpoint_path)
+    checkpointer.prune(CHECKPOINT_RETENTION_HOURS * 3600)
+    return builder.compile(checkpointer=checkpointer)
+
+@lru_cache(maxsize=None)
+def get_graph():
+    """The process-wide compiled graph, built on first use"""
+    return build_graph()
+
+def new_thread_id() -> str:
+    """A fresh checkpoint thread ID; pass it to run_analysis to be able to resume the run"""
+    return uuid.uuid4().hex
+
+async def drop_thread(thread_id: str):
+    """Delete a thread's checkpoints once its result is no longer needed"""
+    import asyncio
+
+    await asyncio.to_thread(get_graph().checkpointer.delete_thread, thread_id)
+
+async def run_analysis(request: str, thread_id: Optional[str] = None) -> "AnalysisState":
+    """
+    Run the graph for a request.
+
+    Without a thread_id the request is analysed from scratch on a new thread,
+    which is dropped once the run finishes. With one, an interrupted run on that
+    thread resumes after its last completed node and a finished thread returns
+    its stored result.
+    """
+    graph = get_graph()
+    if thread_id is None:
+        thread_id = new_thread_id()
+        config = {"configurable": {"thread_id": thread_id}}
+        result = await graph.ainvoke({"request": request}, config)
+        # Nobody knows this thread's ID, so nobody could resume it
+        await drop_thread(thread_id)
+        return result
+
+    config = {"configurable": {"thread_id": thread_id}}
+    snapshot = await graph.aget_state(config)
+    if snapshot.values and not snapshot.next:
+        return snapshot.values
+    # None continues from the last completed node instead of starting over
+    return await graph.ainvoke(None if snapshot.next else {"request": request}, config)
 
 # Example usage with async execution
 async def main():
+    from dotenv import load_dotenv
+    import metrics
+
+    load_dotenv()
     cr_request = "Could you please analyse CRs MOLY97243503 and MOLY94819931"
-    result = await graph.ainvoke(cr_request)
+    metrics.start_from_env()
+    with metrics.profile_if_slow("analysis"):
+        result = await run_analysis(cr_request)
     print("\nFinal Summary:")
-    print(result[-1].content)
+    print(result["drafts"][-1])
 
 if __name__ == "__main__":
+    import asyncio
+
     asyncio.run(main())
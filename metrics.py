@@ -0,0 +1,436 @@
+"""
+In-process metrics: counters, gauges and fixed-bucket histograms.
+
+Recording is a dict lookup, a bisect and a lock, so it is cheap enough for every
+node run, LLM call, query and tool run. Metrics can be scraped as Prometheus
+text from a local HTTP endpoint (start_http_server), written as periodic JSON
+snapshots (JSONSnapshotWriter), and slow requests can be sampled with an
+opt-in stack profiler (profile_if_slow).
+
+    METRICS_PORT=9464 python main.py                # then curl localhost:9464/metrics
+    METRICS_PROFILE_SLOW_SECONDS=5 python main.py   # folded stacks of runs over 5s in profiles/
+"""
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as _Tally
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Seconds; spans sub-millisecond SQLite reads to half-hour tool runs
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 1800)
+TOKEN_BUCKETS = (16, 64, 256, 1024, 2048, 4096, 8192, 16384, 32768, 131072)
+
+LabelValues = Tuple[str, ...]
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _label_text(self, key: LabelValues, extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, self._label_text(key), value
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {",".join(key): value for key, value in self._values.items()}
+
+    def set_total(self, value: float, **labels):
+        """Mirror a running total kept elsewhere, e.g. a cache's own hit counter; it must never decrease."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, List[float]] = {}  # per bucket counts, then +Inf count, then sum
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                yield f"{self.name}_bucket", self._label_text(key, f'le="{le}"'), cumulative
+            yield f"{self.name}_count", self._label_text(key), cumulative
+            yield f"{self.name}_sum", self._label_text(key), series[-1]
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """count, sum, mean and bucket-estimated p50/p99 per label set."""
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        result = {}
+        for key, series in items:
+            count = sum(series[:-1])
+            result[",".join(key)] = {
+                "count": count,
+                "sum": series[-1],
+                "mean": series[-1] / count if count else 0.0,
+                "p50": self._quantile(series, count, 0.5),
+                "p99": self._quantile(series, count, 0.99)
+            }
+        return result
+
+    def _quantile(self, series: List[float], count: float, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (the largest finite bound for the +Inf bucket)."""
+        if not count:
+            return 0.0
+        target, cumulative = q * count, 0
+        for bound, bucket_count in zip(self.buckets, series):
+            cumulative += bucket_count
+            if cumulative >= target:
+                return bound
+        return self.buckets[-1]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """Named metrics plus collectors that refresh gauges right before each export."""
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, documentation: str, labelnames: Sequence[str], **kwargs) -> Any:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def register_collector(self, collector: Callable[[], None]):
+        """Call collector (which sets gauges) before every export."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def unregister_collector(self, collector: Callable[[], None]):
+        with self._lock:
+            if collector in self._collectors:
+                self._collectors.remove(collector)
+
+    def _collect(self) -> List[_Metric]:
+        with self._lock:
+            collectors = list(self._collectors)
+            metrics = list(self._metrics.values())
+        for collector in collectors:
+            try:
+                collector()
+            except Exception:
+                pass  # a broken collector must not break the scrape
+        return metrics
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format 0.0.4."""
+        lines = []
+        for metric in self._collect():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {value:g}" if isinstance(value, float) else f"{name}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON-ready view of every metric, histograms summarized."""
+        return {
+            "timestamp": time.time(),
+            "metrics": {metric.name: {"type": metric.type, "labels": list(metric.labelnames), "values": metric.snapshot()} for metric in self._collect()}
+        }
+
+
+registry = MetricsRegistry()
+
+NODE_SECONDS = registry.histogram("graph_node_seconds", "Wall time of graph node runs", ["graph", "node"])
+NODE_ERRORS = registry.counter("graph_node_errors_total", "Graph node runs that raised", ["graph", "node"])
+IO_SECONDS = registry.histogram("io_seconds", "Wall time of I/O operations", ["operation"])
+IO_ERRORS = registry.counter("io_errors_total", "I/O operations that raised", ["operation"])
+LLM_SECONDS = registry.histogram("llm_call_seconds", "Wall time of chat model calls", ["model"])
+LLM_TOKENS = registry.counter("llm_tokens_total", "Tokens reported by the provider", ["model", "kind"])
+LLM_PROMPT_TOKENS = registry.histogram("llm_prompt_tokens", "Prompt tokens per chat model call", ["model"], buckets=TOKEN_BUCKETS)
+LLM_CALLS = registry.counter("llm_calls_total", "Chat model calls by outcome", ["model", "outcome"])
+CACHE_EVENTS = registry.counter("cache_events_total", "Cache events since start by cache and result", ["cache", "result"])
+TOOL_SECONDS = registry.histogram("tool_run_seconds", "Wall time of tool runs including retries", ["engine"])
+TOOL_RUNS = registry.counter("tool_runs_total", "Tool runs by outcome", ["engine", "outcome"])
+QUEUE_DEPTH = registry.gauge("tool_queue_depth", "MIDs waiting for a tool worker")
+IN_FLIGHT = registry.gauge("tool_runs_in_flight", "Tool runs queued or running", ["engine"])
+
+
+def timed(operation: str):
+    """Decorator recording a sync or async function's wall time and errors under io_seconds{operation}."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                except BaseException:
+                    IO_ERRORS.inc(operation=operation)
+                    raise
+                finally:
+                    IO_SECONDS.observe(time.perf_counter() - started, operation=operation)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except BaseException:
+                IO_ERRORS.inc(operation=operation)
+                raise
+            finally:
+                IO_SECONDS.observe(time.perf_counter() - started, operation=operation)
+        return wrapper
+    return decorator
+
+
+def instrument_node(graph: str, node: str, func: Callable) -> Callable:
+    """Wrap a graph node so each run lands in graph_node_seconds{graph, node}."""
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_node(state, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(state, *args, **kwargs)
+            except BaseException:
+                NODE_ERRORS.inc(graph=graph, node=node)
+                raise
+            finally:
+                NODE_SECONDS.observe(time.perf_counter() - started, graph=graph, node=node)
+        return async_node
+
+    @functools.wraps(func)
+    def sync_node(state, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(state, *args, **kwargs)
+        except BaseException:
+            NODE_ERRORS.inc(graph=graph, node=node)
+            raise
+        finally:
+            NODE_SECONDS.observe(time.perf_counter() - started, graph=graph, node=node)
+    return sync_node
+
+
+def register_cache(name: str, stats: Callable[[], Dict[str, int]]):
+    """Export a cache's stats() counters (hits, misses, ...) as cache_events_total{cache, result}."""
+    def collect():
+        for result, value in stats().items():
+            CACHE_EVENTS.set_total(value, cache=name, result=result)
+    registry.register_collector(collect)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] == "/metrics":
+            body, content_type = registry.render_prometheus().encode(), "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path.split("?")[0] == "/metrics.json":
+            body, content_type = json.dumps(registry.snapshot()).encode(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve /metrics (Prometheus text) and /metrics.json on a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+class JSONSnapshotWriter:
+    def __init__(self, path: str = "metrics_snapshot.json", interval: float = 60.0):
+        """Rewrite path atomically with registry.snapshot() every interval seconds on a daemon thread."""
+        self.path = Path(path)
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="metrics-snapshot", daemon=True)
+
+    def write(self):
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(registry.snapshot(), f)
+        os.replace(tmp_path, self.path)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except OSError:
+                pass
+
+    def start(self) -> "JSONSnapshotWriter":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.write()
+
+
+class _StackSampler:
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: _Tally = _Tally()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-profiler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+@contextmanager
+def _sampling_profile(name: str, threshold: float, interval: float, out_dir: str):
+    sampler = _StackSampler(threading.get_ident(), interval)
+    started = time.perf_counter()
+    sampler.start()
+    try:
+        yield
+    finally:
+        sampler.stop()
+        elapsed = time.perf_counter() - started
+        if elapsed >= threshold and sampler.stacks:
+            Path(out_dir).mkdir(parents=True, exist_ok=True)
+            path = Path(out_dir) / f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{elapsed:.1f}s.folded"
+            # Folded stacks: feed to flamegraph.pl or speedscope
+            with open(path, "w") as f:
+                for stack, count in sampler.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+
+
+def profile_if_slow(name: str, threshold: Optional[float] = None, interval: float = 0.01, out_dir: str = "profiles"):
+    """
+    Sample the calling thread's stack while the block runs and keep the samples if it was slow.
+
+    Opt-in: without a threshold argument or METRICS_PROFILE_SLOW_SECONDS this is a
+    no-op. For async code the event loop thread is sampled, so concurrent requests
+    share one profile.
+    """
+    if threshold is None:
+        threshold = float(os.getenv("METRICS_PROFILE_SLOW_SECONDS", "0")) or None
+    if threshold is None:
+        return nullcontext()
+    return _sampling_profile(name, threshold, interval, out_dir)
+
+
+def start_from_env() -> Optional[ThreadingHTTPServer]:
+    """Start the exporters configured by METRICS_PORT and METRICS_SNAPSHOT_PATH (+ METRICS_SNAPSHOT_INTERVAL)."""
+    server = None
+    if os.getenv("METRICS_PORT"):
+        server = start_http_server(int(os.environ["METRICS_PORT"]))
+    if os.getenv("METRICS_SNAPSHOT_PATH"):
+        JSONSnapshotWriter(os.environ["METRICS_SNAPSHOT_PATH"], float(os.getenv("METRICS_SNAPSHOT_INTERVAL", "60"))).start()
+    return server
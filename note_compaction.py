@@ -0,0 +1,210 @@
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from cr_chunking import TokenCounter, approx_token_count, render_cr
+
+# A note reference: "#4" for legend line 4, "#1-5" for lines 1 to 5 in order
+_REF_RE = re.compile(r"^#(\d+)(?:-(\d+))?$")
+
+# Verbatim note lines that could be read as a reference (or start with the escape) get this prefix
+_ESCAPE = "\\"
+
+# Sent before the legend lines of every batch that references any
+LEGEND_HEADER = (
+    "Notes written as #n refer to line n of this legend, and #a-b to lines a through b in order; "
+    "a note starting with a backslash is literal text:"
+)
+
+
+@dataclass
+class CompactedNotes:
+    """
+    CR records whose repeated note lines were replaced by references into a shared legend.
+
+    Attributes:
+        legend (List[str]): Interned note lines; line n of the legend is legend[n - 1]
+        crs (List[Dict]): CR records with notes rewritten as "#n" / "#a-b" references plus unique lines,
+            backslash-escaped where they look like a reference
+        original_tokens (int): Tokens of the CR records before compaction
+        compacted_tokens (int): Tokens of the compacted records plus the legend lines sent with them;
+            when chunked, each batch pays for the lines it references
+        chunks (Optional[List[List[Dict]]]): Token-budgeted batches of crs, if a budget was given
+    """
+    legend: List[str]
+    crs: List[Dict]
+    original_tokens: int
+    compacted_tokens: int
+    chunks: Optional[List[List[Dict]]] = None
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.original_tokens - self.compacted_tokens
+
+    def report(self) -> Dict:
+        return {
+            "crs": len(self.crs),
+            "chunks": len(self.chunks) if self.chunks is not None else 1,
+            "legend_lines": len(self.legend),
+            "original_tokens": self.original_tokens,
+            "compacted_tokens": self.compacted_tokens,
+            "saved_tokens": self.saved_tokens,
+            "saved_ratio": round(self.saved_tokens / self.original_tokens, 3) if self.original_tokens else 0.0
+        }
+
+
+def _collapse_refs(numbers: List[int]) -> List[str]:
+    """Turn runs of consecutive legend numbers, i.e. shared step sequences, into "#a-b" ranges."""
+    refs = []
+    start = prev = None
+    for n in numbers + [None]:
+        if prev is not None and n == prev + 1:
+            prev = n
+            continue
+        if start is not None:
+            refs.append(f"#{start}" if start == prev else f"#{start}-{prev}")
+        start = prev = n
+    return refs
+
+
+def _escape(note: str) -> str:
+    """Mark a verbatim note line that would otherwise look like a legend reference."""
+    return _ESCAPE + note if _REF_RE.match(note) or note.startswith(_ESCAPE) else note
+
+
+def compact_notes(crs: List[Dict], count_tokens: TokenCounter = approx_token_count, min_occurrences: int = 2, min_chars: int = 12, max_tokens: Optional[int] = None) -> CompactedNotes:
+    """
+    Intern note lines repeated across the batch into a numbered legend.
+
+    Legend lines are numbered in order of first appearance, so a step sequence
+    shared by several CRs gets consecutive numbers and is rendered as a single
+    "#a-b" range; only lines unique to a CR are kept verbatim, prefixed with a
+    backslash if they look like a reference themselves.
+
+    Args:
+        crs (List[Dict]): CR records ({"cr_id", "notes", "status"})
+        count_tokens (TokenCounter): Function returning the token count of a string
+        min_occurrences (int): How often a line must occur in the batch to be interned
+        min_chars (int): Shorter lines are cheaper to repeat than to reference
+        max_tokens (Optional[int]): Token budget per batch; if given, the records are split
+            with chunk_compacted and the token counts include every batch's legend lines
+
+    Returns:
+        CompactedNotes: The legend, the rewritten records and the token counts
+    """
+    counts = Counter(note for cr in crs for note in cr["notes"])
+    numbers: Dict[str, int] = {}
+    for cr in crs:
+        for note in cr["notes"]:
+            if note not in numbers and counts[note] >= min_occurrences and len(note) >= min_chars:
+                numbers[note] = len(numbers) + 1
+    legend = list(numbers)
+
+    compacted = []
+    for cr in crs:
+        notes, run = [], []
+        for note in cr["notes"]:
+            if note in numbers:
+                run.append(numbers[note])
+                continue
+            notes.extend(_collapse_refs(run))
+            run = []
+            notes.append(_escape(note))
+        notes.extend(_collapse_refs(run))
+        compacted.append({**cr, "notes": notes})
+
+    original_tokens = sum(count_tokens(render_cr(cr)) for cr in crs)
+    chunks = chunk_compacted(compacted, legend, max_tokens, count_tokens) if max_tokens is not None else None
+    compacted_tokens = sum(
+        sum(count_tokens(render_cr(cr)) for cr in chunk) + count_tokens(legend_prompt(legend, referenced_lines(chunk)))
+        for chunk in (chunks if chunks is not None else [compacted])
+    )
+    return CompactedNotes(legend, compacted, original_tokens, compacted_tokens, chunks)
+
+
+def chunk_compacted(crs: List[Dict], legend: List[str], max_tokens: int, count_tokens: TokenCounter = approx_token_count) -> List[List[Dict]]:
+    """
+    Like chunk_crs, but a batch's budget also pays for the legend lines it references.
+
+    Every batch is sent with the legend lines its records reference, so a record
+    costs its own tokens plus those of the lines no earlier record of the batch
+    needed. A single record larger than the budget is placed in a batch of its own.
+
+    Args:
+        crs (List[Dict]): Compacted CR records
+        legend (List[str]): The legend the records refer to
+        max_tokens (int): Token budget for the CR data and legend lines of one batch
+        count_tokens (TokenCounter): Function returning the token count of a string
+
+    Returns:
+        List[List[Dict]]: Batches of CR records preserving the input order
+    """
+    header_tokens = count_tokens(LEGEND_HEADER)
+    line_tokens: Dict[int, int] = {}
+
+    def cost(cr_tokens: int, new_lines: set, first: bool) -> int:
+        for n in new_lines - line_tokens.keys():
+            line_tokens[n] = count_tokens(render_legend(legend, [n]))
+        legend_cost = sum(line_tokens[n] for n in new_lines)
+        return cr_tokens + legend_cost + (header_tokens if new_lines and first else 0)
+
+    chunks: List[List[Dict]] = []
+    current: List[Dict] = []
+    lines: set = set()
+    used = 0
+    for cr in crs:
+        cr_tokens = count_tokens(render_cr(cr))
+        refs = set(referenced_lines([cr]))
+        tokens = cost(cr_tokens, refs - lines, not lines)
+        if current and used + tokens > max_tokens:
+            chunks.append(current)
+            current, lines, used = [], set(), 0
+            tokens = cost(cr_tokens, refs, True)
+        current.append(cr)
+        lines |= refs
+        used += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def referenced_lines(crs: List[Dict]) -> List[int]:
+    """Sorted legend line numbers referenced by a set of compacted CR records."""
+    lines = set()
+    for cr in crs:
+        for note in cr["notes"]:
+            match = _REF_RE.match(note)
+            if match:
+                first = int(match.group(1))
+                lines.update(range(first, int(match.group(2) or first) + 1))
+    return sorted(lines)
+
+
+def render_legend(legend: List[str], lines: List[int] = None) -> str:
+    """Render the legend, or just the given line numbers of it, one "n. text" entry per line."""
+    if lines is None:
+        lines = range(1, len(legend) + 1)
+    return "\n".join(f"{n}. {legend[n - 1]}" for n in lines)
+
+
+def legend_prompt(legend: List[str], lines: List[int]) -> str:
+    """Legend section of a batch prompt, empty when the batch references no lines."""
+    if not lines:
+        return ""
+    return f"{LEGEND_HEADER}\n{render_legend(legend, lines)}"
+
+
+def expand_notes(notes: List[str], legend: List[str]) -> List[str]:
+    """Inverse of the compaction for one CR: replace references with the legend lines."""
+    expanded = []
+    for note in notes:
+        match = _REF_RE.match(note)
+        if match:
+            first = int(match.group(1))
+            expanded.extend(legend[n - 1] for n in range(first, int(match.group(2) or first) + 1))
+        elif note.startswith(_ESCAPE):
+            expanded.append(note[len(_ESCAPE):])
+        else:
+            expanded.append(note)
+    return expanded
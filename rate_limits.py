@@ -0,0 +1,125 @@
+import asyncio
+import threading
+import time
+from typing import Any, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.rate_limiters import BaseRateLimiter
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        """
+        Thread- and asyncio-safe token bucket refilled continuously at per_minute.
+
+        Args:
+            per_minute (float): Refill rate
+            capacity (Optional[float]): Burst size, defaults to one minute of tokens
+        """
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _take(self, amount: float) -> float:
+        """Take amount if available and return 0, otherwise return the seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self.paused_until:
+                return self.paused_until - now
+            # Requests larger than the burst size go through once the bucket is full
+            needed = min(amount, self.capacity)
+            if self.tokens >= needed:
+                self.tokens -= amount
+                return 0.0
+            return (needed - self.tokens) / self.rate
+
+    def try_acquire(self, amount: float = 1) -> bool:
+        return self._take(amount) == 0.0
+
+    def acquire(self, amount: float = 1):
+        while (wait := self._take(amount)) > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, amount: float = 1):
+        while (wait := self._take(amount)) > 0:
+            await asyncio.sleep(wait)
+
+    def debit(self, amount: float):
+        """Adjust the balance after the fact, e.g. by actual minus estimated usage; may go negative."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+    def pause(self, seconds: float):
+        """Let nothing through for the given time, e.g. after the provider answered 429."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class LLMRateLimiter(BaseRateLimiter, BaseCallbackHandler):
+    def __init__(self, requests_per_minute: float, tokens_per_minute: Optional[float] = None, estimated_tokens: int = 1500):
+        """
+        Requests- and tokens-per-minute limiter for a chat model.
+
+        Set it as the model's rate_limiter and add it to the model's callbacks.
+        The chat model acquires it only on LLM cache misses, before the API call;
+        each call is charged estimated_tokens up front and the difference to the
+        reported usage once the response arrives. A call that fails is refunded
+        its reservation.
+
+        Args:
+            requests_per_minute (float): Provider RPM limit
+            tokens_per_minute (Optional[float]): Provider TPM limit, None to ignore tokens
+            estimated_tokens (int): Tokens reserved per request before its usage is known
+        """
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.estimated_tokens = estimated_tokens
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        if not blocking:
+            if not self.requests.try_acquire():
+                return False
+            if self.tokens is not None and not self.tokens.try_acquire(self.estimated_tokens):
+                # Nothing is sent, so the request slot goes back
+                self.requests.debit(-1)
+                return False
+            return True
+        self.requests.acquire()
+        if self.tokens is not None:
+            self.tokens.acquire(self.estimated_tokens)
+        return True
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        if not blocking:
+            return self.acquire(blocking=False)
+        await self.requests.aacquire()
+        if self.tokens is not None:
+            await self.tokens.aacquire(self.estimated_tokens)
+        return True
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> Any:
+        # Cached responses carry no llm_output and were never charged
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if self.tokens is not None and usage.get("total_tokens"):
+            self.tokens.debit(usage["total_tokens"] - self.estimated_tokens)
+
+    def on_llm_error(self, error: BaseException, **kwargs: Any) -> Any:
+        # A failed call reports no usage; give back its reservation instead of keeping the estimate
+        if self.tokens is not None:
+            self.tokens.debit(-self.estimated_tokens)
+
+    def pause(self, seconds: float):
+        """Hold back every caller, e.g. after the provider answered 429."""
+        self.requests.pause(seconds)
+        if self.tokens is not None:
+            self.tokens.pause(seconds)
@@ -0,0 +1,81 @@
+import math
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import List, Optional
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def text_similarity(a: str, b: str) -> float:
+    """
+    Cosine similarity of the word-count vectors of two texts, in [0, 1].
+
+    Linear in the text length, so it is cheap enough to run after every revision.
+    """
+    counts_a = Counter(_WORD_RE.findall(a.lower()))
+    counts_b = Counter(_WORD_RE.findall(b.lower()))
+    if not counts_a or not counts_b:
+        return 1.0 if counts_a == counts_b else 0.0
+    dot = sum(count * counts_b[word] for word, count in counts_a.items())
+    norm_a = math.sqrt(sum(count * count for count in counts_a.values()))
+    norm_b = math.sqrt(sum(count * count for count in counts_b.values()))
+    return dot / (norm_a * norm_b)
+
+
+@dataclass
+class StoppingPolicy:
+    """
+    Decides when the reflection loop should stop revising.
+
+    The token and time caps are also checked right after the draft, so a run
+    that is already over budget skips revising altogether.
+
+    Attributes:
+        max_revisions (int): Hard cap on revisor calls per run
+        similarity_threshold (float): Stop once a revision is at least this similar to the previous version
+        max_tokens (Optional[int]): Stop once the run has used this many LLM tokens, None for no cap
+        max_seconds (Optional[float]): Stop once the run has taken this long, None for no cap
+    """
+    max_revisions: int = 1
+    similarity_threshold: float = 0.95
+    max_tokens: Optional[int] = 50000
+    max_seconds: Optional[float] = 300.0
+
+    @classmethod
+    def from_env(cls) -> "StoppingPolicy":
+        """
+        Policy configured by REFLECTION_MAX_REVISIONS, REFLECTION_SIMILARITY_THRESHOLD,
+        REFLECTION_MAX_TOKENS and REFLECTION_MAX_SECONDS; unset variables keep the
+        defaults and 0 disables a cap.
+        """
+        defaults = cls()
+        max_tokens = int(os.getenv("REFLECTION_MAX_TOKENS", defaults.max_tokens or 0))
+        max_seconds = float(os.getenv("REFLECTION_MAX_SECONDS", defaults.max_seconds or 0))
+        return cls(
+            max_revisions=int(os.getenv("REFLECTION_MAX_REVISIONS", defaults.max_revisions)),
+            similarity_threshold=float(os.getenv("REFLECTION_SIMILARITY_THRESHOLD", defaults.similarity_threshold)),
+            max_tokens=max_tokens or None,
+            max_seconds=max_seconds or None
+        )
+
+    def stop_reason(self, versions: List[str], tokens_used: int = 0, elapsed: float = 0.0) -> Optional[str]:
+        """
+        Return why the loop should stop, or None to revise again.
+
+        Args:
+            versions (List[str]): The draft followed by every revision so far
+            tokens_used (int): LLM tokens spent on the run so far
+            elapsed (float): Seconds since the run started
+        """
+        revisions = len(versions) - 1
+        if revisions >= self.max_revisions:
+            return "max_revisions"
+        if self.max_tokens is not None and tokens_used >= self.max_tokens:
+            return "max_tokens"
+        if self.max_seconds is not None and elapsed >= self.max_seconds:
+            return "max_seconds"
+        if revisions >= 1 and text_similarity(versions[-2], versions[-1]) >= self.similarity_threshold:
+            return "converged"
+        return None
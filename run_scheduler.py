@@ -0,0 +1,176 @@
+import logging
+import threading
+import time
+from collections import deque
+from queue import Empty, Full, Queue
+from typing import Callable, Deque, Dict, Optional, Set
+
+# Sentinel that tells a worker thread to exit
+_STOP = object()
+
+
+class RunScheduler:
+    def __init__(
+        self,
+        handler: Callable[[str], None],
+        max_workers: int = 10,
+        max_queue_size: int = 1000,
+        throughput_window: float = 300.0,
+        logger: Optional[logging.Logger] = None
+    ):
+        """
+        Long-lived worker pool fed by a bounded queue of MIDs.
+
+        MIDs start as soon as a worker is free; an MID that is already queued
+        or running is not accepted again.
+
+        Args:
+            handler (Callable[[str], None]): Function run for each MID
+            max_workers (int): Number of worker threads kept busy
+            max_queue_size (int): Maximum number of MIDs waiting for a worker
+            throughput_window (float): Seconds over which throughput is measured
+            logger (Optional[logging.Logger]): Logger for handler errors
+        """
+        self.handler = handler
+        self.max_workers = max_workers
+        self.throughput_window = throughput_window
+        self.logger = logger or logging.getLogger(__name__)
+        self._queue: Queue = Queue(maxsize=max_queue_size)
+        self._in_flight: Set[str] = set()  # queued or running MIDs
+        self._running = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._completion_times: Deque[float] = deque()
+        self._lock = threading.Lock()
+        self._workers = []
+        self._started = False
+
+    def start(self):
+        """Start the worker threads."""
+        if self._started:
+            return
+        self._started = True
+        for i in range(self.max_workers):
+            worker = threading.Thread(target=self._worker, name=f"run-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def stop(self, wait: bool = True):
+        """
+        Stop the workers.
+
+        Args:
+            wait (bool): Process the queued MIDs and join the workers; if False, queued
+                MIDs are dropped and running ones are left to finish on their own
+        """
+        if not self._started:
+            return
+        if not wait:
+            # Make room for the sentinels so a full queue cannot block shutdown
+            self._drain()
+        for _ in self._workers:
+            try:
+                self._queue.put(_STOP, block=wait)
+            except Full:
+                # A submitter refilled the queue; the daemon workers exit with the process
+                break
+        if wait:
+            for worker in self._workers:
+                worker.join()
+        self._workers = []
+        self._started = False
+
+    def _drain(self):
+        """Drop every queued MID."""
+        while True:
+            try:
+                mid = self._queue.get_nowait()
+            except Empty:
+                return
+            if mid is not _STOP:
+                with self._lock:
+                    self._in_flight.discard(mid)
+            self._queue.task_done()
+
+    def submit(self, mid: str, block: bool = True, timeout: Optional[float] = None) -> bool:
+        """
+        Queue an MID for a run.
+
+        Args:
+            mid (str): The MID to run
+            block (bool): Wait for queue space if the queue is full
+            timeout (Optional[float]): Maximum seconds to wait for queue space
+
+        Returns:
+            bool: True if queued, False if already queued/running or the queue stayed full
+        """
+        with self._lock:
+            if mid in self._in_flight:
+                return False
+            self._in_flight.add(mid)
+        try:
+            self._queue.put(mid, block=block, timeout=timeout)
+        except Full:
+            with self._lock:
+                self._in_flight.discard(mid)
+            return False
+        with self._lock:
+            self._submitted += 1
+        return True
+
+    def is_in_flight(self, mid: str) -> bool:
+        """Return True if the MID is queued or running."""
+        with self._lock:
+            return mid in self._in_flight
+
+    def _worker(self):
+        while True:
+            mid = self._queue.get()
+            if mid is _STOP:
+                self._queue.task_done()
+                return
+            with self._lock:
+                self._running += 1
+            failed = False
+            try:
+                self.handler(mid)
+            except Exception as e:
+                failed = True
+                self.logger.error(f"Unhandled error running MID {mid}: {e}")
+            finally:
+                now = time.monotonic()
+                with self._lock:
+                    self._running -= 1
+                    self._in_flight.discard(mid)
+                    self._completed += 1
+                    self._failed += failed
+                    self._completion_times.append(now)
+                self._queue.task_done()
+
+    def wait_idle(self):
+        """Block until every queued MID has been processed."""
+        self._queue.join()
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Snapshot of scheduler load for sizing the worker pool.
+
+        Returns:
+            Dict[str, float]: queue_depth, running, in_flight, submitted, completed,
+                failed and throughput_per_min over the throughput window
+        """
+        cutoff = time.monotonic() - self.throughput_window
+        with self._lock:
+            while self._completion_times and self._completion_times[0] < cutoff:
+                self._completion_times.popleft()
+            recent = len(self._completion_times)
+            return {
+                "queue_depth": self._queue.qsize(),
+                "running": self._running,
+                "in_flight": len(self._in_flight),
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+                "throughput_per_min": recent * 60.0 / self.throughput_window,
+            }
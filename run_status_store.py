@@ -0,0 +1,339 @@
+import json
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+from database_access import ConnectionPool, MAX_QUERY_PARAMS
+
+# Timestamp format used by m_ids_lina_run.json
+LINA_RUN_TIME_FORMAT = "%d%m%Y %H%M%S"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lina_runs (
+    M_ID TEXT PRIMARY KEY,
+    lina_run_output TEXT NOT NULL,
+    lina_run_time TEXT NOT NULL,
+    run_epoch REAL NOT NULL,
+    content_hash TEXT,
+    failure_count INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL
+)
+"""
+# Only failed runs have a next attempt, so the index holds just the retry candidates
+NEXT_ATTEMPT_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_lina_runs_next_attempt ON lina_runs (next_attempt_at)
+WHERE next_attempt_at IS NOT NULL
+"""
+# Columns added after the first release, with their definitions
+ADDED_COLUMNS = {
+    "content_hash": "TEXT",
+    "failure_count": "INTEGER NOT NULL DEFAULT 0",
+    "next_attempt_at": "REAL"
+}
+
+
+class RunStatusStore:
+    def __init__(
+        self,
+        db_path: str = "db_path/run_status.sqlite",
+        pool_size: int = 10,
+        retry_base: float = 300.0,
+        retry_max: float = 6 * 3600.0
+    ):
+        """
+        Indexed SQLite store of tool run results, one row per M_ID.
+
+        Runs in WAL mode so concurrent writers record results row by row
+        instead of rewriting a whole status file under an exclusive lock.
+        Each result keeps the content hash of the issue data it ran on. Failed
+        runs are retried after a delay that doubles per consecutive failure,
+        capped at retry_max.
+
+        Args:
+            db_path (str): Path to the status database
+            pool_size (int): Maximum number of pooled connections
+            retry_base (float): Seconds before the first retry of a failed run
+            retry_max (float): Upper bound on the retry delay in seconds
+        """
+        self.db_path = db_path
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.pool = ConnectionPool(db_path, pool_size=pool_size)
+        with self.pool.connection() as conn:
+            # Immediate transaction: runners opening an old store together migrate it once
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(SCHEMA)
+            self._migrate(conn)
+            conn.execute(NEXT_ATTEMPT_INDEX)
+            conn.commit()
+
+    def _migrate(self, conn: sqlite3.Connection):
+        """Add columns missing from a store created by an older version."""
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(lina_runs)")}
+        missing = [column for column in ADDED_COLUMNS if column not in existing]
+        for column in missing:
+            conn.execute(f"ALTER TABLE lina_runs ADD COLUMN {column} {ADDED_COLUMNS[column]}")
+        if missing:
+            # Failures recorded before retries existed become due one backoff after they ran
+            self._schedule_legacy_failures(conn)
+
+    def _schedule_legacy_failures(self, conn: sqlite3.Connection):
+        conn.execute(
+            """
+            UPDATE lina_runs SET failure_count = 1, next_attempt_at = run_epoch + ?
+            WHERE lina_run_output = 'Failure' AND next_attempt_at IS NULL
+            """,
+            (self.retry_base,)
+        )
+
+    def retry_delay(self, failure_count: int) -> float:
+        """Seconds to wait before retrying an M_ID that failed failure_count times in a row."""
+        return min(self.retry_base * 2 ** (failure_count - 1), self.retry_max)
+
+    def get(self, mid: str) -> Optional[Dict[str, str]]:
+        """
+        Retrieve the last recorded run for an M_ID.
+
+        Args:
+            mid (str): The M_ID to look up
+
+        Returns:
+            Optional[Dict[str, str]]: Record with M_ID, lina_run_output and lina_run_time, None if never run
+        """
+        try:
+            with self.pool.connection() as conn:
+                row = conn.execute(
+                    "SELECT M_ID, lina_run_output, lina_run_time FROM lina_runs WHERE M_ID = ?",
+                    (mid,)
+                ).fetchone()
+            if row is None:
+                return None
+            return {"M_ID": row[0], "lina_run_output": row[1], "lina_run_time": row[2]}
+        except sqlite3.Error as e:
+            raise Exception(f"Error retrieving run status for M_ID {mid}: {e}")
+
+    def has_run(self, mid: str) -> bool:
+        """Return True if a run has been recorded for the M_ID."""
+        return self.get(mid) is not None
+
+    def last_result(self, mid: str) -> Optional[str]:
+        """Return the last lina_run_output for the M_ID, None if never run."""
+        record = self.get(mid)
+        return record["lina_run_output"] if record else None
+
+    def last_run_time(self, mid: str) -> Optional[str]:
+        """Return the last lina_run_time for the M_ID, None if never run."""
+        record = self.get(mid)
+        return record["lina_run_time"] if record else None
+
+    def filter_unrun(self, mids: Iterable[str]) -> Set[str]:
+        """
+        Return the subset of M_IDs that have no recorded run.
+
+        Args:
+            mids (Iterable[str]): Candidate M_IDs
+
+        Returns:
+            Set[str]: M_IDs without a run record
+        """
+        pending = set(mids)
+        candidates = list(pending)
+        try:
+            with self.pool.connection() as conn:
+                for start in range(0, len(candidates), MAX_QUERY_PARAMS):
+                    chunk = candidates[start:start + MAX_QUERY_PARAMS]
+                    placeholders = ", ".join("?" * len(chunk))
+                    cursor = conn.execute(
+                        f"SELECT M_ID FROM lina_runs WHERE M_ID IN ({placeholders})",
+                        chunk
+                    )
+                    pending.difference_update(row[0] for row in cursor.fetchall())
+            return pending
+        except sqlite3.Error as e:
+            raise Exception(f"Error checking run status for {len(candidates)} M_IDs: {e}")
+
+    def filter_changed(self, hashes: Dict[str, str]) -> Set[str]:
+        """
+        Return the M_IDs whose issue data differs from what their last run saw.
+
+        M_IDs without a run record are included. A record without a content hash
+        predates hashing: it takes the current hash as its baseline and is not rerun.
+
+        Args:
+            hashes (Dict[str, str]): Current content hash per candidate M_ID
+
+        Returns:
+            Set[str]: M_IDs never run or run on different content
+        """
+        changed = set(hashes)
+        baseline = []
+        candidates = list(hashes)
+        try:
+            with self.pool.connection() as conn:
+                for start in range(0, len(candidates), MAX_QUERY_PARAMS):
+                    chunk = candidates[start:start + MAX_QUERY_PARAMS]
+                    placeholders = ", ".join("?" * len(chunk))
+                    cursor = conn.execute(
+                        f"SELECT M_ID, content_hash FROM lina_runs WHERE M_ID IN ({placeholders})",
+                        chunk
+                    )
+                    for mid, content_hash in cursor.fetchall():
+                        if content_hash is None:
+                            baseline.append((hashes[mid], mid))
+                        if content_hash is None or content_hash == hashes[mid]:
+                            changed.discard(mid)
+                if baseline:
+                    conn.executemany(
+                        "UPDATE lina_runs SET content_hash = ? WHERE M_ID = ? AND content_hash IS NULL",
+                        baseline
+                    )
+                    conn.commit()
+            return changed
+        except sqlite3.Error as e:
+            raise Exception(f"Error checking content hashes for {len(candidates)} M_IDs: {e}")
+
+    def due_failures(self, now: Optional[float] = None, limit: int = 1000) -> List[str]:
+        """
+        Return failed M_IDs whose retry delay has passed, longest overdue first.
+
+        Args:
+            now (Optional[float]): Current time as a Unix timestamp, defaults to now
+            limit (int): Maximum number of M_IDs to return
+
+        Returns:
+            List[str]: M_IDs due for a retry
+        """
+        now = time.time() if now is None else now
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.execute(
+                    "SELECT M_ID FROM lina_runs WHERE next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?",
+                    (now, limit)
+                )
+                return [row[0] for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            raise Exception(f"Error retrieving failed runs due before {now}: {e}")
+
+    def needs_run(self, mid: str, content_hash: Optional[str] = None, now: Optional[float] = None) -> bool:
+        """
+        Return True if the M_ID has never run, ran on other content, or is a failure due for a retry.
+
+        Args:
+            mid (str): The M_ID to check
+            content_hash (Optional[str]): Current content hash, None to skip the content check
+            now (Optional[float]): Current time as a Unix timestamp, defaults to now
+        """
+        now = time.time() if now is None else now
+        try:
+            with self.pool.connection() as conn:
+                row = conn.execute(
+                    "SELECT content_hash, next_attempt_at FROM lina_runs WHERE M_ID = ?",
+                    (mid,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            raise Exception(f"Error retrieving run status for M_ID {mid}: {e}")
+        if row is None:
+            return True
+        stored_hash, next_attempt_at = row
+        if content_hash is not None and stored_hash is not None and stored_hash != content_hash:
+            return True
+        return next_attempt_at is not None and next_attempt_at <= now
+
+    def record(self, mid: str, output: str, run_epoch: Optional[float] = None, content_hash: Optional[str] = None):
+        """
+        Record the result of a tool run, replacing any earlier result for the M_ID.
+
+        A "Failure" schedules the next attempt with capped exponential backoff,
+        any other result clears the failure count.
+
+        Args:
+            mid (str): The M_ID that was run
+            output (str): Run result, e.g. "Success" or "Failure"
+            run_epoch (Optional[float]): Run time as a Unix timestamp, defaults to now
+            content_hash (Optional[str]): Content hash of the issue data the run used, None keeps the stored one
+        """
+        run_epoch = time.time() if run_epoch is None else run_epoch
+        run_time = datetime.fromtimestamp(run_epoch).strftime(LINA_RUN_TIME_FORMAT)
+        try:
+            with self.pool.connection() as conn:
+                # Immediate transaction: concurrent failures of one M_ID each count once
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute("SELECT failure_count FROM lina_runs WHERE M_ID = ?", (mid,)).fetchone()
+                if output == "Failure":
+                    failure_count = (row[0] if row else 0) + 1
+                    next_attempt_at = run_epoch + self.retry_delay(failure_count)
+                else:
+                    failure_count, next_attempt_at = 0, None
+                conn.execute(
+                    """
+                    INSERT INTO lina_runs (M_ID, lina_run_output, lina_run_time, run_epoch, content_hash, failure_count, next_attempt_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(M_ID) DO UPDATE SET
+                        lina_run_output = excluded.lina_run_output,
+                        lina_run_time = excluded.lina_run_time,
+                        run_epoch = excluded.run_epoch,
+                        content_hash = COALESCE(excluded.content_hash, lina_runs.content_hash),
+                        failure_count = excluded.failure_count,
+                        next_attempt_at = excluded.next_attempt_at
+                    """,
+                    (mid, output, run_time, run_epoch, content_hash, failure_count, next_attempt_at)
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            raise Exception(f"Error recording run status for M_ID {mid}: {e}")
+
+    def is_empty(self) -> bool:
+        """Return True if no runs have been recorded."""
+        with self.pool.connection() as conn:
+            return conn.execute("SELECT 1 FROM lina_runs LIMIT 1").fetchone() is None
+
+    def import_json(self, json_path: str = "m_ids_lina_run.json") -> int:
+        """
+        One-time import of a legacy m_ids_lina_run.json status file.
+
+        Existing records are kept, so re-running the import is harmless.
+        Imported failures are scheduled for a retry.
+
+        Args:
+            json_path (str): Path to the JSON list of {M_ID, lina_run_output, lina_run_time}
+
+        Returns:
+            int: Number of records imported
+        """
+        with open(json_path, 'r') as f:
+            records = json.load(f)
+
+        rows = []
+        for record in records:
+            run_time = record["lina_run_time"]
+            run_epoch = datetime.strptime(run_time, LINA_RUN_TIME_FORMAT).timestamp()
+            rows.append((record["M_ID"], record["lina_run_output"], run_time, run_epoch))
+
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.executemany(
+                    """
+                    INSERT OR IGNORE INTO lina_runs (M_ID, lina_run_output, lina_run_time, run_epoch)
+                    VALUES (?, ?, ?, ?)
+                    """,
+                    rows
+                )
+                imported = cursor.rowcount
+                self._schedule_legacy_failures(conn)
+                conn.commit()
+                return imported
+        except sqlite3.Error as e:
+            raise Exception(f"Error importing run status from {json_path}: {e}")
+
+    def close(self):
+        """Close all pooled connections."""
+        self.pool.close()
+
+
+if __name__ == "__main__":
+    store = RunStatusStore()
+    imported = store.import_json("m_ids_lina_run.json")
+    print(f"Imported {imported} run records into {store.db_path}")
@@ -0,0 +1,281 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Protocol, Sequence
+
+from database_access import MAX_QUERY_PARAMS, ConnectionPool
+from rate_limits import TokenBucket
+
+SearchResults = Any  # whatever the provider returns for one query, usually a list of {"url", "content"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_cache (
+    cache_key TEXT PRIMARY KEY,
+    provider TEXT NOT NULL,
+    query TEXT NOT NULL,
+    results TEXT NOT NULL,
+    created_at REAL NOT NULL
+)
+"""
+CREATED_INDEX = "CREATE INDEX IF NOT EXISTS idx_search_cache_created_at ON search_cache (created_at)"
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_EDGE_PUNCTUATION = " \t\n\"'`.,;:!?"
+
+
+def normalize_query(query: str) -> str:
+    """Case-, width- and whitespace-insensitive form of a query, without surrounding punctuation."""
+    query = unicodedata.normalize("NFKC", query).casefold()
+    return _WHITESPACE_RE.sub(" ", query).strip(_EDGE_PUNCTUATION)
+
+
+class SearchProvider(Protocol):
+    name: str
+
+    def search(self, query: str) -> SearchResults:
+        ...
+
+
+class TavilyProvider:
+    def __init__(self, max_results: int = 5):
+        """Tavily web search; needs TAVILY_API_KEY."""
+        from langchain_community.tools.tavily_search import TavilySearchResults
+        from langchain_community.utilities.tavily_search import TavilySearchAPIWrapper
+
+        self.name = f"tavily:{max_results}"
+        self.tool = TavilySearchResults(api_wrapper=TavilySearchAPIWrapper(), max_results=max_results)
+
+    def search(self, query: str) -> SearchResults:
+        return self.tool.invoke({"query": query})
+
+
+class LocalSearchProvider:
+    def __init__(self, json_path: str = "input_json/Updated_CR_data.json", max_results: int = 5, latency: float = 0.0):
+        """
+        Offline stand-in for a web search provider.
+
+        Ranks the CR records of a JSON file by how many query words their notes and
+        description contain and returns Tavily-shaped {"url", "content"} results.
+
+        Args:
+            json_path (str): CR data file used as the corpus
+            max_results (int): Results per query
+            latency (float): Seconds each search sleeps, to mimic a remote API
+        """
+        self.name = f"local:{max_results}"
+        self.max_results = max_results
+        self.latency = latency
+        try:
+            with open(json_path) as f:
+                records = json.load(f)
+        except (OSError, ValueError):
+            records = []
+        self.documents = [
+            (record.get("CR_ID", str(i)), " ".join(record.get("notes", [])) + " " + record.get("description", ""))
+            for i, record in enumerate(records)
+        ]
+        self._words = [set(re.findall(r"\w+", text.lower())) for _, text in self.documents]
+
+    def search(self, query: str) -> SearchResults:
+        if self.latency:
+            time.sleep(self.latency)
+        words = set(re.findall(r"\w+", query.lower()))
+        scored = sorted(
+            ((len(words & doc_words), i) for i, doc_words in enumerate(self._words) if words & doc_words),
+            key=lambda item: (-item[0], item[1])
+        )
+        return [
+            {"url": f"local://cr/{self.documents[i][0]}", "content": self.documents[i][1]}
+            for _, i in scored[:self.max_results]
+        ]
+
+
+def get_search_provider(name: Optional[str] = None) -> SearchProvider:
+    """Provider named by SEARCH_PROVIDER ("tavily" or "local"), Tavily by default."""
+    name = name or os.getenv("SEARCH_PROVIDER", "tavily")
+    if name == "local":
+        return LocalSearchProvider(latency=float(os.getenv("SEARCH_LOCAL_LATENCY", "0")))
+    if name == "tavily":
+        return TavilyProvider()
+    raise ValueError(f"Unknown search provider: {name}")
+
+
+class SearchCache:
+    def __init__(self, db_path: str = "db_path/search_cache.sqlite", ttl_seconds: Optional[float] = 24 * 3600, pool_size: int = 4):
+        """
+        Persistent search result cache keyed by provider and normalized query.
+
+        Args:
+            db_path (str): Path to the cache database
+            ttl_seconds (Optional[float]): Result lifetime, None to keep results forever
+            pool_size (int): Maximum number of pooled connections
+        """
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.pool = ConnectionPool(db_path, pool_size=pool_size)
+        with self.pool.connection() as conn:
+            conn.execute(SCHEMA)
+            conn.execute(CREATED_INDEX)
+            conn.commit()
+
+    @staticmethod
+    def key(provider: str, normalized_query: str) -> str:
+        return hashlib.sha256(f"{provider}\0{normalized_query}".encode()).hexdigest()
+
+    def get_many(self, provider: str, normalized_queries: Sequence[str]) -> Dict[str, SearchResults]:
+        """Fresh cached results by normalized query; misses and expired entries are absent."""
+        keys = {self.key(provider, query): query for query in normalized_queries}
+        oldest = time.time() - self.ttl_seconds if self.ttl_seconds is not None else 0
+        found = {}
+        key_list = list(keys)
+        with self.pool.connection() as conn:
+            for i in range(0, len(key_list), MAX_QUERY_PARAMS):
+                chunk = key_list[i:i + MAX_QUERY_PARAMS]
+                placeholders = ",".join("?" * len(chunk))
+                for cache_key, results in conn.execute(
+                    f"SELECT cache_key, results FROM search_cache WHERE cache_key IN ({placeholders}) AND created_at >= ?",
+                    chunk + [oldest]
+                ):
+                    found[keys[cache_key]] = json.loads(results)
+        return found
+
+    def put_many(self, provider: str, results: Dict[str, SearchResults]):
+        """Store results by normalized query."""
+        now = time.time()
+        with self.pool.connection() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO search_cache (cache_key, provider, query, results, created_at) VALUES (?, ?, ?, ?, ?)",
+                [(self.key(provider, query), provider, query, json.dumps(value), now) for query, value in results.items()]
+            )
+            conn.commit()
+
+    def purge_expired(self) -> int:
+        if self.ttl_seconds is None:
+            return 0
+        with self.pool.connection() as conn:
+            deleted = conn.execute("DELETE FROM search_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,)).rowcount
+            conn.commit()
+        return deleted
+
+    def close(self):
+        self.pool.close()
+
+
+class SearchLayer:
+    def __init__(
+        self,
+        provider: SearchProvider,
+        cache: Optional[SearchCache] = None,
+        max_concurrency: int = 5,
+        requests_per_minute: Optional[float] = None
+    ):
+        """
+        Deduplicating, caching and rate-limited front end for a search provider.
+
+        Queries that normalize to the same text are searched once per batch, cached
+        results are reused until they expire, and the remaining searches run with at
+        most max_concurrency in flight and requests_per_minute overall.
+
+        Args:
+            provider (SearchProvider): Backend that runs one query
+            cache (Optional[SearchCache]): Persistent result cache, None to disable
+            max_concurrency (int): Provider calls in flight at once
+            requests_per_minute (Optional[float]): Provider call rate limit, None for no limit
+        """
+        self.provider = provider
+        self.cache = cache
+        self.max_concurrency = max_concurrency
+        self.bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="search")
+        self._stats_lock = threading.Lock()
+        self.queries = 0
+        self.deduplicated = 0
+        self.cache_hits = 0
+        self.provider_calls = 0
+        self.errors = 0
+
+    def _search_one(self, query: str) -> SearchResults:
+        if self.bucket is not None:
+            self.bucket.acquire()
+        with self._stats_lock:
+            self.provider_calls += 1
+        return self.provider.search(query)
+
+    def _plan(self, queries: Sequence[str]):
+        """Normalize, dedupe and consult the cache; returns (normalized per query, cached, to search)."""
+        normalized = [normalize_query(query) for query in queries]
+        # First original spelling of each normalized query is the one sent to the provider
+        unique = {}
+        for query, norm in zip(queries, normalized):
+            unique.setdefault(norm, query)
+        cached = self.cache.get_many(self.provider.name, list(unique)) if self.cache is not None else {}
+        with self._stats_lock:
+            self.queries += len(queries)
+            self.deduplicated += len(queries) - len(unique)
+            self.cache_hits += len(cached)
+        return normalized, cached, {norm: query for norm, query in unique.items() if norm not in cached}
+
+    def _finish(self, normalized: List[str], results: Dict[str, SearchResults], fresh: Dict[str, SearchResults]) -> List[SearchResults]:
+        if self.cache is not None:
+            # Failed searches are returned to the caller but never cached
+            storable = {norm: value for norm, value in fresh.items() if not isinstance(value, Exception)}
+            if storable:
+                self.cache.put_many(self.provider.name, storable)
+        return [
+            f"Search failed: {results[norm]}" if isinstance(results[norm], Exception) else results[norm]
+            for norm in normalized
+        ]
+
+    def _count_errors(self, fresh: Dict[str, SearchResults]):
+        with self._stats_lock:
+            self.errors += sum(isinstance(value, Exception) for value in fresh.values())
+
+    def run(self, queries: Sequence[str]) -> List[SearchResults]:
+        """Results for every query, in input order."""
+        normalized, results, pending = self._plan(queries)
+        futures = {norm: self._executor.submit(self._search_one, query) for norm, query in pending.items()}
+        fresh = {}
+        for norm, future in futures.items():
+            try:
+                fresh[norm] = future.result()
+            except Exception as e:
+                fresh[norm] = e
+        self._count_errors(fresh)
+        results.update(fresh)
+        return self._finish(normalized, results, fresh)
+
+    async def arun(self, queries: Sequence[str]) -> List[SearchResults]:
+        """Async run(); provider calls go to the layer's thread pool."""
+        loop = asyncio.get_running_loop()
+        normalized, results, pending = await loop.run_in_executor(None, self._plan, queries)
+        outcomes = await asyncio.gather(
+            *(loop.run_in_executor(self._executor, self._search_one, query) for query in pending.values()),
+            return_exceptions=True
+        )
+        fresh = dict(zip(pending, outcomes))
+        self._count_errors(fresh)
+        results.update(fresh)
+        return await loop.run_in_executor(None, self._finish, normalized, results, fresh)
+
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return {
+                "queries": self.queries,
+                "deduplicated": self.deduplicated,
+                "cache_hits": self.cache_hits,
+                "provider_calls": self.provider_calls,
+                "errors": self.errors
+            }
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        if self.cache is not None:
+            self.cache.close()
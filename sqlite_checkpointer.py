@@ -0,0 +1,370 @@
+import asyncio
+import queue
+import random
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    SerializerProtocol,
+    get_checkpoint_id,
+)
+from langgraph.checkpoint.serde.types import TASKS, ChannelProtocol
+
+from database_access import ConnectionPool
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS checkpoints (
+        thread_id TEXT NOT NULL,
+        checkpoint_ns TEXT NOT NULL DEFAULT '',
+        checkpoint_id TEXT NOT NULL,
+        parent_checkpoint_id TEXT,
+        type TEXT NOT NULL,
+        checkpoint BLOB NOT NULL,
+        metadata_type TEXT NOT NULL,
+        metadata BLOB NOT NULL,
+        PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS checkpoint_writes (
+        thread_id TEXT NOT NULL,
+        checkpoint_ns TEXT NOT NULL DEFAULT '',
+        checkpoint_id TEXT NOT NULL,
+        task_id TEXT NOT NULL,
+        idx INTEGER NOT NULL,
+        channel TEXT NOT NULL,
+        type TEXT NOT NULL,
+        value BLOB NOT NULL,
+        PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS checkpoint_threads (
+        thread_id TEXT PRIMARY KEY,
+        updated_at REAL NOT NULL
+    )
+    """,
+    # Threads checkpointed before checkpoint_threads existed start their retention clock now
+    """
+    INSERT OR IGNORE INTO checkpoint_threads (thread_id, updated_at)
+    SELECT DISTINCT thread_id, strftime('%s', 'now') FROM checkpoints
+    """,
+]
+
+COMPRESS_MIN_BYTES = 4096  # smaller payloads are stored as plain msgpack
+_ZLIB_SUFFIX = "+zlib"
+
+
+class SQLiteCheckpointSaver(BaseCheckpointSaver[str]):
+    def __init__(self, db_path: str = "db_path/checkpoints.sqlite", serde: Optional[SerializerProtocol] = None, pool_size: int = 4):
+        """
+        LangGraph checkpointer that persists graph state in a local SQLite database.
+
+        Checkpoints and pending writes are serialized with the graph's msgpack
+        serializer, zlib-compressed above COMPRESS_MIN_BYTES, and handed to a
+        writer thread. The writer drains everything queued so far and commits it
+        as one transaction, so a step never waits for the disk; a crash loses at
+        most the batch that was being committed. Reads first wait for queued
+        writes, so they always see the latest checkpoint.
+
+        Args:
+            db_path (str): Path to the checkpoint database
+            serde (Optional[SerializerProtocol]): Serializer, defaults to LangGraph's JsonPlusSerializer
+            pool_size (int): Maximum number of pooled read connections
+        """
+        super().__init__(serde=serde)
+        self.db_path = db_path
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.pool = ConnectionPool(db_path, pool_size=pool_size)
+        with self.pool.connection() as conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+
+        self._queue: "queue.Queue[Optional[Tuple[str, List[tuple]]]]" = queue.Queue()
+        self._error: Optional[BaseException] = None
+        self._writer = threading.Thread(target=self._write_loop, name="checkpoint-writer", daemon=True)
+        self._writer.start()
+
+    # Serialization
+
+    def _dump(self, value: Any) -> Tuple[str, bytes]:
+        type_, data = self.serde.dumps_typed(value)
+        if len(data) >= COMPRESS_MIN_BYTES:
+            return type_ + _ZLIB_SUFFIX, zlib.compress(data, 1)
+        return type_, data
+
+    def _load(self, type_: str, data: bytes) -> Any:
+        if type_.endswith(_ZLIB_SUFFIX):
+            return self.serde.loads_typed((type_[:-len(_ZLIB_SUFFIX)], zlib.decompress(data)))
+        return self.serde.loads_typed((type_, data))
+
+    # Group-commit writer
+
+    def _write_loop(self):
+        conn = self.pool.acquire()
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    self._queue.task_done()
+                    return
+                batch = [item]
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        self._queue.put(None)  # stop after committing this batch
+                        break
+                    batch.append(item)
+                try:
+                    for sql, rows in batch:
+                        conn.executemany(sql, rows)
+                    conn.commit()
+                except sqlite3.Error as e:
+                    conn.rollback()
+                    self._error = e
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+        finally:
+            self.pool.release(conn)
+
+    def _enqueue(self, sql: str, rows: List[tuple]):
+        self._raise_writer_error()
+        self._queue.put((sql, rows))
+
+    def _raise_writer_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError(f"Checkpoint write failed: {error}") from error
+
+    def flush(self):
+        """Block until every queued checkpoint and write is committed."""
+        self._queue.join()
+        self._raise_writer_error()
+
+    def close(self):
+        """Commit outstanding writes, stop the writer and close the connections."""
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        self.pool.close()
+        self._raise_writer_error()
+
+    # BaseCheckpointSaver
+
+    def _pending_sends(self, conn: sqlite3.Connection, thread_id: str, checkpoint_ns: str, parent_checkpoint_id: Optional[str]) -> List[Any]:
+        if not parent_checkpoint_id:
+            return []
+        rows = conn.execute(
+            "SELECT type, value FROM checkpoint_writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? AND channel = ? "
+            "ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, parent_checkpoint_id, TASKS)
+        ).fetchall()
+        return [self._load(type_, value) for type_, value in rows]
+
+    def _tuple(self, conn: sqlite3.Connection, row: tuple) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type_, checkpoint, metadata_type, metadata = row
+        writes = conn.execute(
+            "SELECT task_id, channel, type, value FROM checkpoint_writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id)
+        ).fetchall()
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}},
+            checkpoint={
+                **self._load(type_, checkpoint),
+                "pending_sends": self._pending_sends(conn, thread_id, checkpoint_ns, parent_checkpoint_id),
+            },
+            metadata=self._load(metadata_type, metadata),
+            parent_config={
+                "configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_checkpoint_id}
+            } if parent_checkpoint_id else None,
+            pending_writes=[(task_id, channel, self._load(value_type, value)) for task_id, channel, value_type, value in writes],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Return the checkpoint named in config, or the thread's latest one."""
+        self.flush()
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        columns = "thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata"
+        with self.pool.connection() as conn:
+            if checkpoint_id := get_checkpoint_id(config):
+                row = conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id)
+                ).fetchone()
+            else:
+                # Checkpoint IDs are time-ordered UUIDs, so the largest is the latest
+                row = conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns)
+                ).fetchone()
+            return self._tuple(conn, row) if row else None
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        """Yield matching checkpoints, newest first."""
+        self.flush()
+        clauses, params = [], []
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata "
+                f"FROM checkpoints {where} ORDER BY checkpoint_id DESC",
+                params
+            )
+            for row in rows:
+                if filter:
+                    metadata = self._load(row[6], row[7])
+                    if not all(metadata.get(key) == value for key, value in filter.items()):
+                        continue
+                if limit is not None:
+                    if limit <= 0:
+                        break
+                    limit -= 1
+                yield self._tuple(conn, row)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Queue a checkpoint for the writer and return its config immediately."""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        stored = checkpoint.copy()
+        stored.pop("pending_sends", None)  # rebuilt from the parent's TASKS writes on read
+        type_, data = self._dump(stored)
+        metadata_type, metadata_data = self._dump(metadata)
+        self._enqueue(
+            "INSERT OR REPLACE INTO checkpoints "
+            "(thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+              type_, data, metadata_type, metadata_data)]
+        )
+        self._enqueue(
+            "INSERT OR REPLACE INTO checkpoint_threads (thread_id, updated_at) VALUES (?, ?)",
+            [(thread_id, time.time())]
+        )
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str) -> None:
+        """Queue the writes a task produced against a checkpoint."""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        # Special channels (errors, interrupts) replace earlier values; regular writes are kept once
+        verb = "INSERT OR REPLACE" if all(channel in WRITES_IDX_MAP for channel, _ in writes) else "INSERT OR IGNORE"
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, data = self._dump(value)
+            rows.append((thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx), channel, type_, data))
+        self._enqueue(
+            f"{verb} INTO checkpoint_writes "
+            "(thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+
+    def delete_thread(self, thread_id: str):
+        """Drop every checkpoint and write of a thread."""
+        self._enqueue("DELETE FROM checkpoints WHERE thread_id = ?", [(thread_id,)])
+        self._enqueue("DELETE FROM checkpoint_writes WHERE thread_id = ?", [(thread_id,)])
+        self._enqueue("DELETE FROM checkpoint_threads WHERE thread_id = ?", [(thread_id,)])
+        self.flush()
+
+    def prune(self, max_age: float) -> int:
+        """
+        Drop every thread that has not been checkpointed for max_age seconds.
+
+        Returns:
+            int: Number of threads dropped
+        """
+        self.flush()
+        with self.pool.connection() as conn:
+            stale = conn.execute(
+                "SELECT thread_id FROM checkpoint_threads WHERE updated_at < ?", (time.time() - max_age,)
+            ).fetchall()
+        if stale:
+            for table in ("checkpoints", "checkpoint_writes", "checkpoint_threads"):
+                self._enqueue(f"DELETE FROM {table} WHERE thread_id = ?", stale)
+            self.flush()
+        return len(stale)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        # Serializing and queueing is cheap; the disk work happens on the writer thread
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str) -> None:
+        self.put_writes(config, writes, task_id)
+
+    def get_next_version(self, current: Optional[str], channel: ChannelProtocol) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
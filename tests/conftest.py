@@ -0,0 +1,29 @@
+import pytest
+
+import llm_clients
+from fake_openai_server import start_fake_server
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    """Start fake_openai_server and point the OpenAI client at it; call with the share of 429 replies."""
+    servers = []
+
+    def start(rate_limit_ratio: float = 0.0) -> str:
+        server, base_url = start_fake_server(0.0, port=0, rate_limit_ratio=rate_limit_ratio)
+        servers.append(server)
+        monkeypatch.setenv("OPENAI_BASE_URL", base_url)
+        monkeypatch.setenv("OPENAI_API_KEY", "fake")
+        return base_url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def chat_model():
+    """Swap the shared chat model for the test; the default is rebuilt afterwards."""
+    yield llm_clients.set_chat_model
+    llm_clients.set_chat_model(None)
@@ -0,0 +1,143 @@
+import asyncio
+import json
+import time
+
+import pytest
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.messages import HumanMessage
+from langchain_openai import ChatOpenAI
+
+import batch_runner
+from batch_runner import BatchRunner, is_rate_limit_error, retry_after
+from rate_limits import LLMRateLimiter
+
+
+class FakeRateLimitError(Exception):
+    status_code = 429
+
+
+def limited_model(base_url: str, limiter: LLMRateLimiter) -> ChatOpenAI:
+    return ChatOpenAI(model="fake", base_url=base_url, max_retries=0, rate_limiter=limiter, callbacks=[limiter])
+
+
+def test_failed_call_refunds_its_token_reservation(fake_openai):
+    limiter = LLMRateLimiter(requests_per_minute=600, tokens_per_minute=2000, estimated_tokens=1000)
+    model = limited_model(fake_openai(rate_limit_ratio=1.0), limiter)
+
+    with pytest.raises(Exception) as excinfo:
+        model.invoke([HumanMessage(content="Summarize MOLY00000001")])
+
+    assert is_rate_limit_error(excinfo.value)
+    assert retry_after(excinfo.value) == 1.0
+    assert limiter.tokens.tokens == pytest.approx(2000, abs=5)
+    assert limiter.requests.tokens == pytest.approx(599, abs=1)
+
+
+def test_completed_call_is_charged_its_reported_usage(fake_openai):
+    limiter = LLMRateLimiter(requests_per_minute=600, tokens_per_minute=2000, estimated_tokens=1000)
+    model = limited_model(fake_openai(), limiter)
+    started = time.monotonic()
+    response = model.invoke([HumanMessage(content="Summarize MOLY00000001 " * 50)])
+    refilled = (time.monotonic() - started) * limiter.tokens.rate
+
+    used = response.usage_metadata["total_tokens"]
+    assert 0 < used < 1000
+    # Charged the reported usage, not the 1000 token estimate
+    assert 2000 - used <= limiter.tokens.tokens <= 2000 - used + refilled
+
+
+def test_refused_token_reservation_returns_the_request_slot():
+    limiter = LLMRateLimiter(requests_per_minute=600, tokens_per_minute=1000, estimated_tokens=1000)
+    assert limiter.acquire(blocking=False)
+    requests_left = limiter.requests.tokens
+
+    assert not limiter.acquire(blocking=False)
+    assert limiter.requests.tokens == pytest.approx(requests_left, abs=1)
+
+
+def test_pause_holds_back_every_caller():
+    limiter = LLMRateLimiter(requests_per_minute=600)
+    limiter.pause(60)
+    assert not limiter.acquire(blocking=False)
+
+
+@pytest.fixture
+def analysis(monkeypatch):
+    """Replace the graph run with a scripted sequence of outcomes."""
+    outcomes = []
+    calls = []
+
+    async def run_analysis(text, thread_id=None):
+        calls.append(text)
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+    async def drop_thread(thread_id):
+        pass
+
+    monkeypatch.setattr(batch_runner, "run_analysis", run_analysis)
+    monkeypatch.setattr(batch_runner, "drop_thread", drop_thread)
+    return outcomes, calls
+
+
+def test_rate_limited_run_backs_off_and_retries(analysis):
+    outcomes, calls = analysis
+    outcomes += [FakeRateLimitError("429"), {"drafts": ["draft", "final"], "tokens_used": 42}]
+    runner = BatchRunner(backoff_base=0.01, backoff_max=0.05)
+
+    record = asyncio.run(runner.run_one(1, json.dumps({"request_id": "r1", "request": "Analyse MOLY1"})))
+
+    assert record["status"] == "completed"
+    assert record["attempts"] == 2
+    assert record["result"] == "final"
+    assert record["revisions"] == 1
+    assert len(calls) == 2
+    assert runner.limiter.requests.paused_until > 0
+
+
+def test_rate_limited_run_gives_up_after_max_retries(analysis):
+    outcomes, _ = analysis
+    outcomes += [FakeRateLimitError("429")] * 3
+    runner = BatchRunner(max_retries=2, backoff_base=0.01, backoff_max=0.01)
+
+    record = asyncio.run(runner.run_one(7, json.dumps({"id": "r7", "request": "Analyse MOLY1"})))
+
+    assert record["status"] == "failed"
+    assert record["request_id"] == "r7"
+    assert record["attempts"] == 3
+
+
+def test_other_errors_are_not_retried(analysis):
+    outcomes, calls = analysis
+    outcomes += [ValueError("boom")]
+    record = asyncio.run(BatchRunner().run_one(1, json.dumps("Analyse MOLY1")))
+
+    assert record["status"] == "failed"
+    assert record["error"] == "ValueError: boom"
+    assert len(calls) == 1
+
+
+def test_run_writes_one_line_per_request(tmp_path, analysis, chat_model):
+    chat_model(FakeListChatModel(responses=["unused"]))
+    outcomes, _ = analysis
+    outcomes += [{"drafts": ["d"], "tokens_used": 5}] * 2
+    input_path = tmp_path / "requests.jsonl"
+    input_path.write_text("\n".join([
+        json.dumps({"request_id": "a", "request": "Analyse MOLY1"}),
+        json.dumps({"request_id": "b", "title": "no request field"}),
+        "not json",
+        "",
+        json.dumps({"request_id": "c", "body": "Analyse MOLY2"}),
+    ]) + "\n")
+    output_path = tmp_path / "results.jsonl"
+
+    stats = asyncio.run(BatchRunner(concurrency=2).run(str(input_path), str(output_path)))
+
+    records = {record["request_id"]: record for record in map(json.loads, output_path.read_text().splitlines())}
+    assert stats["requests"] == 4 and stats["completed"] == 2 and stats["failed"] == 2
+    assert stats["tokens_used"] == 10
+    assert records["a"]["status"] == records["c"]["status"] == "completed"
+    assert records["b"]["status"] == "failed" and records["b"]["line"] == 2
+    assert records["3"]["status"] == "failed" and records["3"]["error"].startswith("invalid request")
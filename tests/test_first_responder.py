@@ -0,0 +1,108 @@
+import asyncio
+import json
+import random
+
+import pytest
+from langchain_core.language_models import FakeListChatModel
+
+import chains
+import llm_clients
+from cr_chunking import approx_token_count, chunk_crs, render_cr
+from llm_cache import SQLiteLLMCache
+from note_compaction import compact_notes, expand_notes, legend_prompt, referenced_lines
+
+
+def make_crs(count: int, seed: int = 0):
+    """CR records sharing step sequences, each with one unique line"""
+    rng = random.Random(seed)
+    shared = [f"Step {i}: reproduce on band {i % 7} with " + "x" * rng.randint(8, 60) for i in range(40)]
+    return [
+        {
+            "cr_id": f"MOLY{i:08d}",
+            "notes": rng.sample(shared, rng.randint(1, 15)) + [f"Unique observation {i} " + "y" * rng.randint(0, 80)],
+            "status": "completed"
+        }
+        for i in range(count)
+    ]
+
+
+def reply_for(chunk):
+    return json.dumps({"summaries": [{"cr_id": cr["cr_id"], "summary": f"Analysis of {cr['cr_id']}"} for cr in chunk]})
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_no_chunk_exceeds_budget_including_legend(seed):
+    crs = make_crs(300, seed)
+    compacted = compact_notes(crs, approx_token_count, max_tokens=chains.FIRST_RESPONDER_CHUNK_TOKENS)
+
+    assert len(compacted.chunks) > 1
+    assert [cr for chunk in compacted.chunks for cr in chunk] == compacted.crs
+    for chunk in compacted.chunks:
+        tokens = sum(approx_token_count(render_cr(cr)) for cr in chunk)
+        tokens += approx_token_count(legend_prompt(compacted.legend, referenced_lines(chunk)))
+        assert tokens <= chains.FIRST_RESPONDER_CHUNK_TOKENS
+
+
+def test_oversized_cr_gets_a_chunk_of_its_own():
+    crs = make_crs(3)
+    crs[1]["notes"] = ["z" * 400]
+    chunks = chunk_crs(crs, max_tokens=50)
+    assert chunks == [[crs[0]], [crs[1]], [crs[2]]]
+
+
+def test_compaction_round_trips_literal_reference_lines():
+    crs = make_crs(20)
+    crs[0]["notes"] += ["#3", "#2-5", "\\escaped already"]
+    compacted = compact_notes(crs)
+
+    assert compacted.saved_tokens > 0
+    for original, cr in zip(crs, compacted.crs):
+        assert expand_notes(cr["notes"], compacted.legend) == original["notes"]
+
+
+def test_only_the_failed_chunk_is_retried(monkeypatch, chat_model):
+    crs = make_crs(30)
+    monkeypatch.setattr(chains, "FIRST_RESPONDER_CHUNK_TOKENS", 1000)
+    monkeypatch.setattr(chains, "MAX_CONCURRENT_CHUNKS", 1)
+    chunks = chunk_crs(crs, 1000, chains.get_token_counter(chains.LLM_MODEL))
+    assert len(chunks) > 1
+    replies = ["not json", reply_for(chunks[0])] + [reply_for(chunk) for chunk in chunks[1:]]
+    model = FakeListChatModel(responses=replies + ["never sent"])
+    chat_model(model)
+
+    summaries = asyncio.run(chains.draft_summaries(crs))
+
+    assert [summary.cr_id for summary in summaries] == [cr["cr_id"] for cr in crs]
+    assert all(summary.summary != chains.STRUCTURED_RESPONSE_ERROR for summary in summaries)
+    # One retry in total: the other chunks were sent once
+    assert model.i == len(chunks) + 1
+
+
+def test_chunk_that_keeps_failing_does_not_fail_the_others(monkeypatch, chat_model):
+    crs = make_crs(30)
+    monkeypatch.setattr(chains, "FIRST_RESPONDER_CHUNK_TOKENS", 1000)
+    monkeypatch.setattr(chains, "MAX_CONCURRENT_CHUNKS", 1)
+    monkeypatch.setattr(chains, "MAX_CHUNK_RETRIES", 1)
+    chunks = chunk_crs(crs, 1000, chains.get_token_counter(chains.LLM_MODEL))
+    chat_model(FakeListChatModel(responses=["not json", "still not json"] + [reply_for(chunk) for chunk in chunks[1:]]))
+
+    summaries = asyncio.run(chains.draft_summaries(crs))
+
+    failed = {summary.cr_id for summary in summaries if summary.summary == chains.STRUCTURED_RESPONSE_ERROR}
+    assert failed == {cr["cr_id"] for cr in chunks[0]}
+    assert len(summaries) == len(crs)
+
+
+def test_compacted_chunks_summarize_every_cr_via_fake_server(tmp_path, monkeypatch, fake_openai, chat_model):
+    fake_openai()
+    monkeypatch.setattr(llm_clients, "_llm_cache", SQLiteLLMCache(str(tmp_path / "llm_cache.sqlite")))
+    chat_model(None)
+    crs = make_crs(200)
+    compacted = compact_notes(crs, max_tokens=chains.FIRST_RESPONDER_CHUNK_TOKENS)
+    assert len(compacted.chunks) > 1
+    usage = {"total_tokens": 0}
+
+    summaries = asyncio.run(chains.draft_summaries(compacted.crs, usage, compacted.legend))
+
+    assert [summary.cr_id for summary in summaries] == [cr["cr_id"] for cr in crs]
+    assert usage["total_tokens"] > 0
@@ -0,0 +1,81 @@
+import asyncio
+import sqlite3
+
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.outputs import Generation
+
+import llm_clients
+from llm_cache import CACHE_HIT_KEY, SQLiteLLMCache
+
+
+def test_repeated_call_is_a_cache_hit(tmp_path):
+    cache = SQLiteLLMCache(str(tmp_path / "llm_cache.sqlite"))
+    model = FakeListChatModel(responses=["first", "second"], cache=cache)
+
+    assert model.invoke([HumanMessage(content="Summarize  MOLY97243503")]).content == "first"
+    # Whitespace differences normalize to the same key
+    assert model.invoke([HumanMessage(content="Summarize MOLY97243503 ")]).content == "first"
+    assert cache.stats() == {"hits": 1, "misses": 1, "evictions": 0}
+
+
+def test_cache_hit_is_marked_in_generation_info(tmp_path):
+    cache = SQLiteLLMCache(str(tmp_path / "llm_cache.sqlite"))
+    model = FakeListChatModel(responses=["first"], cache=cache)
+    messages = [HumanMessage(content="Summarize MOLY97243503")]
+
+    miss = model.generate([messages]).generations[0][0]
+    hit = model.generate([messages]).generations[0][0]
+    assert not (miss.generation_info or {}).get(CACHE_HIT_KEY)
+    assert hit.generation_info[CACHE_HIT_KEY] is True
+
+
+def test_different_messages_or_params_miss(tmp_path):
+    cache = SQLiteLLMCache(str(tmp_path / "llm_cache.sqlite"))
+    model = FakeListChatModel(responses=["first", "second"], cache=cache)
+    other_model = FakeListChatModel(responses=["other"], cache=cache)
+
+    model.invoke([HumanMessage(content="Summarize MOLY97243503")])
+    assert model.invoke([SystemMessage(content="Be brief"), HumanMessage(content="Summarize MOLY97243503")]).content == "second"
+    assert other_model.invoke([HumanMessage(content="Summarize MOLY97243503")]).content == "other"
+    assert cache.stats()["hits"] == 0
+
+
+def test_expired_entry_is_a_miss(tmp_path):
+    db_path = str(tmp_path / "llm_cache.sqlite")
+    cache = SQLiteLLMCache(db_path, ttl_seconds=60)
+    cache.update("prompt", "llm", [Generation(text="stale")])
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("UPDATE llm_cache SET created_at = created_at - 120")
+
+    assert cache.lookup("prompt", "llm") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    cache = SQLiteLLMCache(str(tmp_path / "llm_cache.sqlite"), max_entries=2)
+    cache.update("one", "llm", [Generation(text="1")])
+    cache.update("two", "llm", [Generation(text="2")])
+    assert cache.lookup("one", "llm")[0].text == "1"
+    cache.update("three", "llm", [Generation(text="3")])
+
+    assert cache.lookup("two", "llm") is None
+    assert cache.lookup("one", "llm")[0].text == "1"
+    assert cache.lookup("three", "llm")[0].text == "3"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_shared_model_answers_repeated_request_from_cache(tmp_path, monkeypatch, fake_openai, chat_model):
+    fake_openai()
+    cache = SQLiteLLMCache(str(tmp_path / "llm_cache.sqlite"))
+    monkeypatch.setattr(llm_clients, "_llm_cache", cache)
+    chat_model(None)
+    model = llm_clients.get_chat_model()
+    messages = [HumanMessage(content="Please improve the analysis of MOLY00000001")]
+
+    async def call_twice():
+        return await model.ainvoke(messages), await model.ainvoke(messages)
+
+    first, second = asyncio.run(call_twice())
+    assert first.content == second.content
+    assert cache.stats() == {"hits": 1, "misses": 1, "evictions": 0}
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import sqlite3
+import threading
+
+import pytest
+
+from search_layer import LocalSearchProvider, SearchCache, SearchLayer, normalize_query
+
+
+class CountingProvider:
+    name = "counting"
+
+    def __init__(self, fail_once: tuple = ()):
+        """Echoes the query; the first search for each query in fail_once raises."""
+        self.calls = []
+        self.fail_once = set(fail_once)
+        self._lock = threading.Lock()
+
+    def search(self, query):
+        with self._lock:
+            self.calls.append(query)
+            if query in self.fail_once:
+                self.fail_once.remove(query)
+                raise RuntimeError("provider unavailable")
+        return [{"url": f"test://{query}", "content": query}]
+
+
+@pytest.fixture
+def make_layer(tmp_path):
+    layers = []
+
+    def make(provider, ttl_seconds=3600):
+        layer = SearchLayer(provider, cache=SearchCache(str(tmp_path / "search_cache.sqlite"), ttl_seconds=ttl_seconds))
+        layers.append(layer)
+        return layer
+
+    yield make
+    for layer in layers:
+        layer.close()
+
+
+def test_normalize_query():
+    assert normalize_query("  What   is LTE? ") == normalize_query("what is lte") == "what is lte"
+    assert normalize_query("ＬＴＥ band") == "lte band"
+
+
+def test_equivalent_queries_are_searched_once(make_layer):
+    provider = CountingProvider()
+    layer = make_layer(provider)
+
+    results = layer.run(["What is LTE?", "what is  lte", "VoLTE drops"])
+
+    assert provider.calls == ["What is LTE?", "VoLTE drops"]
+    assert results[0] == results[1]
+    assert layer.stats()["deduplicated"] == 1
+
+
+def test_cached_results_are_reused_until_they_expire(tmp_path, make_layer):
+    provider = CountingProvider()
+    layer = make_layer(provider)
+    first = layer.run(["VoLTE drops"])
+
+    assert layer.run(["volte drops."]) == first
+    assert len(provider.calls) == 1
+    assert layer.stats()["cache_hits"] == 1
+
+    with sqlite3.connect(str(tmp_path / "search_cache.sqlite")) as conn:
+        conn.execute("UPDATE search_cache SET created_at = created_at - 7200")
+    layer.run(["VoLTE drops"])
+    assert len(provider.calls) == 2
+
+
+def test_failed_search_is_never_cached(make_layer):
+    provider = CountingProvider(fail_once=("VoLTE drops",))
+    layer = make_layer(provider)
+
+    failed, ok = layer.run(["VoLTE drops", "What is LTE"])
+    assert failed == "Search failed: provider unavailable"
+    assert ok == [{"url": "test://What is LTE", "content": "What is LTE"}]
+    assert layer.stats()["errors"] == 1
+
+    # Only the failed query goes back to the provider, and its result is cached now
+    assert layer.run(["VoLTE drops", "What is LTE"])[0] != failed
+    assert provider.calls[2:] == ["VoLTE drops"]
+    layer.run(["VoLTE drops"])
+    assert len(provider.calls) == 3
+
+
+def test_async_run_dedupes_and_never_caches_failures(make_layer):
+    provider = CountingProvider(fail_once=("VoLTE drops",))
+    layer = make_layer(provider)
+
+    results = asyncio.run(layer.arun(["VoLTE drops", "volte DROPS"]))
+    assert results == ["Search failed: provider unavailable"] * 2
+    assert len(provider.calls) == 1
+
+    results = asyncio.run(layer.arun(["VoLTE drops"]))
+    assert results == [[{"url": "test://VoLTE drops", "content": "VoLTE drops"}]]
+    assert asyncio.run(layer.arun(["VoLTE drops"])) == results
+    assert len(provider.calls) == 2
+
+
+def test_local_provider_ranks_crs_by_matching_words(tmp_path):
+    json_path = tmp_path / "crs.json"
+    json_path.write_text(json.dumps([
+        {"CR_ID": "MOLY1", "notes": ["VoLTE call drops after handover"], "description": ""},
+        {"CR_ID": "MOLY2", "notes": ["Wi-Fi scan slow"], "description": "handover"},
+    ]))
+    provider = LocalSearchProvider(str(json_path))
+
+    assert [result["url"] for result in provider.search("VoLTE handover")] == ["local://cr/MOLY1", "local://cr/MOLY2"]
+    assert provider.search("bluetooth") == []
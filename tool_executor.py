@@ -1,22 +1,38 @@
-from langchain_community.tools.tavily_search import TavilySearchResults
-from langchain_community.utilities.tavily_search import TavilySearchAPIWrapper
+import os
+
 from langchain_core.tools import StructuredTool
 from langgraph.prebuilt import ToolNode
 
 from cool_classes import AnswerQuestion, ReviseAnswer
+from metrics import register_cache
+from search_layer import SearchCache, SearchLayer, get_search_provider
 
-search = TavilySearchAPIWrapper()
-tavily_tool = TavilySearchResults(api_wrapper=search, max_results=5)
+# SEARCH_PROVIDER=local swaps Tavily for an offline stand-in
+search_layer = SearchLayer(
+    get_search_provider(),
+    cache=SearchCache(
+        os.getenv("SEARCH_CACHE_PATH", "db_path/search_cache.sqlite"),
+        ttl_seconds=float(os.getenv("SEARCH_CACHE_TTL", str(24 * 3600)))
+    ),
+    max_concurrency=int(os.getenv("SEARCH_MAX_CONCURRENCY", "5")),
+    requests_per_minute=float(os.getenv("SEARCH_RPM", "0")) or None
+)
+register_cache("search", search_layer.stats)
 
 
 def run_queries(search_queries: list[str], **kwargs):
     """Run the generated queries."""
-    return tavily_tool.batch([{"query": query} for query in search_queries])
+    return search_layer.run(search_queries)
+
+
+async def arun_queries(search_queries: list[str], **kwargs):
+    """Run the generated queries."""
+    return await search_layer.arun(search_queries)
 
 
 tool_node = ToolNode(
     [
-        StructuredTool.from_function(run_queries, name=AnswerQuestion.__name__),
-        StructuredTool.from_function(run_queries, name=ReviseAnswer.__name__),
+        StructuredTool.from_function(run_queries, coroutine=arun_queries, name=AnswerQuestion.__name__),
+        StructuredTool.from_function(run_queries, coroutine=arun_queries, name=ReviseAnswer.__name__),
     ]
 )
@@ -1,32 +1,62 @@
 import json
+import os
 import time
 import logging
 import subprocess
 from pathlib import Path
-from typing import Set, Optional
-import fcntl
+from collections import deque
+from typing import Deque, Dict, Sequence, Set, Optional, Tuple
+import asyncio
+from async_tool_engine import AsyncToolEngine, DEFAULT_TOOL_COMMAND, build_command
 from database_access import DatabaseAccess
+import metrics
+from metrics import IN_FLIGHT, QUEUE_DEPTH, TOOL_RUNS, TOOL_SECONDS
+from run_scheduler import RunScheduler
+from run_status_store import RunStatusStore
+from work_leases import HashRing, LeaseManager
 import threading
-from concurrent.futures import ThreadPoolExecutor
-from queue import Queue
 
 class ToolRunner:
     def __init__(
         self,
-        json_path: str = "m_ids_lina_run.json",
-        poll_interval: int = 3600,  # 1 hour in seconds
+        json_path: str = "m_ids_lina_run.json",  # legacy status file, imported once
+        status_db_path: str = "db_path/run_status.sqlite",
+        poll_interval: int = 60,  # seconds; idle polls are cheap (data_version check)
         max_retries: int = 3,
         retry_delay: int = 5,  # seconds between retries
+        failure_retry_base: float = 300.0,  # seconds before a failed MID is rerun, doubled per failure
+        failure_retry_max: float = 6 * 3600.0,  # upper bound on the failed-MID rerun delay
+        change_batch_size: int = 10000,  # issue changes read per poll
         max_parallel_runs: int = 10,  # maximum parallel tool runs
-        log_file: str = "tool_runner.log"
+        max_queue_size: int = 1000,  # maximum MIDs waiting for a worker
+        log_file: str = "tool_runner.log",
+        state_path: str = "tool_runner_state.json",
+        tool_command: Sequence[str] = DEFAULT_TOOL_COMMAND,  # argv template, "{mid}" is substituted
+        run_timeout: float = 1800.0,  # seconds before a tool run is killed
+        tool_log_dir: str = "tool_logs",  # per-MID output logs (async engine)
+        max_async_runs: int = 200,  # maximum concurrent tool runs on the async engine
+        issues_db_path: str = "db_path/issues_database.sqlite",
+        runner_id: Optional[str] = None,  # defaults to "<hostname>:<pid>"
+        peers: Optional[Sequence[str]] = None,  # runner IDs sharing the work, enables hash sharding
+        lease_seconds: float = 600.0,  # lease lifetime, renewed on every poll
+        steal_after: Optional[float] = None,  # seconds before other runners' MIDs are picked up, >= lease_seconds
+        metrics_port: Optional[int] = None  # serve Prometheus metrics on 127.0.0.1:<port>/metrics
     ):
         self.json_path = Path(json_path)
         self.poll_interval = poll_interval
         self.max_retries = max_retries
         self.retry_delay = retry_delay
         self.max_parallel_runs = max_parallel_runs
-        self.db = DatabaseAccess()
-        self.active_runs = Queue()  # Track currently running MIDs
+        self.tool_command = tuple(tool_command)
+        self.run_timeout = run_timeout
+        self.change_batch_size = change_batch_size
+        self.db = DatabaseAccess(issues_db_path)
+        self.status_store = RunStatusStore(
+            status_db_path,
+            pool_size=max_parallel_runs,
+            retry_base=failure_retry_base,
+            retry_max=failure_retry_max
+        )
         
         # Setup logging
         logging.basicConfig(
@@ -36,114 +66,439 @@ class ToolRunner:
         )
         self.logger = logging.getLogger(__name__)
 
-    def read_json_with_lock(self) -> Optional[dict]:
-        """Try to read JSON file with a read lock."""
+        if not self.db.has_change_log():
+            message = (
+                f"{issues_db_path} has no issue change log; install it once with "
+                f"`python tool_runner.py --install-change-log --issues-db {issues_db_path}`"
+            )
+            self.logger.error(message)
+            raise RuntimeError(message)
+        self.state_path = Path(state_path)
+        self.last_seq = self._load_scan_state()  # Persisted mark: every change up to it has been handled
+        self._scan_seq = self.last_seq  # In-memory mark: every change up to it has been scheduled
+        self._pending_scans: Deque[Tuple[int, Set[str]]] = deque()  # (seq, MIDs still to finish) per scan
+        # Newest content hash per selected MID not yet handed to a run; stored with its result
+        self._hashes: Dict[str, Optional[str]] = {}
+        self._scan_lock = threading.Lock()
+        self._last_data_version: Optional[int] = None
+        self.scheduler = RunScheduler(
+            self._run_and_mark_done,
+            max_workers=max_parallel_runs,
+            max_queue_size=max_queue_size,
+            logger=self.logger
+        )
+        self.engine = AsyncToolEngine(
+            command=self.tool_command,
+            max_concurrency=max_async_runs,
+            timeout=run_timeout,
+            max_retries=max_retries,
+            backoff_base=retry_delay,
+            log_dir=tool_log_dir,
+            status_store=self.status_store,
+            logger=self.logger
+        )
+        self.leases = LeaseManager(status_db_path, owner=runner_id, lease_seconds=lease_seconds)
+        self.ring = HashRing(peers) if peers else None
+        # Stealing earlier than a lease can expire would only find the owner's lease still held
+        if steal_after is not None and steal_after < lease_seconds:
+            self.logger.warning(f"steal_after={steal_after}s is below lease_seconds, using {lease_seconds}s")
+        self.steal_after = lease_seconds if steal_after is None else max(steal_after, lease_seconds)
+        self._deferred: Dict[str, float] = {}  # other runners' MIDs -> first seen (monotonic)
+        self._lease_waits: Dict[str, float] = {}  # MIDs leased by another runner -> when that lease expires (epoch)
+        self._async_running = 0
+        self._import_legacy_status()
+        metrics.registry.register_collector(self._collect_metrics)
+        if metrics_port is not None:
+            metrics.start_http_server(metrics_port)
+
+    def close(self, wait: bool = True):
+        """
+        Stop the workers and unregister the metrics collector.
+
+        Args:
+            wait (bool): Let queued and running MIDs finish, then close the databases;
+                if False, running MIDs are left to finish on their own and the databases stay open
+        """
+        metrics.registry.unregister_collector(self._collect_metrics)
+        self.scheduler.stop(wait=wait)
+        if wait:
+            self.db.close()
+            self.status_store.close()
+            self.leases.close()
+
+    def _collect_metrics(self):
+        stats = self.scheduler.stats()
+        QUEUE_DEPTH.set(stats["queue_depth"])
+        IN_FLIGHT.set(stats["in_flight"], engine="sync")
+        IN_FLIGHT.set(self._async_running, engine="async")
+
+    def _import_legacy_status(self):
+        """Import the legacy JSON status file into an empty status store."""
+        if not self.json_path.exists() or not self.status_store.is_empty():
+            return
         try:
-            if not self.json_path.exists():
-                return {}
-                
-            with open(self.json_path, 'r') as file:
-                # Acquire read lock
-                fcntl.flock(file.fileno(), fcntl.LOCK_SH | fcntl.LOCK_NB)
-                try:
-                    data = json.load(file)
-                    return data
-                finally:
-                    # Release lock
-                    fcntl.flock(file.fileno(), fcntl.LOCK_UN)
-        except BlockingIOError:
-            self.logger.warning("File is locked for writing")
-            return None
-        except json.JSONDecodeError as e:
-            self.logger.error(f"JSON parsing error: {e}")
-            return None
+            imported = self.status_store.import_json(str(self.json_path))
+            self.logger.info(f"Imported {imported} run records from {self.json_path}")
         except Exception as e:
-            self.logger.error(f"Unexpected error reading JSON: {e}")
-            return None
+            self.logger.error(f"Error importing legacy status file {self.json_path}: {e}")
+
+    def _load_scan_state(self) -> int:
+        """Load the persisted change seq high-water mark, 0 if no scan has completed yet."""
+        try:
+            with open(self.state_path, 'r') as file:
+                # Older state files hold an issues rowid instead; the seeded change log replaces it
+                return int(json.load(file).get("last_seq", 0))
+        except FileNotFoundError:
+            return 0
+        except (ValueError, TypeError, AttributeError) as e:
+            self.logger.error(f"Invalid scan state file, rescanning all issue changes: {e}")
+            return 0
+
+    def _save_scan_state(self):
+        """Persist the change seq high-water mark atomically."""
+        tmp_path = self.state_path.with_suffix(self.state_path.suffix + ".tmp")
+        with open(tmp_path, 'w') as file:
+            json.dump({"last_seq": self.last_seq}, file)
+        os.replace(tmp_path, self.state_path)
+
+    def commit_scan(self):
+        """Advance the persisted high-water mark past every scan whose MIDs have all finished."""
+        with self._scan_lock:
+            new_seq = self.last_seq
+            while self._pending_scans and not self._pending_scans[0][1]:
+                new_seq = self._pending_scans.popleft()[0]
+            if new_seq > self.last_seq:
+                self.last_seq = new_seq
+                self._save_scan_state()
+
+    def _mark_done(self, mid: str, covered_seq: int):
+        """Finish an MID in the scans its run covered; later scans wait for the rerun with the newer hash."""
+        with self._scan_lock:
+            for seq, remaining in self._pending_scans:
+                if seq > covered_seq:
+                    break
+                remaining.discard(mid)
 
     def get_unique_mids(self) -> Set[str]:
-        """Get set of MIDs that don't exist in the JSON file."""
-        all_mids = set(self.db.get_all_mids())
+        """
+        Get set of MIDs whose issue data changed since their last run, plus failed MIDs due for a retry.
+
+        MIDs that changed again while they were running are included too, so
+        they are rerun on the newer content once the running one finishes.
+        """
+        unique_mids = self._changed_mids()
+        with self._scan_lock:
+            unique_mids.update(mid for mid in self._hashes if mid not in self._lease_waits)
+        try:
+            due = self.status_store.due_failures()
+            if due:
+                hashes = self.db.get_issue_hashes(due)
+                with self._scan_lock:
+                    for mid in due:
+                        self._hashes[mid] = hashes.get(mid)
+                unique_mids.update(due)
+        except Exception as e:
+            self.logger.error(f"Error reading failed runs: {e}")
+        return unique_mids
+
+    def _changed_mids(self) -> Set[str]:
+        """Read the change log past the in-memory mark and keep the MIDs whose content hash changed."""
+        data_version = self.db.get_data_version()
+        if data_version == self._last_data_version:
+            # Nobody has committed to the database since the last poll
+            return set()
+
+        changes = self.db.get_changes_since(self._scan_seq, limit=self.change_batch_size)
+        if not changes:
+            self._last_data_version = data_version
+            return set()
         
         for attempt in range(self.max_retries):
-            json_data = self.read_json_with_lock()
-            if json_data is not None:
-                # Find MIDs that don't exist in the JSON file
-                existing_mids = set(json_data.keys())
-                unique_mids = all_mids - existing_mids
-                return unique_mids
+            try:
+                hashes = self.db.get_issue_hashes(mid for _, mid in changes)
+                changed_mids = self.status_store.filter_changed(hashes)
+                with self._scan_lock:
+                    for mid in changed_mids:
+                        self._hashes[mid] = hashes[mid]
+                    self._scan_seq = changes[-1][0]
+                    self._pending_scans.append((self._scan_seq, set(changed_mids)))
+                if len(changes) < self.change_batch_size:
+                    # A full batch may have more behind it; read on at the next poll
+                    self._last_data_version = data_version
+                return changed_mids
+            except Exception as e:
+                self.logger.error(f"Error reading run status: {e}")
             
             self.logger.warning(f"Retry attempt {attempt + 1} of {self.max_retries}")
             time.sleep(self.retry_delay)
         
         return set()  # Return empty set if all retries failed
 
-    def run_tool(self, mid: str):
+    def select_for_this_runner(self, unique_mids: Set[str]) -> Set[str]:
+        """
+        Keep the MIDs this runner's hash shard owns.
+
+        MIDs owned by other runners are held back and picked up after steal_after
+        seconds, so the shard of a dead runner still gets processed; leases keep
+        such late pick-ups from running an MID twice.
+        """
+        if self.ring is None:
+            return set(unique_mids)
+        now = time.monotonic()
+        selected = set()
+        for mid in unique_mids:
+            if self.ring.owner_of(mid) == self.leases.owner:
+                selected.add(mid)
+            else:
+                self._deferred.setdefault(mid, now)
+        for mid, first_seen in list(self._deferred.items()):
+            if now - first_seen >= self.steal_after:
+                selected.add(mid)
+                del self._deferred[mid]
+        return selected
+
+    def _claim(self, mid: str, content_hash: Optional[str] = None) -> str:
+        """
+        Take the lease for an MID.
+
+        Returns:
+            str: "claimed" if this runner should run it, "leased" if another runner
+                holds the lease (the MID stays pending until that lease ends) or
+                "current" if its result is already up to date
+        """
+        if not self.leases.claim(mid):
+            expires_at = self.leases.expiry(mid) or time.time()
+            with self._scan_lock:
+                # A newer hash from a later scan wins over the one this attempt took
+                self._hashes.setdefault(mid, content_hash)
+                self._lease_waits[mid] = expires_at
+            self.logger.info(f"MID {mid} is leased by another runner, retrying once the lease ends")
+            return "leased"
+        if not self.status_store.needs_run(mid, content_hash):
+            self.leases.release(mid)
+            self.logger.info(f"MID {mid} was already run on this content by another runner, skipping")
+            return "current"
+        return "claimed"
+
+    def _expired_lease_waits(self) -> Set[str]:
+        """MIDs held back for another runner's lease that has since ended or expired."""
+        now = time.time()
+        with self._scan_lock:
+            return {mid for mid, expires_at in self._lease_waits.items() if expires_at <= now}
+
+    def _take_hash(self, mid: str) -> Tuple[Optional[str], int]:
+        """Hand an MID's newest content hash to its run, with the seq of the last scan that run covers."""
+        with self._scan_lock:
+            covered_seq = self._pending_scans[-1][0] if self._pending_scans else self._scan_seq
+            self._lease_waits.pop(mid, None)
+            return self._hashes.pop(mid, None), covered_seq
+
+    def run_tool(self, mid: str, content_hash: Optional[str] = None):
         """Execute the tool run command for a given MID."""
+        with TOOL_SECONDS.time(engine="sync"):
+            TOOL_RUNS.inc(engine="sync", outcome=self._run_tool(mid, content_hash))
+
+    def _run_tool(self, mid: str, content_hash: Optional[str] = None) -> str:
+        """
+        Run the command, retrying failed attempts with backoff, and record its status.
+
+        Output is streamed to the MID's log file, as on the async engine, rather
+        than buffered in memory. Returns the outcome label for metrics.
+        """
+        self.logger.info(f"Starting tool run for MID: {mid}")
+        log_path = self.engine.log_path(mid)
+        outcome = "failure"
         try:
-            self.active_runs.put(mid)
-            self.logger.info(f"Starting tool run for MID: {mid}")
-            
-            # Replace this with your actual tool command
-            command = f"your_tool_command --mid {mid}"
-            
-            result = subprocess.run(
-                command,
-                shell=True,
-                capture_output=True,
-                text=True
-            )
-            
-            if result.returncode == 0:
-                self.logger.info(f"Successfully ran tool for MID: {mid}")
-            else:
-                self.logger.error(f"Tool run failed for MID: {mid}. Error: {result.stderr}")
-        
+            argv = build_command(self.tool_command, mid)
+            for attempt in range(1, self.max_retries + 1):
+                with open(log_path, 'ab') as log_file:
+                    log_file.write(f"--- attempt {attempt} at {time.strftime('%Y-%m-%d %H:%M:%S')}: {' '.join(argv)}\n".encode())
+                    log_file.flush()
+                    try:
+                        result = subprocess.run(
+                            argv,
+                            stdin=subprocess.DEVNULL,
+                            stdout=log_file,
+                            stderr=subprocess.STDOUT,
+                            timeout=self.run_timeout
+                        )
+                        outcome = "success" if result.returncode == 0 else "failure"
+                    except subprocess.TimeoutExpired:
+                        self.logger.error(f"Tool run for MID {mid} timed out after {self.run_timeout}s")
+                        outcome = "timeout"
+                if outcome == "success":
+                    break
+                if attempt < self.max_retries:
+                    delay = min(self.engine.backoff_max, self.retry_delay * 2 ** (attempt - 1))
+                    self.logger.warning(
+                        f"Tool run for MID {mid} failed (attempt {attempt} of {self.max_retries}), "
+                        f"retrying in {delay:.1f}s"
+                    )
+                    time.sleep(delay)
+        except OSError as e:
+            # The command itself could not be started (missing binary, no permission)
+            self.logger.error(f"Error starting tool for MID {mid}: {e}")
+            self.status_store.record(mid, "Failure", content_hash=content_hash)
+            return "error"
         except Exception as e:
+            # Recorded so the MID is retried on the failure backoff instead of being forgotten
             self.logger.error(f"Error running tool for MID {mid}: {e}")
+            self.status_store.record(mid, "Failure", content_hash=content_hash)
+            return "error"
+
+        if outcome == "success":
+            self.logger.info(f"Successfully ran tool for MID: {mid}")
+            self.status_store.record(mid, "Success", content_hash=content_hash)
+        else:
+            self.logger.error(f"Tool run failed for MID: {mid}. See {log_path}")
+            self.status_store.record(mid, "Failure", content_hash=content_hash)
+        return outcome
+
+    def _run_and_mark_done(self, mid: str):
+        content_hash, covered_seq = self._take_hash(mid)
+        claim = None
+        try:
+            claim = self._claim(mid, content_hash)
+            if claim == "claimed":
+                try:
+                    self.run_tool(mid, content_hash)
+                finally:
+                    self.leases.release(mid)
+        finally:
+            # An MID leased elsewhere keeps its scans pending until it is retried
+            if claim != "leased":
+                self._mark_done(mid, covered_seq)
+
+    async def _run_claimed_async(self, mid: str):
+        content_hash, covered_seq = self._take_hash(mid)
+        claim = None
+        try:
+            claim = await asyncio.to_thread(self._claim, mid, content_hash)
+            if claim != "claimed":
+                return
+            try:
+                await self.engine.run(mid, content_hash)
+            finally:
+                await asyncio.to_thread(self.leases.release, mid)
         finally:
-            self.active_runs.get()
-            self.active_runs.task_done()
+            if claim != "leased":
+                self._mark_done(mid, covered_seq)
+
+    def poll_once(self) -> int:
+        """One poll cycle: renew leases, find changed or due MIDs and queue them on the scheduler."""
+        self.leases.renew_all()
+        unique_mids = self.select_for_this_runner(self.get_unique_mids()) | self._expired_lease_waits()
+        
+        if unique_mids:
+            self.logger.info(f"Found {len(unique_mids)} unique MIDs")
+            
+            # Queue MIDs immediately; blocks only while the work queue is full.
+            # MIDs already queued or running are skipped by the scheduler.
+            for mid in unique_mids:
+                self.scheduler.submit(mid)
+        else:
+            self.logger.info("No unique MIDs found or couldn't read run status")
+        self.commit_scan()
+        self.logger.info(f"Scheduler stats: {self.scheduler.stats()}")
+        return len(unique_mids)
 
     def run_polling_loop(self):
-        """Main polling loop with parallel execution."""
+        """Main polling loop feeding newly discovered MIDs to the long-lived scheduler."""
         self.logger.info("Starting polling loop")
+        self.scheduler.start()
         
         while True:
             try:
-                unique_mids = self.get_unique_mids()
-                
-                if unique_mids:
-                    self.logger.info(f"Found {len(unique_mids)} unique MIDs")
-                    
-                    # Create a thread pool for parallel execution
-                    with ThreadPoolExecutor(max_workers=self.max_parallel_runs) as executor:
-                        # Submit all MIDs to the thread pool
-                        futures = [executor.submit(self.run_tool, mid) for mid in unique_mids]
-                        
-                        # Wait for all runs to complete
-                        for future in futures:
-                            future.result()
-                else:
-                    self.logger.info("No unique MIDs found or couldn't read status file")
+                self.poll_once()
                 
                 self.logger.info(f"Sleeping for {self.poll_interval} seconds")
                 time.sleep(self.poll_interval)
                 
             except KeyboardInterrupt:
                 self.logger.info("Received shutdown signal, stopping...")
+                self.close(wait=False)
                 break
             except Exception as e:
                 self.logger.error(f"Error in polling loop: {e}")
                 time.sleep(self.poll_interval)
 
+    async def run_polling_loop_async(self):
+        """Polling loop running every tool invocation on the single-threaded asyncio engine."""
+        self.logger.info("Starting async polling loop")
+        running: Dict[str, asyncio.Task] = {}
+
+        def on_done(mid: str, task: asyncio.Task):
+            running.pop(mid, None)
+            self._async_running = len(running)
+
+        try:
+            while True:
+                try:
+                    await asyncio.to_thread(self.leases.renew_all)
+                    unique_mids = self.select_for_this_runner(
+                        await asyncio.to_thread(self.get_unique_mids)
+                    ) | self._expired_lease_waits()
+                    
+                    if unique_mids:
+                        self.logger.info(f"Found {len(unique_mids)} unique MIDs")
+                        for mid in unique_mids:
+                            if mid in running:
+                                continue
+                            task = asyncio.create_task(self._run_claimed_async(mid))
+                            running[mid] = task
+                            self._async_running = len(running)
+                            task.add_done_callback(lambda t, mid=mid: on_done(mid, t))
+                    else:
+                        self.logger.info("No unique MIDs found or couldn't read run status")
+                    self.commit_scan()
+                    self.logger.info(f"In-flight tool runs: {len(running)}")
+                    
+                    await asyncio.sleep(self.poll_interval)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.logger.error(f"Error in polling loop: {e}")
+                    await asyncio.sleep(self.poll_interval)
+        finally:
+            self.logger.info("Stopping async polling loop")
+            for task in running.values():
+                task.cancel()
+            await asyncio.gather(*running.values(), return_exceptions=True)
+
 if __name__ == "__main__":
-    # Create and run the tool runner
-    runner = ToolRunner(
-        json_path="m_ids_lina_run.json",
-        poll_interval=3600,  # 1 hour
-        max_retries=3,
-        retry_delay=5,
-        max_parallel_runs=10  # adjust based on your system's capabilities
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the tool for every changed MID")
+    parser.add_argument("--issues-db", default="db_path/issues_database.sqlite")
+    parser.add_argument(
+        "--install-change-log", action="store_true",
+        help="Add the issue change log and its triggers to the issues database, then exit"
+    )
+    parser.add_argument(
+        "--engine", choices=("async", "threaded"), default="async",
+        help="async runs every tool process on one event loop; threaded uses the worker thread pool"
     )
-    runner.run_polling_loop() 
\ No newline at end of file
+    args = parser.parse_args()
+
+    if args.install_change_log:
+        created = DatabaseAccess(args.issues_db).install_change_log()
+        print(f"Issue change log {'created' if created else 'already present'} in {args.issues_db}")
+    else:
+        # Create and run the tool runner
+        runner = ToolRunner(
+            json_path="m_ids_lina_run.json",
+            poll_interval=60,  # 1 minute
+            max_retries=3,
+            retry_delay=5,
+            max_parallel_runs=10,  # adjust based on your system's capabilities
+            issues_db_path=args.issues_db
+        )
+        if args.engine == "async":
+            try:
+                asyncio.run(runner.run_polling_loop_async())
+            except KeyboardInterrupt:
+                runner.logger.info("Received shutdown signal, stopping...")
+            finally:
+                runner.close()
+        else:
+            runner.run_polling_loop()
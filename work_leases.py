@@ -0,0 +1,194 @@
+import bisect
+import hashlib
+import os
+import socket
+import sqlite3
+import time
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, Set
+
+from database_access import ConnectionPool
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS run_leases (
+    M_ID TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+)
+"""
+OWNER_INDEX = "CREATE INDEX IF NOT EXISTS idx_run_leases_owner ON run_leases (owner, expires_at)"
+
+
+def default_runner_id() -> str:
+    """Identify this runner by host and process ID."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LeaseManager:
+    def __init__(
+        self,
+        db_path: str = "db_path/run_status.sqlite",
+        owner: Optional[str] = None,
+        lease_seconds: float = 600.0,
+        pool_size: int = 10
+    ):
+        """
+        Work-claiming leases shared by all runners through one SQLite table.
+
+        A lease gives its owner the exclusive right to run an M_ID until it
+        expires; leases of crashed runners expire and can be claimed again.
+
+        Args:
+            db_path (str): Path to the shared database holding the lease table
+            owner (Optional[str]): This runner's ID, defaults to "<hostname>:<pid>"
+            lease_seconds (float): Lease lifetime; renew more often than this
+            pool_size (int): Maximum number of pooled connections
+        """
+        self.db_path = db_path
+        self.owner = owner or default_runner_id()
+        self.lease_seconds = lease_seconds
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.pool = ConnectionPool(db_path, pool_size=pool_size)
+        with self.pool.connection() as conn:
+            conn.execute(SCHEMA)
+            conn.execute(OWNER_INDEX)
+            conn.commit()
+
+    def claim(self, mid: str) -> bool:
+        """
+        Atomically claim an M_ID if it is unleased, its lease expired, or we already hold it.
+
+        Args:
+            mid (str): The M_ID to claim
+
+        Returns:
+            bool: True if this runner now holds the lease
+        """
+        return mid in self.claim_many([mid])
+
+    def claim_many(self, mids: Iterable[str]) -> Set[str]:
+        """
+        Claim several M_IDs in one write transaction.
+
+        Args:
+            mids (Iterable[str]): The M_IDs to claim
+
+        Returns:
+            Set[str]: The M_IDs this runner now holds
+        """
+        now = time.time()
+        claimed = set()
+        try:
+            with self.pool.connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                for mid in mids:
+                    cursor = conn.execute(
+                        """
+                        INSERT INTO run_leases (M_ID, owner, expires_at) VALUES (?, ?, ?)
+                        ON CONFLICT(M_ID) DO UPDATE SET
+                            owner = excluded.owner,
+                            expires_at = excluded.expires_at
+                        WHERE run_leases.expires_at <= ? OR run_leases.owner = excluded.owner
+                        """,
+                        (mid, self.owner, now + self.lease_seconds, now)
+                    )
+                    if cursor.rowcount == 1:
+                        claimed.add(mid)
+                conn.commit()
+            return claimed
+        except sqlite3.Error as e:
+            raise Exception(f"Error claiming leases: {e}")
+
+    def expiry(self, mid: str) -> Optional[float]:
+        """Return when the current lease on an M_ID expires (epoch seconds), None if it is not leased."""
+        try:
+            with self.pool.connection() as conn:
+                row = conn.execute("SELECT expires_at FROM run_leases WHERE M_ID = ?", (mid,)).fetchone()
+                return row[0] if row else None
+        except sqlite3.Error as e:
+            raise Exception(f"Error reading lease for M_ID {mid}: {e}")
+
+    def renew(self, mid: str) -> bool:
+        """Extend our lease on an M_ID; False if we no longer hold it."""
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.execute(
+                    "UPDATE run_leases SET expires_at = ? WHERE M_ID = ? AND owner = ?",
+                    (time.time() + self.lease_seconds, mid, self.owner)
+                )
+                conn.commit()
+                return cursor.rowcount == 1
+        except sqlite3.Error as e:
+            raise Exception(f"Error renewing lease for M_ID {mid}: {e}")
+
+    def renew_all(self) -> int:
+        """Extend every unexpired lease held by this runner; returns the number renewed."""
+        now = time.time()
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.execute(
+                    "UPDATE run_leases SET expires_at = ? WHERE owner = ? AND expires_at > ?",
+                    (now + self.lease_seconds, self.owner, now)
+                )
+                conn.commit()
+                return cursor.rowcount
+        except sqlite3.Error as e:
+            raise Exception(f"Error renewing leases for {self.owner}: {e}")
+
+    def release(self, mid: str):
+        """Give up our lease on an M_ID."""
+        try:
+            with self.pool.connection() as conn:
+                conn.execute(
+                    "DELETE FROM run_leases WHERE M_ID = ? AND owner = ?",
+                    (mid, self.owner)
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            raise Exception(f"Error releasing lease for M_ID {mid}: {e}")
+
+    def purge_expired(self) -> int:
+        """Delete expired leases; returns the number removed."""
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.execute("DELETE FROM run_leases WHERE expires_at <= ?", (time.time(),))
+                conn.commit()
+                return cursor.rowcount
+        except sqlite3.Error as e:
+            raise Exception(f"Error purging expired leases: {e}")
+
+    def close(self):
+        """Close all pooled connections."""
+        self.pool.close()
+
+
+class HashRing:
+    def __init__(self, nodes: Sequence[str], vnodes: int = 100):
+        """
+        Consistent-hash ring assigning each M_ID a preferred runner.
+
+        Adding or removing a runner only moves about 1/N of the M_IDs.
+
+        Args:
+            nodes (Sequence[str]): Runner IDs on the ring
+            vnodes (int): Virtual points per runner, smooths the distribution
+        """
+        if not nodes:
+            raise ValueError("HashRing needs at least one node")
+        self.nodes = list(nodes)
+        points = sorted(
+            (self._hash(f"{node}#{i}"), node)
+            for node in self.nodes
+            for i in range(vnodes)
+        )
+        self._keys: List[int] = [key for key, _ in points]
+        self._owners: List[str] = [node for _, node in points]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+    def owner_of(self, mid: str) -> str:
+        """Return the runner responsible for an M_ID."""
+        i = bisect.bisect(self._keys, self._hash(mid)) % len(self._keys)
+        return self._owners[i]